@@ -0,0 +1,54 @@
+from __future__ import print_function
+
+import sys
+import time
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+replicas = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+steps = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+case = 'q-SPC-FW'
+temp = 300*unit.kelvin
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                 nonbondedCutoff=1.0*unit.nanometers, constraints=app.HBonds,
+                                 removeCMMotion=False)
+forces = [atomsmm.DampedSmoothedForce(0.29/unit.angstroms, 9*unit.angstroms, 8*unit.angstroms),
+          atomsmm.NonbondedExceptionsForce()]
+with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+    for force in forces:
+        force.importFrom(nbforce).addTo(system)
+dof = atomsmm.countDegreesOfFreedom(system) + 3
+
+
+def createContext(system, positions, replicas=None):
+    thermostat = atomsmm.NoseHooverLangevinPropagator(temp, dof, 0.1*unit.picoseconds, 10/unit.picoseconds, replicas)
+    propagator = atomsmm.TrotterSuzukiPropagator(atomsmm.VelocityVerletPropagator(), thermostat)
+    context = openmm.Context(system, propagator.integrator(1*unit.femtoseconds), openmm.Platform.getPlatformByName('CPU'))
+    context.setPositions(positions)
+    context.setVelocitiesToTemperature(temp)
+    if replicas is not None:
+        atomsmm.assignReplicas(context, replicas)
+    context.getIntegrator().step(1)
+    return context
+
+
+def timeit(contexts):
+    start = time.time()
+    for context in contexts:
+        context.getIntegrator().step(steps)
+    return (time.time() - start)/steps
+
+
+separate = timeit([createContext(system, pdb.positions) for i in range(replicas)])
+batch, topology, positions = atomsmm.batchReplicas(system, pdb.topology, pdb.positions, replicas)
+batched = timeit([createContext(batch, positions, replicas)])
+print('replicas = %d, atoms per replica = %d' % (replicas, system.getNumParticles()))
+print('%-20s %12.6f s/step' % ('separate contexts', separate))
+print('%-20s %12.6f s/step' % ('batched replicas', batched))
@@ -0,0 +1,50 @@
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm.reporters
+
+nsteps = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+case = 'q-SPC-FW'
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=openmm.app.CutoffPeriodic)
+folder = tempfile.mkdtemp()
+kwargs = dict(step=True, time=True, potentialEnergy=True, kineticEnergy=True, totalEnergy=True,
+              temperature=True)
+csv = os.path.join(folder, 'output.csv')
+binary = os.path.join(folder, 'output.bin')
+reporters = [('CSV', app.StateDataReporter(csv, 1, separator=',', **kwargs)),
+             ('binary', atomsmm.reporters.binaryReporter(binary, 1, **kwargs))]
+
+print('format\tstep loop (s)\tfile size (MB)\tparse time (s)')
+for (name, reporter) in reporters:
+    integrator = openmm.VerletIntegrator(0.1*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('CPU')
+    simulation = app.Simulation(pdb.topology, system, integrator, platform)
+    simulation.context.setPositions(pdb.positions)
+    simulation.reporters.append(reporter)
+    start = time.time()
+    simulation.step(nsteps)
+    elapsed = time.time() - start
+    if name == 'CSV':
+        del simulation, reporter
+        file = csv
+        start = time.time()
+        data = np.loadtxt(file, delimiter=',')
+    else:
+        reporter.close()
+        file = binary
+        start = time.time()
+        data = atomsmm.reporters.loadBinaryReport(file)
+    parse = time.time() - start
+    print('%s\t%.2f\t%.2f\t%.4f' % (name, elapsed, os.path.getsize(file)/2**20, parse))
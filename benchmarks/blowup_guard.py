@@ -0,0 +1,36 @@
+from __future__ import print_function
+
+import sys
+import time
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+case = sys.argv[1] if len(sys.argv) > 1 else 'emim_BCN4_Jiung2014'
+steps = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+dt = 1*unit.femtoseconds
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=10*unit.angstroms,
+                                 constraints=app.HBonds)
+dof = atomsmm.countDegreesOfFreedom(system)
+propagator = atomsmm.VelocityVerletPropagator()
+variants = {'unguarded': propagator,
+            'guarded (speed)': atomsmm.GuardedPropagator(propagator, 50*unit.nanometers/unit.picoseconds),
+            'guarded (speed+temperature)': atomsmm.GuardedPropagator(propagator, 50*unit.nanometers/unit.picoseconds,
+                                                                     (10*unit.kelvin, 3000*unit.kelvin), dof)}
+
+print('%-30s %12s' % ('propagator', 'step(ms)'))
+for (name, variant) in sorted(variants.items()):
+    integrator = variant.integrator(dt)
+    context = openmm.Context(system, integrator, openmm.Platform.getPlatformByName('CPU'))
+    context.setPositions(pdb.positions)
+    context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    integrator.step(1)
+    start = time.time()
+    integrator.step(steps)
+    print('%-30s %12.3f' % (name, 1000*(time.time() - start)/steps))
@@ -0,0 +1,72 @@
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from simtk import openmm
+from simtk import unit
+
+import atomsmm
+
+N = int(float(sys.argv[1])) if len(sys.argv) > 1 else 2*10**6
+
+# The cost of checkpointing does not depend on the forces, so a force-free system suffices:
+system = openmm.System()
+for i in range(N):
+    system.addParticle(1.0)
+L = (N/100.0)**(1/3)
+system.setDefaultPeriodicBoxVectors(openmm.Vec3(L, 0, 0), openmm.Vec3(0, L, 0), openmm.Vec3(0, 0, L))
+thermostat = atomsmm.NoseHooverLangevinPropagator(300*unit.kelvin, 3*N, 0.1*unit.picoseconds, 10/unit.picoseconds)
+propagator = atomsmm.TrotterSuzukiPropagator(atomsmm.VelocityVerletPropagator(), thermostat)
+context = openmm.Context(system, propagator.integrator(1*unit.femtoseconds), openmm.Platform.getPlatformByName('CPU'))
+context.setPositions(L*np.random.RandomState(1).random_sample((N, 3)))
+context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+context.getIntegrator().step(1)
+
+folder = tempfile.mkdtemp()
+
+
+def xmlSave(file):
+    with open(file, 'w') as f:
+        state = context.getState(getPositions=True, getVelocities=True, getParameters=True)
+        f.write(openmm.XmlSerializer.serialize(state))
+
+
+def xmlLoad(file):
+    with open(file) as f:
+        context.setState(openmm.XmlSerializer.deserialize(f.read()))
+
+
+def openmmSave(file):
+    with open(file, 'wb') as f:
+        f.write(context.createCheckpoint())
+
+
+def openmmLoad(file):
+    with open(file, 'rb') as f:
+        context.loadCheckpoint(f.read())
+
+
+methods = [('atomsmm (all)', lambda file: atomsmm.saveCheckpoint(context, file),
+            lambda file: atomsmm.loadCheckpoint(context, file), 'checkpoint.npz'),
+           ('atomsmm (persistent)', lambda file: atomsmm.saveCheckpoint(context, file, propagator.persistent),
+            lambda file: atomsmm.loadCheckpoint(context, file), 'checkpoint.npz'),
+           ('XML State', xmlSave, xmlLoad, 'state.xml'),
+           ('OpenMM checkpoint', openmmSave, openmmLoad, 'checkpoint.chk')]
+
+print('atoms = %d' % N)
+print('%-22s %10s %10s %12s' % ('method', 'write(s)', 'read(s)', 'size(MB)'))
+for (name, save, load, file) in methods:
+    file = os.path.join(folder, file)
+    start = time.time()
+    save(file)
+    write = time.time() - start
+    start = time.time()
+    load(file)
+    read = time.time() - start
+    print('%-22s %10.3f %10.3f %12.1f' % (name, write, read, os.path.getsize(file)/2**20))
+    os.remove(file)
+os.rmdir(folder)
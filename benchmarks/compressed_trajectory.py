@@ -0,0 +1,56 @@
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import time
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm.reporters
+
+nsteps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+interval = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+case = 'emim_BCN4_Jiung2014'
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=openmm.app.PME, constraints=app.HBonds)
+heavy = [atom.index for atom in pdb.topology.atoms() if atom.element.symbol != 'H']
+folder = tempfile.mkdtemp()
+files = dict((name, os.path.join(folder, 'trajectory.%s' % name)) for name in ['pdb', 'dcd', 'bin', 'sub'])
+reporters = [('none', None, None),
+             ('PDB', app.PDBReporter(files['pdb'], interval), files['pdb']),
+             ('DCD', app.DCDReporter(files['dcd'], interval), files['dcd']),
+             ('compressed', atomsmm.reporters.compressedTrajectoryReporter(files['bin'], interval), files['bin']),
+             ('compressed (heavy atoms)', atomsmm.reporters.compressedTrajectoryReporter(files['sub'], interval,
+                                                                                         atomSubset=heavy), files['sub'])]
+
+print('%d atoms (%d heavy), %d steps, a frame every %d steps' % (system.getNumParticles(), len(heavy), nsteps, interval))
+print('%-26s %14s %12s %15s %12s' % ('writer', 'step loop (s)', 'stall (ms)', 'file size (MB)', 'close (s)'))
+for (name, reporter, file) in reporters:
+    integrator = openmm.VerletIntegrator(1.0*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('CPU')
+    simulation = app.Simulation(pdb.topology, system, integrator, platform)
+    simulation.context.setPositions(pdb.positions)
+    simulation.context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    simulation.step(1)
+    if reporter is not None:
+        simulation.reporters.append(reporter)
+    start = time.time()
+    simulation.step(nsteps)
+    elapsed = time.time() - start
+    start = time.time()
+    if hasattr(reporter, 'close'):
+        reporter.close()
+    elif reporter is not None:
+        reporter._out.flush()
+    closing = time.time() - start
+    if file is None:
+        baseline = elapsed
+        print('%-26s %14.2f' % (name, elapsed))
+    else:
+        stall = 1000*(elapsed - baseline)/(nsteps//interval)
+        print('%-26s %14.2f %12.3f %15.3f %12.3f' % (name, elapsed, stall, os.path.getsize(file)/2**20, closing))
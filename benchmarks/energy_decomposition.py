@@ -0,0 +1,30 @@
+from __future__ import print_function
+
+import sys
+import time
+
+from simtk import openmm
+from simtk.openmm import app
+
+import atomsmm
+
+ncalls = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+case = 'emim_BCN4_Jiung2014'
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=openmm.app.PME)
+
+start = time.time()
+for i in range(ncalls):
+    atomsmm.splitPotentialEnergy(system, pdb.topology, pdb.positions)
+print('splitPotentialEnergy: %.4f s/call' % ((time.time() - start)/ncalls))
+
+for platform in ['Reference', 'CPU']:
+    start = time.time()
+    decomposer = atomsmm.EnergyDecomposer(system, platform)
+    setup = time.time() - start
+    start = time.time()
+    for i in range(ncalls):
+        decomposer.compute(pdb.positions)
+    print('EnergyDecomposer(%s): %.4f s setup, %.4f s/call' % (platform, setup, (time.time() - start)/ncalls))
@@ -0,0 +1,49 @@
+from __future__ import print_function
+
+import sys
+import time
+from copy import deepcopy
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+case = sys.argv[1] if len(sys.argv) > 1 else 'emim_BCN4_Jiung2014'
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+rswitchIn = 6.0*unit.angstroms
+rcutIn = 7.0*unit.angstroms
+rswitch = 9.0*unit.angstroms
+rcut = 10*unit.angstroms
+dt = 1*unit.femtoseconds
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=rcut,
+                                 constraints=app.HBonds)
+variants = {'FarNonbondedForce (PME)': lambda near: atomsmm.FarNonbondedForce(near, rcut, rswitch),
+            'FarDampedShiftedForce': lambda near: atomsmm.FarDampedShiftedForce(near, 0.2/unit.angstroms, rcut, rswitch),
+            'FarReactionFieldForce': lambda near: atomsmm.FarReactionFieldForce(near, rcut, rswitch)}
+
+print('%-26s %16s %16s' % ('far force', 'evaluation(ms)', 'RESPA step(ms)'))
+for (name, far) in sorted(variants.items()):
+    split = deepcopy(system)
+    near = atomsmm.NearNonbondedForce(rcutIn, rswitchIn).setForceGroup(1)
+    with atomsmm.detachForce(split, atomsmm.findNonbondedForce(split)) as nbforce:
+        for force in [atomsmm.NonbondedExceptionsForce(), near, far(near).setForceGroup(2)]:
+            force.importFrom(nbforce).addTo(split)
+    integrator = atomsmm.RespaPropagator([2, 2, 1]).integrator(4*dt)
+    context = openmm.Context(split, integrator, openmm.Platform.getPlatformByName('CPU'))
+    context.setPositions(pdb.positions)
+    context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    context.getState(getForces=True, groups=set([2]))
+    start = time.time()
+    for i in range(repeats):
+        context.getState(getForces=True, groups=set([2]))
+    evaluation = (time.time() - start)/repeats
+    integrator.step(1)
+    start = time.time()
+    integrator.step(repeats)
+    step = (time.time() - start)/repeats
+    print('%-26s %16.3f %16.3f' % (name, 1000*evaluation, 1000*step))
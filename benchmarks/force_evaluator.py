@@ -0,0 +1,59 @@
+from __future__ import print_function
+
+import sys
+import time
+
+import numpy as np
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+if __name__ == '__main__':
+    nframes = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    case = 'emim_BCN4_Jiung2014'
+
+    pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+    forcefield = app.ForceField('../tests/data/%s.xml' % case)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=10*unit.angstroms)
+    nbforce = system.getForce(atomsmm.findNonbondedForce(system))
+    box = system.getDefaultPeriodicBoxVectors()
+
+    x0 = np.array(pdb.positions.value_in_unit(unit.nanometers))
+    random = np.random.RandomState(1)
+    trajectory = x0 + 0.001*random.randn(nframes, *x0.shape)
+
+    def openmmEnergies(force):
+        model = openmm.System()
+        for index in range(system.getNumParticles()):
+            model.addParticle(system.getParticleMass(index))
+        model.setDefaultPeriodicBoxVectors(*box)
+        force.importFrom(nbforce).addTo(model)
+        context = openmm.Context(model, openmm.VerletIntegrator(0.0), openmm.Platform.getPlatformByName('CPU'))
+        energies = list()
+        for positions in trajectory:
+            context.setPositions(positions)
+            state = context.getState(getEnergy=True, getForces=True)
+            energies.append(state.getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole))
+        return np.array(energies)
+
+    def numpyEnergies(force):
+        evaluator = atomsmm.ForceEvaluator(force, nbforce, box)
+        return np.array([evaluator.compute(x)[0].value_in_unit(unit.kilojoules_per_mole) for x in trajectory])
+
+    print('force                      rswitch(A)  numpy(s)  openmm(s)  max |dE| (kJ/mol)')
+    for rswitch in [5.0, 6.0]:
+        near = atomsmm.NearNonbondedForce(7*unit.angstroms, rswitch*unit.angstroms)
+        forces = [('NearNonbondedForce', near),
+                  ('FarNonbondedForce', atomsmm.FarNonbondedForce(near, 10*unit.angstroms, 9*unit.angstroms)),
+                  ('DampedSmoothedForce', atomsmm.DampedSmoothedForce(0.29/unit.angstroms, 10*unit.angstroms,
+                                                                      (rswitch + 3)*unit.angstroms))]
+        for (name, force) in forces:
+            start = time.time()
+            numpy = numpyEnergies(force)
+            middle = time.time()
+            reference = openmmEnergies(force)
+            end = time.time()
+            error = np.max(np.abs(numpy - reference))
+            print('%-26s %10.1f %9.3f %10.3f %18.4f' % (name, rswitch, middle - start, end - middle, error))
@@ -0,0 +1,29 @@
+from __future__ import print_function
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+innerStep = 1*unit.femtoseconds
+case = 'emim_BCN4_Jiung2014'
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=openmm.app.PME,
+                                 nonbondedCutoff=10*unit.angstroms)
+exceptions = atomsmm.NonbondedExceptionsForce().setForceGroup(0)
+near = atomsmm.NearNonbondedForce(7*unit.angstroms, 6*unit.angstroms).setForceGroup(1)
+far = atomsmm.FarNonbondedForce(near, 10*unit.angstroms, 9*unit.angstroms).setForceGroup(2)
+with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+    for force in [exceptions, near, far]:
+        force.importFrom(nbforce).addTo(system)
+
+profile = atomsmm.ForceGroupProfile(system, pdb.positions)
+print(profile)
+print()
+print('loops\tstep size\tns/day (innermost step = %s)' % innerStep)
+for loops in [[1, 1, 1], [2, 1, 1], [2, 2, 1], [3, 2, 1], [4, 2, 1], [2, 2, 2], [4, 2, 2]]:
+    stepSize = innerStep*loops[0]*loops[1]*loops[2]
+    print('%s\t%s\t%.2f' % (loops, stepSize, profile.speed(loops, stepSize)))
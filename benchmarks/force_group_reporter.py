@@ -0,0 +1,46 @@
+from __future__ import print_function
+
+import io
+import sys
+import time
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+import atomsmm.reporters
+
+nreports = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+case = 'emim_BCN4_Jiung2014'
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=openmm.app.PME,
+                                 nonbondedCutoff=10*unit.angstroms)
+exceptions = atomsmm.NonbondedExceptionsForce().setForceGroup(1)
+near = atomsmm.NearNonbondedForce(7*unit.angstroms, 6*unit.angstroms).setForceGroup(2)
+far = atomsmm.FarNonbondedForce(near, 10*unit.angstroms, 9*unit.angstroms).setForceGroup(3)
+with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+    for force in [exceptions, near, far]:
+        force.importFrom(nbforce).addTo(system)
+
+
+def run(reporters):
+    integrator = openmm.VerletIntegrator(0.01*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('CPU')
+    simulation = app.Simulation(pdb.topology, system, integrator, platform)
+    simulation.context.setPositions(pdb.positions)
+    simulation.reporters += reporters
+    start = time.time()
+    simulation.step(nreports)
+    return time.time() - start
+
+
+bare = run([])
+plain = run([app.StateDataReporter(io.StringIO(), 1, step=True, potentialEnergy=True)])
+groups = run([atomsmm.reporters.forceGroupReporter(io.StringIO(), 1, [0, 1, 2, 3],
+                                                   ['bonded', 'exceptions', 'near', 'far'])])
+print('cost per report:')
+print('StateDataReporter (total energy): %.3f ms' % (1000*(plain - bare)/nreports))
+print('forceGroupReporter (4 groups): %.3f ms' % (1000*(groups - bare)/nreports))
@@ -0,0 +1,59 @@
+from __future__ import print_function
+
+import multiprocessing
+import resource
+import sys
+import time
+
+from simtk import openmm
+from simtk import unit
+
+import atomsmm
+
+
+def buildSystem(N):
+    system = openmm.System()
+    nbforce = openmm.NonbondedForce()
+    for i in range(N):
+        system.addParticle(1.0)
+        nbforce.addParticle((-1)**i, 0.3, 0.5)
+    for i in range(0, N - 1, 2):
+        nbforce.addException(i, i+1, 0.0, 0.3, 0.0)
+    system.addForce(nbforce)
+    return system
+
+
+def peakRSS():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+
+def run(N, detach, queue):
+    system = buildSystem(N)
+    forces = [atomsmm.NonbondedExceptionsForce(),
+              atomsmm.NearNonbondedForce(0.7*unit.nanometers, 0.6*unit.nanometers)]
+    before = peakRSS()
+    start = time.time()
+    if detach:
+        with atomsmm.detachForce(system, 0) as nbforce:
+            for force in forces:
+                force.importFrom(nbforce).addTo(system)
+    else:
+        nbforce = atomsmm.hijackForce(system, 0)
+        for force in forces:
+            force.importFrom(nbforce).addTo(system)
+    queue.put((time.time() - start, peakRSS() - before))
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] if len(sys.argv) > 1 else [10**4, 10**5, 10**6]
+    context = multiprocessing.get_context('spawn')
+    print('N\tmethod\ttime (s)\tpeak RSS increase (MB)')
+    for N in sizes:
+        for (method, detach) in [('hijackForce', False), ('detachForce', True)]:
+            queue = context.Queue()
+            process = context.Process(target=run, args=(N, detach, queue))
+            process.start()
+            elapsed, memory = queue.get()
+            process.join()
+            print('%d\t%s\t%.3f\t%.1f' % (N, method, elapsed, memory))
@@ -0,0 +1,28 @@
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import time
+
+repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+statements = ['import atomsmm',
+              'import atomsmm; atomsmm.NearNonbondedForce',
+              'import atomsmm; atomsmm.decomposeTrajectory',
+              'import atomsmm; atomsmm.VelocityVerletPropagator().integrator(1.0)',
+              'import atomsmm; str(atomsmm.VelocityVerletPropagator().integrator(1.0))']
+
+print('%-75s %10s %10s' % ('statement', 'median(s)', 'min(s)'))
+baseline = None
+devnull = open(os.devnull, 'w')
+for statement in ['pass'] + statements:
+    samples = []
+    for i in range(repeats):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', statement], stdout=devnull, stderr=devnull)
+        samples.append(time.time() - start)
+    samples.sort()
+    if baseline is None:
+        baseline = samples[0]
+    print('%-75s %10.3f %10.3f' % (statement, samples[len(samples)//2] - baseline, samples[0] - baseline))
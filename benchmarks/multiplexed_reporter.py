@@ -0,0 +1,41 @@
+from __future__ import print_function
+
+import io
+import sys
+import time
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm.reporters
+
+nreports = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+nsinks = 4
+case = 'q-SPC-FW'
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=openmm.app.CutoffPeriodic)
+kwargs = dict(step=True, potentialEnergy=True, kineticEnergy=True, totalEnergy=True,
+              temperature=True, speed=True)
+
+
+def run(reporters):
+    integrator = openmm.VerletIntegrator(0.01*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('CPU')
+    simulation = app.Simulation(pdb.topology, system, integrator, platform)
+    simulation.context.setPositions(pdb.positions)
+    simulation.reporters += reporters
+    start = time.time()
+    simulation.step(nreports)
+    return time.time() - start
+
+
+bare = run([])
+separate = run([app.StateDataReporter(io.StringIO(), 1, **kwargs) for i in range(nsinks)])
+children = [app.StateDataReporter(io.StringIO(), 1, **kwargs) for i in range(nsinks)]
+multiplexed = run([atomsmm.reporters.multiplexedReporter(children)])
+print('%d sinks, overhead per report:' % nsinks)
+print('separate reporters: %.3f ms' % (1000*(separate - bare)/nreports))
+print('multiplexed reporter: %.3f ms' % (1000*(multiplexed - bare)/nreports))
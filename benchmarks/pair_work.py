@@ -0,0 +1,47 @@
+from __future__ import print_function
+
+import sys
+import time
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+case = sys.argv[1] if len(sys.argv) > 1 else 'emim_BCN4_Jiung2014'
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+rcut = 10*unit.angstroms
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=rcut)
+near = atomsmm.NearNonbondedForce(7*unit.angstroms, 6*unit.angstroms).setForceGroup(1)
+far = atomsmm.FarNonbondedForce(near, rcut, 9*unit.angstroms).setForceGroup(2)
+with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+    for force in [atomsmm.NonbondedExceptionsForce(), near, far]:
+        force.importFrom(nbforce).addTo(system)
+
+# The discount part of the far force can only be trimmed in a force group of its own:
+system.getForce(system.getNumForces() - 1).setForceGroup(3)
+
+start = time.time()
+profile = atomsmm.PairWorkProfile(system, pdb.positions)
+print('Analysis time: %.1f s' % (time.time() - start))
+print(profile)
+
+
+def farEvaluationTime():
+    context = openmm.Context(system, openmm.VerletIntegrator(0.0), openmm.Platform.getPlatformByName('CPU'))
+    context.setPositions(pdb.positions)
+    context.getState(getForces=True, groups=set([2, 3]))
+    start = time.time()
+    for i in range(repeats):
+        context.getState(getForces=True, groups=set([2, 3]))
+    return (time.time() - start)/repeats
+
+
+before = farEvaluationTime()
+print('\nApplied cutoffs: %s' % profile.apply(system))
+after = farEvaluationTime()
+print('Far force evaluation: %.3f ms -> %.3f ms' % (1000*before, 1000*after))
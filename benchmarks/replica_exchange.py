@@ -0,0 +1,39 @@
+from __future__ import print_function
+
+import multiprocessing
+import sys
+import time
+
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+if __name__ == '__main__':
+    states = int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count()
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    steps = 20
+    case = 'q-SPC-FW'
+    pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+    forcefield = app.ForceField('../tests/data/%s.xml' % case)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=0.9*unit.nanometers,
+                                     constraints=app.HBonds)
+    dof = atomsmm.countDegreesOfFreedom(system)
+    temperatures = [(300 + 2*i)*unit.kelvin for i in range(states)]
+    propagators = list()
+    for T in temperatures:
+        thermostat = atomsmm.NoseHooverLangevinPropagator(T, dof, 0.1*unit.picoseconds, 10/unit.picoseconds)
+        propagators.append(atomsmm.TrotterSuzukiPropagator(atomsmm.VelocityVerletPropagator(), thermostat))
+
+    print('%10s %15s %15s  %s' % ('processes', 'time/cycle(s)', 'time/step(ms)', 'acceptance ratios'))
+    processes = 1
+    while processes <= min(states, multiprocessing.cpu_count()):
+        with atomsmm.ReplicaExchange(system, pdb.positions, temperatures, propagators, 1*unit.femtoseconds,
+                                     processes=processes, seed=1) as simulation:
+            simulation.run(1, steps)
+            start = time.time()
+            simulation.run(cycles, steps)
+            elapsed = (time.time() - start)/cycles
+            ratios = ' '.join('%.2f' % x for x in simulation.acceptanceRatios())
+        print('%10d %15.4f %15.4f  %s' % (processes, elapsed, 1000*elapsed/steps, ratios))
+        processes *= 2
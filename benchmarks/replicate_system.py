@@ -0,0 +1,26 @@
+from __future__ import print_function
+
+import sys
+import time
+
+from simtk import openmm
+from simtk.openmm import app
+
+import atomsmm
+
+maxAtoms = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**6
+case = 'emim_BCN4_Jiung2014'
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=openmm.app.PME)
+N = system.getNumParticles()
+
+print('cells\tatoms\ttime (s)\ttime per atom (us)')
+n = 1
+while N*n**3 <= maxAtoms:
+    start = time.time()
+    atomsmm.replicateSystem(system, pdb.topology, pdb.positions, (n, n, n))
+    elapsed = time.time() - start
+    print('%dx%dx%d\t%d\t%.2f\t%.2f' % (n, n, n, N*n**3, elapsed, 1e6*elapsed/(N*n**3)))
+    n *= 2
@@ -0,0 +1,44 @@
+from __future__ import print_function
+
+import sys
+import time
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+platform = sys.argv[1] if len(sys.argv) > 1 else 'CPU'
+steps = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+dt = 8*unit.femtoseconds
+
+pdb = app.PDBFile('../tests/data/emim_BCN4_Jiung2014.pdb')
+forcefield = app.ForceField('../tests/data/emim_BCN4_Jiung2014.xml')
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=10*unit.angstroms,
+                                 constraints=app.HBonds)
+near = atomsmm.NearNonbondedForce(7*unit.angstroms, 6*unit.angstroms).setForceGroup(1)
+far = atomsmm.FarNonbondedForce(near, 10*unit.angstroms, 9*unit.angstroms).setForceGroup(2)
+with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+    for force in [atomsmm.NonbondedExceptionsForce(), near, far]:
+        force.importFrom(nbforce).addTo(system)
+
+titles = ('loops', 'program', 'computations', 'context(s)', 'first step(s)', 'step(ms)')
+print('%-12s %-10s %14s %12s %14s %12s' % titles)
+for loops in [[4, 2, 1], [4, 4, 4], [8, 8, 4]]:
+    for unrolled in [True, False]:
+        integrator = atomsmm.RespaPropagator(loops, unrolled=unrolled).integrator(dt)
+        start = time.time()
+        context = openmm.Context(system, integrator, openmm.Platform.getPlatformByName(platform))
+        creation = time.time() - start
+        context.setPositions(pdb.positions)
+        context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+        start = time.time()
+        integrator.step(1)
+        first = time.time() - start
+        start = time.time()
+        integrator.step(steps)
+        elapsed = (time.time() - start)/steps
+        program = 'unrolled' if unrolled else 'loops'
+        values = (loops, program, integrator.getNumComputations(), creation, first, 1000*elapsed)
+        print('%-12s %-10s %14d %12.3f %14.3f %12.3f' % values)
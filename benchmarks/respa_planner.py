@@ -0,0 +1,50 @@
+from __future__ import print_function
+
+import sys
+import time
+from copy import deepcopy
+
+import numpy as np
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+case = sys.argv[1] if len(sys.argv) > 1 else 'emim_BCN4_Jiung2014'
+steps = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+dt = 4*unit.femtoseconds
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=10*unit.angstroms,
+                                 rigidWater=False)
+near = atomsmm.NearNonbondedForce(7*unit.angstroms, 6*unit.angstroms).setForceGroup(1)
+far = atomsmm.FarNonbondedForce(near, 10*unit.angstroms, 9*unit.angstroms).setForceGroup(2)
+with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+    for force in [atomsmm.NonbondedExceptionsForce(), near, far]:
+        force.importFrom(nbforce).addTo(system)
+
+start = time.time()
+planner = atomsmm.RespaPlanner(system, pdb.positions, dt, seed=1)
+print('Planning time: %.1f s' % (time.time() - start))
+print(planner)
+
+manual = deepcopy(system)
+planned = deepcopy(system)
+loops = planner.apply(planned)
+print('\n%-10s %-16s %14s %20s' % ('setup', 'loops', 'step(ms)', 'energy drift(kJ/mol)'))
+for (name, model, respaLoops) in [('manual', manual, [4, 2, 1]), ('planned', planned, loops)]:
+    integrator = atomsmm.RespaPropagator(respaLoops).integrator(dt)
+    context = openmm.Context(model, integrator, openmm.Platform.getPlatformByName('CPU'))
+    context.setPositions(pdb.positions)
+    context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    energies = []
+    start = time.time()
+    for i in range(steps//10):
+        integrator.step(10)
+        state = context.getState(getEnergy=True)
+        energies.append((state.getPotentialEnergy() + state.getKineticEnergy()).value_in_unit(unit.kilojoules_per_mole))
+    elapsed = (time.time() - start)/steps
+    drift = np.polyfit(np.arange(len(energies)), energies, 1)[0]*len(energies)
+    print('%-10s %-16s %14.3f %20.3f' % (name, respaLoops, 1000*elapsed, drift))
@@ -0,0 +1,42 @@
+from __future__ import print_function
+
+import sys
+import tempfile
+import time
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+case = sys.argv[1] if len(sys.argv) > 1 else 'emim_BCN4_Jiung2014'
+steps = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+dt = 1*unit.femtoseconds
+
+pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+forcefield = app.ForceField('../tests/data/%s.xml' % case)
+system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=10*unit.angstroms,
+                                 constraints=app.HBonds)
+integrator = atomsmm.VelocityVerletPropagator().integrator(dt)
+directory = tempfile.mkdtemp()
+
+start = time.time()
+platform, properties = atomsmm.selectPlatform(system, pdb.positions, integrator, directory=directory)
+print('Selection (trials): %.3f s -> %s %s' % (time.time() - start, platform.getName(), properties))
+start = time.time()
+atomsmm.selectPlatform(system, pdb.positions, integrator, directory=directory)
+print('Selection (cached): %.3f s' % (time.time() - start))
+
+print('\n%-56s %12s' % ('configuration', 'step(ms)'))
+configurations = [('CPU (default properties)', openmm.Platform.getPlatformByName('CPU'), {}),
+                  ('%s %s' % (platform.getName(), properties), platform, properties)]
+for (name, trialPlatform, trialProperties) in configurations:
+    simulation = app.Simulation(pdb.topology, system, atomsmm.VelocityVerletPropagator().integrator(dt),
+                                trialPlatform, trialProperties)
+    simulation.context.setPositions(pdb.positions)
+    simulation.context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    simulation.step(1)
+    start = time.time()
+    simulation.step(steps)
+    print('%-56s %12.3f' % (name, 1000*(time.time() - start)/steps))
@@ -0,0 +1,173 @@
+from __future__ import print_function
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+from copy import deepcopy
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+rswitchIn = 6.0*unit.angstroms
+rcutIn = 7.0*unit.angstroms
+rswitch = 9.0*unit.angstroms
+rcut = 10*unit.angstroms
+alpha = 0.29/unit.angstroms
+temp = 300*unit.kelvin
+dt = 1*unit.femtoseconds
+
+
+def readCase(case, cells):
+    pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+    forcefield = app.ForceField('../tests/data/%s.xml' % case)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=rcut,
+                                     constraints=app.HBonds)
+    if cells == 1:
+        return system, pdb.topology, pdb.positions
+    return atomsmm.replicateSystem(system, pdb.topology, pdb.positions, (cells, cells, cells))
+
+
+def splitSystem(system):
+    system = deepcopy(system)
+    exceptions = atomsmm.NonbondedExceptionsForce().setForceGroup(0)
+    near = atomsmm.NearNonbondedForce(rcutIn, rswitchIn).setForceGroup(1)
+    far = atomsmm.FarNonbondedForce(near, rcut, rswitch).setForceGroup(2)
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        for force in [exceptions, near, far]:
+            force.importFrom(nbforce).addTo(system)
+    return system
+
+
+def singleForceSystem(system, force):
+    system = deepcopy(system)
+    for index in reversed(range(system.getNumForces())):
+        if not isinstance(system.getForce(index), openmm.NonbondedForce):
+            system.removeForce(index)
+    with atomsmm.detachForce(system, 0) as nbforce:
+        force.importFrom(nbforce).addTo(system)
+    return system
+
+
+def createContext(system, integrator, positions):
+    cpu = openmm.Platform.getPlatformByName('CPU')
+    context = openmm.Context(system, integrator, cpu)
+    context.setPositions(positions)
+    context.setVelocitiesToTemperature(temp, 1)
+    return context
+
+
+def timeit(function, repeats):
+    samples = []
+    for i in range(repeats):
+        start = time.time()
+        function()
+        samples.append(time.time() - start)
+    return samples
+
+
+def forceBenchmarks(system, positions, repeats):
+    near = atomsmm.NearNonbondedForce(rcutIn, rswitchIn)
+    forces = {'NearNonbondedForce': near,
+              'FarNonbondedForce': atomsmm.FarNonbondedForce(near, rcut, rswitch),
+              'FarDampedShiftedForce': atomsmm.FarDampedShiftedForce(near, alpha, rcut, rswitch),
+              'FarReactionFieldForce': atomsmm.FarReactionFieldForce(near, rcut, rswitch),
+              'DampedSmoothedForce': atomsmm.DampedSmoothedForce(alpha, rcut, rswitch)}
+    for (name, force) in forces.items():
+        context = createContext(singleForceSystem(system, force), openmm.VerletIntegrator(0.0), positions)
+        context.getState(getForces=True)
+        yield name, timeit(lambda: context.getState(getForces=True, groups=set([0])), repeats)
+
+
+def propagatorBenchmarks(system, positions, repeats, steps):
+    dof = atomsmm.countDegreesOfFreedom(system)
+    thermostats = {'VelocityRescaling': atomsmm.VelocityRescalingPropagator(temp, dof, 0.1*unit.picoseconds),
+                   'NoseHooverLangevin': atomsmm.NoseHooverLangevinPropagator(temp, dof, 0.1*unit.picoseconds,
+                                                                              10/unit.picoseconds)}
+    cases = {'VelocityVerletPropagator': (system, atomsmm.VelocityVerletPropagator()),
+             'RespaPropagator': (splitSystem(system), atomsmm.RespaPropagator([2, 2, 1]))}
+    for (name, thermostat) in thermostats.items():
+        propagator = atomsmm.TrotterSuzukiPropagator(atomsmm.VelocityVerletPropagator(), thermostat)
+        cases['TrotterSuzukiPropagator(%s)' % name] = (system, propagator)
+    for (name, (model, propagator)) in cases.items():
+        integrator = propagator.integrator(dt)
+        integrator.setRandomNumberSeed(1)
+        context = createContext(model, integrator, positions)
+        context.getIntegrator().step(1)
+        yield name, [t/steps for t in timeit(lambda: context.getIntegrator().step(steps), repeats)]
+
+
+def setupBenchmarks(system, topology, positions, repeats):
+    def importForces():
+        splitSystem(system)
+    yield 'importFrom', timeit(importForces, repeats)
+    yield 'splitPotentialEnergy', timeit(lambda: atomsmm.splitPotentialEnergy(system, topology, positions), repeats)
+    decomposer = atomsmm.EnergyDecomposer(system)
+    yield 'EnergyDecomposer.compute', timeit(lambda: decomposer.compute(positions), repeats)
+
+
+def run(cases, cells, repeats, steps):
+    results = dict()
+    for (case, n) in [(case, n) for case in cases for n in cells]:
+        system, topology, positions = readCase(case, n)
+        suites = [setupBenchmarks(system, topology, positions, repeats),
+                  forceBenchmarks(system, positions, repeats),
+                  propagatorBenchmarks(system, positions, repeats, steps)]
+        for suite in suites:
+            for (name, samples) in suite:
+                key = '%s/%dx%dx%d/%s' % (case, n, n, n, name)
+                samples.sort()
+                results[key] = dict(atoms=system.getNumParticles(), median=samples[len(samples)//2],
+                                    min=samples[0], samples=samples)
+                print('%-60s %12.6f s' % (key, results[key]['median']))
+    return results
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD']).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new, tolerance):
+    with open(old) as f:
+        before = json.load(f)['results']
+    with open(new) as f:
+        after = json.load(f)['results']
+    regressions = 0
+    for key in sorted(set(before) & set(after)):
+        ratio = after[key]['median']/before[key]['median']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = 'SLOWER'
+            regressions += 1
+        elif ratio < 1 - tolerance:
+            flag = 'faster'
+        print('%-60s %8.3f %s' % (key, ratio, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='AtomsMM benchmark suite (CPU platform)')
+    parser.add_argument('--cases', nargs='+', default=['q-SPC-FW', 'emim_BCN4_Jiung2014'])
+    parser.add_argument('--cells', nargs='+', type=int, default=[1],
+                        help='numbers n of unit cells in each direction of n x n x n supercells')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--output', default='benchmarks.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files instead of running the benchmarks')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+    if args.compare:
+        raise SystemExit(1 if compare(args.compare[0], args.compare[1], args.tolerance) else 0)
+    results = run(args.cases, args.cells, args.repeats, args.steps)
+    info = dict(revision=revision(), date=time.strftime('%Y-%m-%d %H:%M:%S'), host=platform.node(),
+                openmm=openmm.Platform.getOpenMMVersion(), python=platform.python_version())
+    with open(args.output, 'w') as f:
+        json.dump(dict(info=info, results=results), f, indent=2, sort_keys=True)
@@ -0,0 +1,42 @@
+from __future__ import print_function
+
+import shutil
+import sys
+import tempfile
+import time
+
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+cells = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+case = 'emim_BCN4_Jiung2014'
+
+
+def build(pdbfile, xmlfile, cells, rcutIn, rswitchIn, rcut, rswitch):
+    pdb = app.PDBFile(pdbfile)
+    forcefield = app.ForceField(xmlfile)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=rcut,
+                                     constraints=app.HBonds)
+    system, topology, positions = atomsmm.replicateSystem(system, pdb.topology, pdb.positions, (cells,)*3)
+    exceptions = atomsmm.NonbondedExceptionsForce().setForceGroup(0)
+    near = atomsmm.NearNonbondedForce(rcutIn, rswitchIn).setForceGroup(1)
+    far = atomsmm.FarNonbondedForce(near, rcut, rswitch).setForceGroup(2)
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        for force in [exceptions, near, far]:
+            force.importFrom(nbforce).addTo(system)
+    return system
+
+
+inputs = ('../tests/data/%s.pdb' % case, '../tests/data/%s.xml' % case, cells,
+          7*unit.angstroms, 6*unit.angstroms, 10*unit.angstroms, 9*unit.angstroms)
+directory = tempfile.mkdtemp()
+cache = atomsmm.SystemCache(directory)
+try:
+    for label in ['miss (build and store)', 'hit (load)']:
+        start = time.time()
+        system = cache.system(build, *inputs)
+        print('%-25s %8.3f s  (%d atoms)' % (label, time.time() - start, system.getNumParticles()))
+finally:
+    shutil.rmtree(directory)
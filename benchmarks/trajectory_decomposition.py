@@ -0,0 +1,41 @@
+from __future__ import print_function
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+if __name__ == '__main__':
+    nframes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    case = 'emim_BCN4_Jiung2014'
+
+    pdb = app.PDBFile('../tests/data/%s.pdb' % case)
+    forcefield = app.ForceField('../tests/data/%s.xml' % case)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=openmm.app.PME)
+
+    x0 = np.array(pdb.positions.value_in_unit(unit.nanometers))
+    random = np.random.RandomState(1)
+    trajectory = x0 + 0.001*random.randn(nframes, *x0.shape)
+    file = os.path.join(tempfile.mkdtemp(), 'trajectory.npy')
+    np.save(file, trajectory)
+
+    ncores = multiprocessing.cpu_count()
+    print('processes\ttime (s)\tframes/s\tspeedup')
+    for processes in sorted(set([1, 2, 4, 8, 16, 32, ncores])):
+        if processes > ncores:
+            continue
+        start = time.time()
+        atomsmm.decomposeTrajectory(system, file, processes=processes, chunkSize=10,
+                                    properties={'Threads': '1'})
+        elapsed = time.time() - start
+        if processes == 1:
+            serial = elapsed
+        print('%d\t%.2f\t%.1f\t%.2f' % (processes, elapsed, nframes/elapsed, serial/elapsed))
@@ -6,6 +6,7 @@ from simtk.openmm import app
 from sys import stdout
 
 import atomsmm
+import atomsmm.reporters
 
 nsteps = 10000
 ndisp = 100
@@ -32,13 +33,13 @@ system = forcefield.createSystem(pdb.topology, nonbondedMethod=openmm.app.PME,
 nbforceIndex = atomsmm.findNonbondedForce(system)
 dof = atomsmm.countDegreesOfFreedom(system)
 if mts:
-    nbforce = atomsmm.hijackForce(system, nbforceIndex)
     exceptions = atomsmm.NonbondedExceptionsForce().setForceGroup(0)
     innerForce = atomsmm.NearNonbondedForce(rcutIn, rswitchIn, shift).setForceGroup(1)
     outerForce = atomsmm.FarNonbondedForce(innerForce, rcut, rswitch).setForceGroup(2)
-    for force in [exceptions, innerForce, outerForce]:
-        force.importFrom(nbforce)
-        force.addTo(system)
+    with atomsmm.detachForce(system, nbforceIndex) as nbforce:
+        for force in [exceptions, innerForce, outerForce]:
+            force.importFrom(nbforce)
+            force.addTo(system)
     NVE = atomsmm.RespaPropagator([2,2,1])
     integrator = atomsmm.GlobalThermostatIntegrator(dt, NVE)
 else:
@@ -64,8 +65,9 @@ simulation.context.setVelocitiesToTemperature(300*unit.kelvin, seed)
 
 outputs = [stdout, 'output.csv']
 separators = ['\t', ',']
+reporters = list()
 for (out, sep) in zip(outputs, separators):
-    simulation.reporters.append(openmm.app.StateDataReporter(out, ndisp,
+    reporters.append(openmm.app.StateDataReporter(out, ndisp,
         step=True,
         potentialEnergy=True,
         kineticEnergy=True,
@@ -75,6 +77,7 @@ for (out, sep) in zip(outputs, separators):
         speed=True,
         totalSteps=nsteps,
         separator=sep))
+simulation.reporters.append(atomsmm.reporters.multiplexedReporter(reporters))
 # simulation.reporters.append(openmm.app.PDBReporter('output.pdb', nsteps))
 
 print('Running Production...')
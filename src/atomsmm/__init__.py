@@ -1,26 +1,58 @@
 __version__ = "0.1.0"
 
+from .analysis import DCDReader  # noqa: F401
+from .analysis import ForceEvaluator  # noqa: F401
+from .analysis import decomposeTrajectory  # noqa: F401
+from .exchange import ReplicaExchange  # noqa: F401
 from .forces import DampedSmoothedForce  # noqa: F401
+from .forces import FarDampedShiftedForce  # noqa: F401
 from .forces import FarNonbondedForce  # noqa: F401
+from .forces import FarReactionFieldForce  # noqa: F401
 from .forces import NearNonbondedForce  # noqa: F401
 from .forces import NonbondedExceptionsForce  # noqa: F401
 from .integrators import GlobalThermostatIntegrator  # noqa: F401
 from .propagators import ChainedPropagator  # noqa: F401
+from .propagators import GuardedPropagator  # noqa: F401
 from .propagators import NoseHooverLangevinPropagator  # noqa: F401
 from .propagators import RespaPropagator  # noqa: F401
 from .propagators import TrotterSuzukiPropagator  # noqa: F401
 from .propagators import VelocityRescalingPropagator  # noqa: F401
 from .propagators import VelocityVerletPropagator  # noqa: F401
+from .systems import SystemCache  # noqa: F401
+from .systems import assignReplicas  # noqa: F401
+from .systems import batchReplicas  # noqa: F401
+from .systems import replicateSystem  # noqa: F401
+from .tuning import ForceGroupProfile  # noqa: F401
+from .tuning import PairWorkProfile  # noqa: F401
+from .tuning import RespaPlanner  # noqa: F401
+from .tuning import selectPlatform  # noqa: F401
+from .utils import BlowUpError  # noqa: F401
+from .utils import EnergyDecomposer  # noqa: F401
 from .utils import countDegreesOfFreedom  # noqa: F401
+from .utils import detachForce  # noqa: F401
 from .utils import findNonbondedForce  # noqa: F401
 from .utils import hijackForce  # noqa: F401
+from .utils import loadCheckpoint  # noqa: F401
+from .utils import saveCheckpoint  # noqa: F401
 from .utils import splitPotentialEnergy  # noqa: F401
 
+__analysis__ = [
+    'DCDReader',
+    'decomposeTrajectory',
+    'ForceEvaluator',
+    ]  # noqa E123
+
+__exchange__ = [
+    'ReplicaExchange',
+    ]  # noqa E123
+
 __forces__ = [
     'DampedSmoothedForce',
     'NonbondedExceptionsForce',
     'NearNonbondedForce',
     'FarNonbondedForce',
+    'FarDampedShiftedForce',
+    'FarReactionFieldForce',
     ]  # noqa E123
 
 __integrators__ = [
@@ -29,6 +61,7 @@ __integrators__ = [
 
 __propagators__ = [
     'ChainedPropagator',
+    'GuardedPropagator',
     'TrotterSuzukiPropagator',
     'VelocityVerletPropagator',
     'RespaPropagator',
@@ -36,11 +69,30 @@ __propagators__ = [
     'NoseHooverLangevinPropagator',
     ]  # noqa E123
 
+__systems__ = [
+    'SystemCache',
+    'assignReplicas',
+    'batchReplicas',
+    'replicateSystem',
+    ]  # noqa E123
+
+__tuning__ = [
+    'ForceGroupProfile',
+    'PairWorkProfile',
+    'RespaPlanner',
+    'selectPlatform',
+    ]  # noqa E123
+
 __utils__ = [
+    'BlowUpError',
+    'EnergyDecomposer',
     'countDegreesOfFreedom',
+    'detachForce',
     'findNonbondedForce',
     'hijackForce',
+    'loadCheckpoint',
+    'saveCheckpoint',
     'splitPotentialEnergy',
     ]  # noqa E123
 
-__all__ = __forces__ + __integrators__ + __propagators__ + __utils__
+__all__ = __analysis__ + __exchange__ + __forces__ + __integrators__ + __propagators__ + __systems__ + __tuning__ + __utils__
@@ -0,0 +1,550 @@
+"""
+.. module:: analysis
+   :platform: Unix, Windows
+   :synopsis: a module for post-processing simulation trajectories.
+
+.. moduleauthor:: Charlles R. A. Abreu <abreu@eq.ufrj.br>
+
+.. _DCD: http://www.ks.uiuc.edu/Research/vmd/plugins/molfile/dcdplugin.html
+.. _Force: http://docs.openmm.org/latest/api-python/generated/simtk.openmm.openmm.Force.html
+
+"""
+
+import math
+import multiprocessing
+import struct
+
+import numpy as np
+from simtk import openmm
+from simtk import unit
+
+from atomsmm.forces import NearNonbondedForce
+from atomsmm.utils import EnergyDecomposer
+from atomsmm.utils import InputError
+from atomsmm.utils import _minimumImage
+from atomsmm.utils import _termNames
+
+_Kc = 138.935456
+
+
+class DCDReader:
+    """
+    A reader of DCD_ trajectory files which maps the file into memory instead of loading it. Frames
+    are only read from disk when requested.
+
+    Parameters
+    ----------
+        file : str
+            The name of the DCD file.
+
+    Attributes
+    ----------
+        numAtoms : int
+            The number of atoms in each frame.
+        numFrames : int
+            The number of frames in the file.
+
+    """
+    def __init__(self, file):
+        self.file = file
+        with open(file, 'rb') as f:
+            record = self._readRecord(f)
+            if len(record) != 84 or record[0:4] != b'CORD':
+                raise InputError("file %s is not a valid DCD file" % file)
+            self._hasCell = struct.unpack('<i', record[44:48])[0] != 0
+            self._readRecord(f)
+            self.numAtoms = struct.unpack('<i', self._readRecord(f))[0]
+            offset = f.tell()
+        fields = list()
+        if self._hasCell:
+            fields += [('cellHead', '<i4'), ('cell', '<f8', 6), ('cellTail', '<i4')]
+        for axis in ['x', 'y', 'z']:
+            fields += [(axis + 'Head', '<i4'), (axis, '<f4', self.numAtoms), (axis + 'Tail', '<i4')]
+        dtype = np.dtype(fields)
+        with open(file, 'rb') as f:
+            f.seek(0, 2)
+            self.numFrames = (f.tell() - offset)//dtype.itemsize
+        if self.numFrames > 0:
+            self._frames = np.memmap(file, dtype, 'r', offset, (self.numFrames,))
+        else:
+            self._frames = np.empty(0, dtype)
+
+    def _readRecord(self, f):
+        size = struct.unpack('<i', f.read(4))[0]
+        record = f.read(size)
+        f.read(4)
+        return record
+
+    def positions(self, start, stop):
+        """
+        Reads the atom positions of a range of frames.
+
+        Parameters
+        ----------
+            start : int
+                The index of the first frame.
+            stop : int
+                The index after the last frame.
+
+        Returns
+        -------
+            numpy.ndarray
+                An array of shape `(stop-start, numAtoms, 3)` containing the positions in nanometers.
+
+        """
+        frames = self._frames[start:stop]
+        return 0.1*np.stack([frames['x'], frames['y'], frames['z']], axis=-1).astype(np.float64)
+
+    def boxVectors(self, index):
+        """
+        Reads the periodic box vectors of a given frame.
+
+        Parameters
+        ----------
+            index : int
+                The index of the frame.
+
+        Returns
+        -------
+            tuple(openmm.Vec3) or None
+                The box vectors in nanometers, or None if the file contains no unit cell data.
+
+        """
+        if not self._hasCell:
+            return None
+        a, cosGamma, b, cosBeta, cosAlpha, c = self._frames[index]['cell']
+        a, b, c = 0.1*a, 0.1*b, 0.1*c
+        if any(abs(x) > 1.0 for x in [cosAlpha, cosBeta, cosGamma]):
+            # Some programs store angles in degrees rather than their cosines:
+            cosAlpha, cosBeta, cosGamma = [math.cos(math.radians(x)) for x in [cosAlpha, cosBeta, cosGamma]]
+        sinGamma = math.sqrt(1 - cosGamma**2)
+        cx = cosBeta
+        cy = (cosAlpha - cosBeta*cosGamma)/sinGamma
+        cz = math.sqrt(1 - cx**2 - cy**2)
+        return (openmm.Vec3(a, 0, 0), openmm.Vec3(b*cosGamma, b*sinGamma, 0), openmm.Vec3(c*cx, c*cy, c*cz))
+
+
+class _ArrayReader:
+    def __init__(self, file):
+        self.file = file
+        self._positions = np.load(file, mmap_mode='r')
+        if self._positions.ndim != 3 or self._positions.shape[2] != 3:
+            raise InputError("array in file %s must have shape (frames, atoms, 3)" % file)
+        self.numFrames, self.numAtoms = self._positions.shape[0:2]
+
+    def positions(self, start, stop):
+        return np.array(self._positions[start:stop], dtype=np.float64)
+
+    def boxVectors(self, index):
+        return None
+
+
+def _openTrajectory(file):
+    if file.lower().endswith('.npy'):
+        return _ArrayReader(file)
+    return DCDReader(file)
+
+
+def _decompose(decomposer, reader, start, stop):
+    positions = reader.positions(start, stop)
+    energies = np.empty((stop - start, len(decomposer.terms) + 1))
+    for (row, frame) in enumerate(range(start, stop)):
+        energy = decomposer.compute(positions[row], reader.boxVectors(frame))
+        for (column, term) in enumerate(decomposer.terms + ["Total"]):
+            energies[row, column] = energy[term].value_in_unit(unit.kilojoules_per_mole)
+    return energies
+
+
+_worker = dict()
+
+
+def _initializeWorker(serializedSystem, platform, properties, file):
+    system = openmm.XmlSerializer.deserialize(serializedSystem)
+    _worker["decomposer"] = EnergyDecomposer(system, platform, properties)
+    _worker["reader"] = _openTrajectory(file)
+
+
+def _decomposeChunk(chunk):
+    return _decompose(_worker["decomposer"], _worker["reader"], *chunk)
+
+
+def decomposeTrajectory(system, trajectory, output=None, platform='CPU', properties=None,
+                        processes=None, chunkSize=100):
+    """
+    Computes the potential energy contributions of all Force_ objects attached to a system for
+    every frame of a trajectory. Frames are streamed from disk in chunks, which are distributed
+    over a pool of processes. Each process holds a single :class:`~atomsmm.utils.EnergyDecomposer`,
+    which is reused for all chunks it handles.
+
+    .. note::
+        If the CPU platform is used with more than one process and no platform properties are
+        passed, each Context is restricted to a single thread in order to avoid oversubscription.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system whose energy is to be computed.
+        trajectory : str
+            The name of a DCD_ file or a NumPy `.npy` file containing an array of shape
+            `(frames, atoms, 3)` with positions in nanometers. In the latter case, the default box
+            vectors of the system are used for all frames.
+        output : str, optional, default=None
+            The name of a NumPy `.npz` file to which the results will be saved.
+        platform : str or openmm.Platform, optional, default='CPU'
+            The platform (or its name) on which the energies will be computed.
+        properties : dict(str, str), optional, default=None
+            A set of values for platform-specific properties.
+        processes : int, optional, default=None
+            The number of worker processes. If this is None, the number of available cores is used.
+            If this is 1, all computations are done in the calling process.
+        chunkSize : int, optional, default=100
+            The number of frames read and processed at once by a worker process.
+
+    Returns
+    -------
+        dict(str, numpy.ndarray)
+            A dict whose keys are the names of the potential energy terms (as in
+            :func:`~atomsmm.utils.splitPotentialEnergy`) and whose values are arrays with the
+            energies (in kJ/mol) of all frames.
+
+    """
+    if isinstance(platform, openmm.Platform):
+        platform = platform.getName()
+    reader = _openTrajectory(trajectory)
+    if reader.numAtoms != system.getNumParticles():
+        raise InputError("number of atoms in trajectory does not match the system")
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    chunks = [(start, min(start + chunkSize, reader.numFrames))
+              for start in range(0, reader.numFrames, chunkSize)]
+    processes = max(1, min(processes, len(chunks)))
+    if processes == 1:
+        decomposer = EnergyDecomposer(system, platform, properties)
+        terms = decomposer.terms + ["Total"]
+        results = [_decompose(decomposer, reader, *chunk) for chunk in chunks]
+    else:
+        if properties is None and platform == 'CPU':
+            properties = {'Threads': '1'}
+        terms = _termNames(system) + ["Total"]
+        initargs = (openmm.XmlSerializer.serialize(system), platform, properties, trajectory)
+        pool = multiprocessing.Pool(processes, _initializeWorker, initargs)
+        try:
+            results = pool.map(_decomposeChunk, chunks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    if results:
+        energies = np.concatenate(results)
+    else:
+        energies = np.empty((0, len(terms)))
+    table = dict((term, np.ascontiguousarray(energies[:, column])) for (column, term) in enumerate(terms))
+    if output is not None:
+        np.savez(output, **table)
+    return table
+
+
+def _erfc(x):
+    try:
+        from scipy.special import erfc
+    except ImportError:
+        erfc = np.vectorize(math.erfc, otypes=[np.float64])
+    return erfc(x)
+
+
+def _boxHeights(box):
+    volume = abs(np.linalg.det(box))
+    return np.array([volume/np.linalg.norm(np.cross(box[(k+1) % 3], box[(k+2) % 3])) for k in range(3)])
+
+
+def _cellPairs(positions, box, cutoff, chunkSize):
+    """
+    Yields chunks of pairs `(i, j, delta)` with `i < j` and minimum-image displacements `delta`
+    shorter than `cutoff`, found by means of a periodic cell list.
+
+    """
+    N = len(positions)
+    cells = np.floor(_boxHeights(box)/cutoff).astype(int)
+    # With fewer than 3 cells along a direction, neighbor cells would repeat. Such a direction is
+    # then spanned by a single cell, whose pairs along it are handled by the minimum image:
+    cells[cells < 3] = 1
+    fractional = positions.dot(np.linalg.inv(box))
+    fractional -= np.floor(fractional)
+    coordinates = np.minimum((fractional*cells).astype(int), cells - 1)
+    flat = np.ravel_multi_index(coordinates.T, cells)
+    numCells = int(np.prod(cells))
+    order = np.argsort(flat, kind='stable')
+    counts = np.bincount(flat, minlength=numCells)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    table = np.full((numCells, max(counts.max(), 1)), -1, dtype=np.int64)
+    table[flat[order], np.arange(N) - starts[flat[order]]] = order
+    width = table.shape[1]
+    grid = np.array(np.unravel_index(np.arange(numCells), cells)).T
+    shifts = [[-1, 0, 1] if n > 1 else [0] for n in cells]
+    offsets = [(dx, dy, dz) for dz in shifts[2] for dy in shifts[1] for dx in shifts[0] if (dz, dy, dx) >= (0, 0, 0)]
+    # Blocks of whole cells are processed at once if possible. Otherwise, cells are split into
+    # blocks of rows, so that the number of candidate pairs per chunk remains bounded:
+    step = max(1, chunkSize//width**2)
+    rows = width if step > 1 else max(1, chunkSize//width)
+    for offset in offsets:
+        neighbors = np.ravel_multi_index(((grid + np.array(offset)) % cells).T, cells)
+        for start in range(0, numCells, step):
+            for row in range(0, width, rows):
+                first = table[start:start+step, row:row+rows][:, :, None]
+                second = table[neighbors[start:start+step]][:, None, :]
+                first, second = np.broadcast_arrays(first, second)
+                valid = (first >= 0) & (second >= 0)
+                if offset == (0, 0, 0):
+                    valid &= first < second
+                i, j = first[valid], second[valid]
+                delta = _minimumImage(positions[j] - positions[i], box)
+                inside = np.sum(delta**2, axis=1) < cutoff**2
+                i, j, delta = i[inside], j[inside], delta[inside]
+                swap = i > j
+                i[swap], j[swap] = j[swap], i[swap]
+                delta[swap] = -delta[swap]
+                yield i, j, delta
+
+
+def _switching(r, rswitch, rcut, degree=1):
+    """
+    Returns the switching function and its derivative with respect to `r`.
+
+    """
+    S = np.ones_like(r)
+    dS = np.zeros_like(r)
+    if rswitch is None:
+        return S, dS
+    region = r > rswitch
+    u = (r[region]**degree - rswitch**degree)/(rcut**degree - rswitch**degree)
+    dudr = degree*r[region]**(degree - 1)/(rcut**degree - rswitch**degree)
+    S[region] = 1 + u**3*(15*u - 6*u**2 - 10)
+    dS[region] = -30*u**2*(1 - u)**2*dudr
+    return S, dS
+
+
+def _lennardJones(r, sigma, epsilon):
+    sr6 = (sigma/r)**6
+    return 4*epsilon*(sr6 - 1)*sr6, -24*epsilon*(2*sr6 - 1)*sr6/r
+
+
+def _nearPotential(r, chargeprod, sigma, epsilon, near):
+    U, dU = _lennardJones(r, sigma, epsilon)
+    U += _Kc*chargeprod/r
+    dU -= _Kc*chargeprod/r**2
+    if near["shifted"]:
+        U -= _lennardJones(near["rcut"], sigma, epsilon)[0] + _Kc*chargeprod/near["rcut"]
+    S, dS = _switching(r, near["rswitch"], near["rcut"])
+    inside = r < near["rcut"]
+    return np.where(inside, U*S, 0.0), np.where(inside, dU*S + U*dS, 0.0)
+
+
+def _dampedCoulomb(r, chargeprod, alpha):
+    erfc = _erfc(alpha*r)
+    U = _Kc*chargeprod*erfc/r
+    return U, -U/r - _Kc*chargeprod*2*alpha/math.sqrt(math.pi)*np.exp(-(alpha*r)**2)/r
+
+
+def _nanometers(vectors):
+    if unit.is_quantity(vectors):
+        vectors = vectors.value_in_unit(unit.nanometers)
+    vectors = [v.value_in_unit(unit.nanometers) if unit.is_quantity(v) else v for v in vectors]
+    return np.array([[v[0], v[1], v[2]] for v in vectors], dtype=np.float64)
+
+
+def _quantity(value, name):
+    if unit.is_quantity(value):
+        return value.value_in_unit(unit.nanometers if name != "alpha" else unit.nanometers**(-1))
+    return value
+
+
+class ForceEvaluator:
+    """
+    A pure NumPy evaluator of the energy and forces of a :class:`~atomsmm.forces.NearNonbondedForce`,
+    :class:`~atomsmm.forces.FarNonbondedForce`, or :class:`~atomsmm.forces.DampedSmoothedForce`,
+    which requires no OpenMM Context. Pairs are found by means of a periodic cell list and
+    processed in chunks of bounded size. This is useful for evaluating these potentials for many
+    frames of a trajectory or for scanning over their parameters (e.g. switching distances and
+    damping parameters), since creating a new AtomsMM force and its evaluator is cheap.
+
+    The long-range electrostatic part of a :class:`~atomsmm.forces.FarNonbondedForce` is computed
+    by a standard Ewald summation with the same damping parameter as OpenMM's PME, but with a
+    reciprocal-space sum converged to a tighter tolerance. Its long-range dispersion correction is
+    computed as in OpenMM.
+
+    .. note::
+        The parameters of the AtomsMM force object are read from its attributes, so that it does not
+        need to have parameters imported via :func:`~atomsmm.forces.Force.importFrom` nor be added
+        to a system. The per-particle parameters and exceptions are taken from `nbforce` instead.
+        As in the AtomsMM forces, all exceptions are treated as exclusions.
+
+    Parameters
+    ----------
+        force : :class:`~atomsmm.forces.Force`
+            A :class:`~atomsmm.forces.NearNonbondedForce`, :class:`~atomsmm.forces.FarNonbondedForce`,
+            or :class:`~atomsmm.forces.DampedSmoothedForce` object.
+        nbforce : openmm.NonbondedForce
+            The force from which the per-particle parameters and exceptions are taken.
+        boxVectors : tuple(openmm.Vec3) or unit.Quantity
+            The default periodic box vectors.
+        chunkSize : int, optional, default=2**20
+            The approximate maximum number of candidate pairs processed at once.
+
+    """
+    def __init__(self, force, nbforce, boxVectors, chunkSize=2**20):
+        self._kind = force.__class__.__name__
+        if self._kind not in ["NearNonbondedForce", "FarNonbondedForce", "DampedSmoothedForce"]:
+            raise InputError("unsupported force class %s" % self._kind)
+        parameters = [nbforce.getParticleParameters(i) for i in range(nbforce.getNumParticles())]
+        self._charges = np.array([q.value_in_unit(unit.elementary_charge) for (q, sigma, epsilon) in parameters])
+        self._sigmas = np.array([sigma.value_in_unit(unit.nanometers) for (q, sigma, epsilon) in parameters])
+        self._epsilons = np.array([epsilon.value_in_unit(unit.kilojoules_per_mole) for (q, sigma, epsilon) in parameters])
+        exclusions = [nbforce.getExceptionParameters(k)[0:2] for k in range(nbforce.getNumExceptions())]
+        self._exclusions = np.array(sorted((min(i, j), max(i, j)) for (i, j) in exclusions), dtype=np.int64).reshape(-1, 2)
+        self._numParticles = len(parameters)
+        self._exclusionKeys = self._exclusions[:, 0]*self._numParticles + self._exclusions[:, 1]
+        self.boxVectors = boxVectors
+        self.chunkSize = chunkSize
+        if self._kind == "DampedSmoothedForce":
+            self._alpha = _quantity(force.alpha, "alpha")
+            self._rswitch = _quantity(force.rswitch, "rswitch")
+            self.cutoff = _quantity(force.rcut, "rcut")
+            self._degree = force.degree
+        else:
+            near = force.preceding if self._kind == "FarNonbondedForce" else force
+            if not isinstance(near, NearNonbondedForce):
+                raise InputError("argument 'preceding' must be an internal RESPA force")
+            self._near = dict(rcut=_quantity(near.rcut, "rcut"), rswitch=_quantity(near.rswitch, "rswitch"),
+                              shifted=near.shifted)
+            self.cutoff = self._near["rcut"]
+        if self._kind == "FarNonbondedForce":
+            total = force.forces[0]
+            if total.getNonbondedMethod() not in [openmm.NonbondedForce.PME, openmm.NonbondedForce.Ewald]:
+                raise InputError("only PME and Ewald methods are supported")
+            self.cutoff = _quantity(force.rcut, "rcut")
+            self._rswitch = None if force.rswitch is None else _quantity(force.rswitch, "rswitch")
+            self._tolerance = total.getEwaldErrorTolerance()
+            self._alpha = math.sqrt(-math.log(2*self._tolerance))/self.cutoff
+            self._dispersion = self._dispersionCoefficient()
+
+    def _dispersionCoefficient(self):
+        types, counts = np.unique(np.stack([self._sigmas, self._epsilons], axis=1), axis=0, return_counts=True)
+        N = self._numParticles
+        rc = self.cutoff
+        nodes, weights = np.polynomial.legendre.leggauss(64)
+        total = 0.0
+        for a in range(len(types)):
+            for b in range(a, len(types)):
+                count = counts[a]*(counts[a] + 1)/2 if a == b else counts[a]*counts[b]
+                sigma = 0.5*(types[a][0] + types[b][0])
+                epsilon = math.sqrt(types[a][1]*types[b][1])
+                integral = 4*epsilon*(sigma**12/(9*rc**9) - sigma**6/(3*rc**3))
+                if self._rswitch is not None:
+                    r = self._rswitch + 0.5*(rc - self._rswitch)*(nodes + 1)
+                    S = _switching(r, self._rswitch, rc)[0]
+                    U = _lennardJones(r, sigma, epsilon)[0]
+                    integral += 0.5*(rc - self._rswitch)*np.sum(weights*U*(1 - S)*r**2)
+                total += count*integral
+        return 2*math.pi*N**2*total/(N*(N + 1)/2)
+
+    def _pairTerms(self, i, j, r):
+        chargeprod = self._charges[i]*self._charges[j]
+        sigma = 0.5*(self._sigmas[i] + self._sigmas[j])
+        epsilon = np.sqrt(self._epsilons[i]*self._epsilons[j])
+        if self._kind == "NearNonbondedForce":
+            return _nearPotential(r, chargeprod, sigma, epsilon, self._near)
+        if self._kind == "DampedSmoothedForce":
+            U, dU = _lennardJones(r, sigma, epsilon)
+            Uc, dUc = _dampedCoulomb(r, chargeprod, self._alpha)
+            S, dS = _switching(r, self._rswitch, self.cutoff, self._degree)
+            return (U + Uc)*S, (dU + dUc)*S + (U + Uc)*dS
+        U, dU = _lennardJones(r, sigma, epsilon)
+        S, dS = _switching(r, self._rswitch, self.cutoff)
+        Uc, dUc = _dampedCoulomb(r, chargeprod, self._alpha)
+        Un, dUn = _nearPotential(r, chargeprod, sigma, epsilon, self._near)
+        return U*S + Uc - Un, dU*S + U*dS + dUc - dUn
+
+    def _reciprocal(self, positions, box, forces):
+        alpha = self._alpha
+        tolerance = self._tolerance**2
+        kmax = np.ceil(_boxHeights(box)*alpha*math.sqrt(-math.log(tolerance))/math.pi).astype(int)
+        n = np.array(np.meshgrid(*[np.arange(-k, k + 1) for k in kmax], indexing='ij')).reshape(3, -1).T
+        n = n[(n[:, 0] > 0) | ((n[:, 0] == 0) & ((n[:, 1] > 0) | ((n[:, 1] == 0) & (n[:, 2] > 0))))]
+        k = 2*math.pi*n.dot(np.linalg.inv(box).T)
+        k2 = np.sum(k**2, axis=1)
+        keep = k2 <= 4*alpha**2*(-math.log(tolerance))
+        k, k2 = k[keep], k2[keep]
+        volume = abs(np.linalg.det(box))
+        q = self._charges
+        energy = 0.0
+        step = max(1, self.chunkSize//len(q))
+        for start in range(0, len(k), step):
+            kc, k2c = k[start:start+step], k2[start:start+step]
+            A = np.exp(-k2c/(4*alpha**2))/k2c
+            phase = positions.dot(kc.T)
+            cosine, sine = np.cos(phase), np.sin(phase)
+            C, S = q.dot(cosine), q.dot(sine)
+            energy += 4*math.pi*_Kc/volume*np.sum(A*(C**2 + S**2))
+            if forces is not None:
+                weights = A*(sine*C - cosine*S)
+                forces += 8*math.pi*_Kc/volume*q[:, None]*weights.dot(kc)
+        return energy
+
+    def compute(self, positions, boxVectors=None, getForces=True):
+        """
+        Computes the potential energy and, optionally, the forces for a given configuration.
+
+        Parameters
+        ----------
+            positions : list(tuple) or unit.Quantity or numpy.ndarray
+                The positions of all atoms (in nm if no unit is provided).
+            boxVectors : tuple(openmm.Vec3) or unit.Quantity, optional, default=None
+                The periodic box vectors. If this is None, the default box vectors are used.
+            getForces : bool, optional, default=True
+                Whether to compute the forces.
+
+        Returns
+        -------
+            unit.Quantity
+                The potential energy.
+            unit.Quantity
+                An array of shape `(atoms, 3)` containing the forces, or None if `getForces` is
+                False.
+
+        """
+        positions = _nanometers(positions)
+        box = _nanometers(self.boxVectors if boxVectors is None else boxVectors)
+        if any(2*self.cutoff > h for h in _boxHeights(box)):
+            raise InputError("cutoff distance exceeds half the box size")
+        N = self._numParticles
+        forces = np.zeros((N, 3)) if getForces else None
+        energy = 0.0
+        for (i, j, delta) in _cellPairs(positions, box, self.cutoff, self.chunkSize):
+            keep = ~np.isin(i*N + j, self._exclusionKeys)
+            i, j, delta = i[keep], j[keep], delta[keep]
+            r = np.sqrt(np.sum(delta**2, axis=1))
+            U, dU = self._pairTerms(i, j, r)
+            energy += np.sum(U)
+            if getForces:
+                pair = (dU/r)[:, None]*delta
+                for axis in range(3):
+                    forces[:, axis] += np.bincount(i, pair[:, axis], N) - np.bincount(j, pair[:, axis], N)
+        if self._kind == "FarNonbondedForce":
+            q = self._charges
+            energy -= _Kc*self._alpha/math.sqrt(math.pi)*np.sum(q**2)
+            energy += self._reciprocal(positions, box, forces)
+            energy += self._dispersion/abs(np.linalg.det(box))
+            i, j = self._exclusions[:, 0], self._exclusions[:, 1]
+            if len(i) > 0:
+                delta = _minimumImage(positions[j] - positions[i], box)
+                r = np.sqrt(np.sum(delta**2, axis=1))
+                U, dU = _dampedCoulomb(r, q[i]*q[j], self._alpha)
+                U, dU = U - _Kc*q[i]*q[j]/r, dU + _Kc*q[i]*q[j]/r**2
+                energy += np.sum(U)
+                if getForces:
+                    pair = (dU/r)[:, None]*delta
+                    for axis in range(3):
+                        forces[:, axis] += np.bincount(i, pair[:, axis], N) - np.bincount(j, pair[:, axis], N)
+        energy = energy*unit.kilojoules_per_mole
+        if getForces:
+            return energy, forces*unit.kilojoules_per_mole/unit.nanometers
+        return energy, None
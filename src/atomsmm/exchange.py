@@ -0,0 +1,350 @@
+"""
+.. module:: exchange
+   :platform: Unix, Windows
+   :synopsis: a module for running replica-exchange simulations.
+
+.. moduleauthor:: Charlles R. A. Abreu <abreu@eq.ufrj.br>
+
+"""
+
+import multiprocessing
+import traceback
+
+import numpy as np
+from simtk import openmm
+from simtk import unit
+
+from atomsmm.utils import InputError
+from atomsmm.utils import _savez
+
+_R = (unit.BOLTZMANN_CONSTANT_kB*unit.AVOGADRO_CONSTANT_NA).value_in_unit(unit.kilojoules_per_mole/unit.kelvin)
+
+
+def _sharedArrays(numStates, numAtoms, numPersistent):
+    shapes = dict(positions=(numStates, numAtoms, 3), velocities=(numStates, numAtoms, 3),
+                  boxes=(numStates, 3, 3), energies=(numStates,), persistent=(numStates, max(numPersistent, 1)))
+    return dict((name, (multiprocessing.RawArray('d', int(np.prod(shape))), shape)) for (name, shape) in shapes.items())
+
+
+def _views(buffers):
+    return dict((name, np.frombuffer(array, dtype=np.float64).reshape(shape))
+                for (name, (array, shape)) in buffers.items())
+
+
+def _runWorker(connection, *args):
+    # Any failure is reported to the parent process, which would otherwise wait forever:
+    try:
+        _work(connection, *args)
+    except Exception:
+        connection.send(traceback.format_exc())
+    finally:
+        connection.close()
+
+
+def _work(connection, serializedSystem, states, propagators, temperatures, stepSize,
+          platform, properties, buffers, seed):
+    data = _views(buffers)
+    system = openmm.XmlSerializer.deserialize(serializedSystem)
+    platform = openmm.Platform.getPlatformByName(platform)
+    contexts = dict()
+    for state in states:
+        integrator = propagators[state].integrator(stepSize)
+        if seed is not None:
+            integrator.setRandomNumberSeed(seed + state)
+        if properties is None:
+            context = openmm.Context(system, integrator, platform)
+        else:
+            context = openmm.Context(system, integrator, platform, properties)
+        context.setPeriodicBoxVectors(*data["boxes"][state])
+        context.setPositions(data["positions"][state])
+        if seed is None:
+            context.setVelocitiesToTemperature(temperatures[state])
+        else:
+            context.setVelocitiesToTemperature(temperatures[state], seed + state)
+        velocities = context.getState(getVelocities=True).getVelocities(asNumpy=True)
+        data["velocities"][state] = velocities.value_in_unit(unit.nanometers/unit.picoseconds)
+        contexts[state] = context
+    connection.send(None)
+    while True:
+        steps = connection.recv()
+        if steps is None:
+            break
+        for (state, context) in contexts.items():
+            integrator = context.getIntegrator()
+            context.setPeriodicBoxVectors(*data["boxes"][state])
+            context.setPositions(data["positions"][state])
+            context.setVelocities(data["velocities"][state])
+            for (index, name) in enumerate(propagators[state].persistent or []):
+                integrator.setGlobalVariableByName(name, data["persistent"][state, index])
+            integrator.step(steps)
+            result = context.getState(getPositions=True, getVelocities=True, getEnergy=True)
+            data["positions"][state] = result.getPositions(asNumpy=True).value_in_unit(unit.nanometers)
+            data["velocities"][state] = result.getVelocities(asNumpy=True).value_in_unit(unit.nanometers/unit.picoseconds)
+            data["boxes"][state] = result.getPeriodicBoxVectors(asNumpy=True).value_in_unit(unit.nanometers)
+            data["energies"][state] = result.getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole)
+            for (index, name) in enumerate(propagators[state].persistent or []):
+                data["persistent"][state, index] = integrator.getGlobalVariableByName(name)
+        connection.send(None)
+
+
+class ReplicaExchange:
+    """
+    A parallel tempering (temperature replica-exchange) driver that runs replicas in a pool of
+    local worker processes. Each worker owns one Context per thermodynamic state assigned to it
+    (a single one when there are as many processes as states). Configurations are exchanged
+    between states through shared NumPy buffers, so that no State objects are pickled.
+
+    After each cycle of `steps` time steps, swaps between neighboring states are attempted,
+    alternating between even and odd pairs, with the Metropolis acceptance probability
+    :math:`\\min\\{1, e^{(\\beta_i-\\beta_j)(U_i-U_j)}\\}`. Velocities of swapped configurations are
+    rescaled by :math:`\\sqrt{T_\\mathrm{new}/T_\\mathrm{old}}`. The persistent variables of the
+    propagators (e.g. the thermostat momentum of a
+    :class:`~atomsmm.propagators.NoseHooverLangevinPropagator`) travel with the configurations
+    and are rescaled by :math:`T_\\mathrm{new}/T_\\mathrm{old}`, since their equilibrium spread is
+    proportional to the temperature.
+
+    If a worker process fails (e.g. because of an invalid platform property or a simulation
+    blow-up), all workers are terminated and a RuntimeError containing the traceback of the
+    failure is raised by the constructor or by :func:`run`.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system to be simulated.
+        positions : list(openmm.Vec3) or unit.Quantity
+            The initial positions of all atoms, used for every replica.
+        temperatures : list(unit.Quantity)
+            The temperatures of all thermodynamic states, in increasing order.
+        propagators : list(:class:`~atomsmm.propagators.Propagator`)
+            The propagators of all states, usually including thermostats at the corresponding
+            temperatures.
+        stepSize : unit.Quantity
+            The time step size.
+        platform : str or openmm.Platform, optional, default='CPU'
+            The platform (or its name) to be used.
+        properties : dict(str, str), optional, default=None
+            A set of values for platform-specific properties. If this is None and the platform is
+            CPU, the available cores are evenly divided among the worker processes.
+        processes : int, optional, default=None
+            The number of worker processes. If this is None, the number of states or the number of
+            cores is used, whichever is smaller.
+        seed : int, optional, default=None
+            A seed for random numbers used for initial velocities, integrators, and exchanges.
+
+    Attributes
+    ----------
+        temperatures : numpy.ndarray
+            The temperatures (in K) of all states.
+        replicas : numpy.ndarray
+            The index of the replica currently found at each state.
+        attempts : numpy.ndarray
+            The number of attempted swaps between states `i` and `i+1`.
+        accepted : numpy.ndarray
+            The number of accepted swaps between states `i` and `i+1`.
+        cycle : int
+            The number of completed cycles.
+
+    """
+    def __init__(self, system, positions, temperatures, propagators, stepSize, platform='CPU',
+                 properties=None, processes=None, seed=None):
+        if isinstance(platform, openmm.Platform):
+            platform = platform.getName()
+        M = len(temperatures)
+        if len(propagators) != M:
+            raise InputError("a propagator must be provided for each temperature")
+        self.temperatures = np.array([T.value_in_unit(unit.kelvin) for T in temperatures])
+        numPersistent = max(len(propagator.persistent or []) for propagator in propagators)
+        self._buffers = _sharedArrays(M, system.getNumParticles(), numPersistent)
+        self._data = _views(self._buffers)
+        if unit.is_quantity(positions):
+            positions = positions.value_in_unit(unit.nanometers)
+        self._data["positions"][:] = np.array([[r[0], r[1], r[2]] for r in positions])
+        box = system.getDefaultPeriodicBoxVectors()
+        self._data["boxes"][:] = np.array([v.value_in_unit(unit.nanometers) for v in box])
+        self.replicas = np.arange(M)
+        self.attempts = np.zeros(M - 1, dtype=int)
+        self.accepted = np.zeros(M - 1, dtype=int)
+        self.cycle = 0
+        self._random = np.random.RandomState(seed)
+        cores = multiprocessing.cpu_count()
+        processes = min(M, cores) if processes is None else max(1, min(processes, M))
+        if properties is None and platform == 'CPU':
+            properties = {'Threads': str(max(1, cores//processes))}
+        serializedSystem = openmm.XmlSerializer.serialize(system)
+        self._connections = list()
+        self._workers = list()
+        for rank in range(processes):
+            parent, child = multiprocessing.Pipe()
+            args = (child, serializedSystem, list(range(rank, M, processes)), propagators, temperatures,
+                    stepSize, platform, properties, self._buffers, seed)
+            worker = multiprocessing.Process(target=_runWorker, args=args, daemon=True)
+            worker.start()
+            # Closing the child end here lets recv() detect a worker that dies unexpectedly:
+            child.close()
+            self._connections.append(parent)
+            self._workers.append(worker)
+        self._wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Terminates all worker processes.
+
+        """
+        for (connection, worker) in zip(self._connections, self._workers):
+            if worker.is_alive():
+                try:
+                    connection.send(None)
+                except (IOError, OSError):
+                    worker.terminate()
+                worker.join()
+            connection.close()
+        self._connections = self._workers = list()
+
+    def _wait(self):
+        # Waits for all workers to finish their current task. If any of them fails, all workers
+        # are terminated and the failure is raised:
+        failures = list()
+        for connection in self._connections:
+            try:
+                message = connection.recv()
+            except EOFError:
+                message = "worker process ended unexpectedly"
+            if message is not None:
+                failures.append(message)
+        if failures:
+            for (connection, worker) in zip(self._connections, self._workers):
+                worker.terminate()
+                worker.join()
+                connection.close()
+            self._connections = self._workers = list()
+            raise RuntimeError("replica-exchange worker failed:\n%s" % failures[0])
+
+    def _swap(self, i, j):
+        data = self._data
+        ratio = self.temperatures[j]/self.temperatures[i]
+        for name in ["positions", "boxes", "energies"]:
+            data[name][[i, j]] = data[name][[j, i]]
+        data["velocities"][[i, j]] = data["velocities"][[j, i]]*np.array([1/np.sqrt(ratio), np.sqrt(ratio)])[:, None, None]
+        data["persistent"][[i, j]] = data["persistent"][[j, i]]*np.array([1/ratio, ratio])[:, None]
+        self.replicas[[i, j]] = self.replicas[[j, i]]
+
+    def _exchange(self):
+        beta = 1/(_R*self.temperatures)
+        energies = self._data["energies"]
+        for i in range(self.cycle % 2, len(beta) - 1, 2):
+            self.attempts[i] += 1
+            delta = (beta[i] - beta[i+1])*(energies[i] - energies[i+1])
+            if delta >= 0 or self._random.random_sample() < np.exp(delta):
+                self.accepted[i] += 1
+                self._swap(i, i+1)
+
+    def run(self, cycles, steps):
+        """
+        Runs a number of replica-exchange cycles.
+
+        Parameters
+        ----------
+            cycles : int
+                The number of cycles.
+            steps : int
+                The number of time steps of each replica between consecutive exchange attempts.
+
+        """
+        for cycle in range(cycles):
+            if not self._workers:
+                raise RuntimeError("replica-exchange simulation has been closed")
+            for connection in self._connections:
+                connection.send(steps)
+            self._wait()
+            self._exchange()
+            self.cycle += 1
+
+    def acceptanceRatios(self):
+        """
+        Returns the fraction of accepted swaps between each pair of neighboring states.
+
+        Returns
+        -------
+            numpy.ndarray
+                The acceptance ratio between states `i` and `i+1`, or nan if no swap has been
+                attempted.
+
+        """
+        with np.errstate(invalid='ignore'):
+            return self.accepted/self.attempts
+
+    def potentialEnergies(self):
+        """
+        Returns the potential energies of the configurations currently found at each state.
+
+        Returns
+        -------
+            unit.Quantity
+                The potential energies computed at the end of the last cycle.
+
+        """
+        return np.array(self._data["energies"])*unit.kilojoules_per_mole
+
+    def positions(self, state):
+        """
+        Returns the positions of the configuration currently found at a given state.
+
+        Parameters
+        ----------
+            state : int
+                The index of the state.
+
+        Returns
+        -------
+            unit.Quantity
+                The positions of all atoms.
+
+        """
+        return np.array(self._data["positions"][state])*unit.nanometers
+
+    def saveCheckpoint(self, file):
+        """
+        Saves the complete state of the simulation to a NumPy `.npz` file, so that it can be
+        resumed later via :func:`loadCheckpoint`.
+
+        Parameters
+        ----------
+            file : str
+                The name of the file.
+
+        """
+        generator, keys, position, hasGauss, cachedGaussian = self._random.get_state()
+        arrays = dict((name, self._data[name]) for name in ["positions", "velocities", "boxes", "energies", "persistent"])
+        _savez(file, temperatures=self.temperatures, replicas=self.replicas, attempts=self.attempts,
+               accepted=self.accepted, cycle=self.cycle, randomKeys=keys,
+               randomState=np.array([position, hasGauss, cachedGaussian]), **arrays)
+
+    def loadCheckpoint(self, file):
+        """
+        Resumes a simulation from a file written by :func:`saveCheckpoint`.
+
+        Parameters
+        ----------
+            file : str
+                The name of the file.
+
+        """
+        with np.load(file) as checkpoint:
+            if not np.array_equal(checkpoint["temperatures"], self.temperatures):
+                raise InputError("temperatures in checkpoint do not match")
+            for name in ["positions", "velocities", "boxes", "energies", "persistent"]:
+                if checkpoint[name].shape != self._data[name].shape:
+                    raise InputError("checkpoint is incompatible with the system or propagators")
+                self._data[name][:] = checkpoint[name]
+            self.replicas = np.array(checkpoint["replicas"])
+            self.attempts = np.array(checkpoint["attempts"])
+            self.accepted = np.array(checkpoint["accepted"])
+            self.cycle = int(checkpoint["cycle"])
+            position, hasGauss, cachedGaussian = checkpoint["randomState"]
+            self._random.set_state(('MT19937', checkpoint["randomKeys"], int(position), int(hasGauss), cachedGaussian))
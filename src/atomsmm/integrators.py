@@ -7,19 +7,55 @@
 
 """
 
-import openmmtools.integrators as openmmtools
 from simtk import openmm
 
 from atomsmm.propagators import Propagator as DummyPropagator
+from atomsmm.utils import BlowUpError
 
 
-class Integrator(openmm.CustomIntegrator, openmmtools.PrettyPrintableIntegrator):
+class Integrator(openmm.CustomIntegrator):
+    # Set by GuardedPropagator.addSteps when it adds a guard stage to the program:
+    _guarded = False
+
     def __init__(self, stepSize):
         super(Integrator, self).__init__(stepSize)
 
     def __str__(self):
         return self.pretty_format()
 
+    def step(self, steps):
+        """
+        Advances a simulation through time by taking a series of time steps. If the integrator
+        contains a guard stage (see :class:`~atomsmm.propagators.GuardedPropagator`) and a blow-up
+        is detected, a :class:`~atomsmm.utils.BlowUpError` is raised as soon as this call returns. This
+        exception is also raised if the platform itself detects NaN coordinates, which happens when
+        a system blows up within a single time step.
+
+        Parameters
+        ----------
+            steps : int
+                The number of time steps to take.
+
+        """
+        try:
+            super(Integrator, self).step(steps)
+        except openmm.OpenMMException as error:
+            if self._guarded and "NaN" in str(error):
+                raise BlowUpError("simulation blew up: %s" % error)
+            raise
+        if self._guarded and self.getGlobalVariableByName("blowup") > 0.5:
+            raise BlowUpError("simulation blew up after %d guarded steps"
+                              % int(self.getGlobalVariableByName("guardedSteps")))
+
+    # The pretty-printing methods are borrowed from openmmtools, which is only imported when
+    # they are actually called because importing it takes much longer than importing AtomsMM.
+    def pretty_format(self, *args, **kwargs):
+        from openmmtools.integrators import PrettyPrintableIntegrator
+        return PrettyPrintableIntegrator.pretty_format(self, *args, **kwargs)
+
+    def pretty_print(self):
+        print(self.pretty_format())
+
 
 class GlobalThermostatIntegrator(Integrator):
     """
@@ -16,6 +16,11 @@ from copy import deepcopy
 from simtk import unit
 
 import atomsmm
+from atomsmm.utils import InputError
+
+
+def _perReplica(name, replicas):
+    return "+".join("delta(replica-%d)*%s_%d" % (k, name, k) for k in range(replicas))
 
 
 class Propagator:
@@ -110,6 +115,9 @@ class ChainedPropagator(Propagator):
         for propagator in [self.A, self.B]:
             self.globalVariables.update(propagator.globalVariables)
             self.perDofVariables.update(propagator.perDofVariables)
+            for name in propagator.persistent or []:
+                if name not in self.persistent:
+                    self.persistent.append(name)
 
     def addSteps(self, integrator, fraction=1.0):
         self.B.addSteps(integrator, fraction)
@@ -148,6 +156,9 @@ class TrotterSuzukiPropagator(Propagator):
         for propagator in [self.A, self.B]:
             self.globalVariables.update(propagator.globalVariables)
             self.perDofVariables.update(propagator.perDofVariables)
+            for name in propagator.persistent or []:
+                if name not in self.persistent:
+                    self.persistent.append(name)
 
     def addSteps(self, integrator, fraction=1.0):
         self.B.addSteps(integrator, 0.5*fraction)
@@ -155,6 +166,84 @@ class TrotterSuzukiPropagator(Propagator):
         self.B.addSteps(integrator, 0.5*fraction)
 
 
+class GuardedPropagator(Propagator):
+    """
+    This class wraps a propagator with a guard stage that detects simulation blow-ups. After each
+    application of the wrapped propagator, the guard checks whether any velocity component exceeds
+    a given limit in absolute value or whether the kinetic temperature lies outside a given range.
+    Non-finite velocities are also caught. If the check fails, the global variable `blowup` is set
+    to 1, and the remaining steps of the integrator are skipped without evaluating any forces.
+
+    An :class:`~atomsmm.integrators.Integrator` whose program contains a guard raises a
+    :class:`~atomsmm.utils.BlowUpError` at the end of the `step` call in which the blow-up occurred.
+    To resume the simulation (e.g. after restoring a previous state), the global variable `blowup`
+    must be reset to 0.
+
+    .. note::
+        The global variable `guardedSteps` counts the number of times the wrapped propagator was
+        successfully applied.
+
+    Parameters
+    ----------
+        propagator : :class:`Propagator`
+            The propagator to be guarded.
+        maxSpeed : unit.Quantity, optional, default=None
+            The maximum allowed absolute value of any velocity component. If this is None, this
+            check only detects non-finite velocities or a kinetic energy so large (above 1e30
+            kJ/mol) that it can only result from a blow-up.
+        temperatureRange : tuple(unit.Quantity), optional, default=None
+            The minimum and maximum allowed values of the kinetic temperature. If this is not None,
+            then `degreesOfFreedom` must be provided.
+        degreesOfFreedom : int, optional, default=None
+            The number of degrees of freedom in the system, which can be retrieved via function
+            :func:`~atomsmm.utils.countDegreesOfFreedom`.
+
+    """
+    def __init__(self, propagator, maxSpeed=None, temperatureRange=None, degreesOfFreedom=None):
+        super(GuardedPropagator, self).__init__()
+        self.declareVariables()
+        if temperatureRange is not None and degreesOfFreedom is None:
+            raise InputError("a temperature range requires the number of degrees of freedom")
+        self.propagator = deepcopy(propagator)
+        self.globalVariables.update(self.propagator.globalVariables)
+        self.perDofVariables.update(self.propagator.perDofVariables)
+        self.persistent = self.propagator.persistent
+        if maxSpeed is None:
+            self.maxSpeed = None
+        else:
+            self.maxSpeed = maxSpeed.value_in_unit(unit.nanometers/unit.picoseconds)
+        if temperatureRange is None:
+            self.twoKRange = None
+        else:
+            R = unit.BOLTZMANN_CONSTANT_kB*unit.AVOGADRO_CONSTANT_NA
+            self.twoKRange = tuple((degreesOfFreedom*R*T).value_in_unit(unit.kilojoules_per_mole)
+                                   for T in temperatureRange)
+
+    def declareVariables(self):
+        self.globalVariables["blowup"] = 0
+        self.globalVariables["guardedSteps"] = 0
+        self.globalVariables["guardTwoK"] = 0
+        self.persistent = None
+
+    def addSteps(self, integrator, fraction=1.0):
+        integrator._guarded = True
+        integrator.beginIfBlock("blowup < 0.5")
+        self.propagator.addSteps(integrator, fraction)
+        if self.maxSpeed is None:
+            # A NaN fails any step test, while an infinite value exceeds the limit:
+            integrator.addComputeSum("guardTwoK", "m*v*v")
+            integrator.addComputeGlobal("blowup", "1-step(1e30-guardTwoK)")
+        else:
+            integrator.addComputeSum("blowup", "1-step({}-abs(v))".format(self.maxSpeed))
+        if self.twoKRange is not None:
+            integrator.addComputeSum("guardTwoK", "m*v*v")
+            condition = "step(guardTwoK-{})*step({}-guardTwoK)".format(*self.twoKRange)
+            integrator.addComputeGlobal("blowup", "1-step(0.5-blowup)*{}".format(condition))
+        integrator.addComputeGlobal("blowup", "step(blowup-0.5)")
+        integrator.addComputeGlobal("guardedSteps", "guardedSteps+1-blowup")
+        integrator.endBlock()
+
+
 class VelocityVerletPropagator(Propagator):
     """
     This class implements a simple Verlocity Verlet propagator.
@@ -199,12 +288,26 @@ class RespaPropagator(Propagator):
         loops : list(int)
             A list of `N` integers, where loops[i] determines how many iterations of force group
             `i` are executed for every iteration of force group `i+1`.
+        unrolled : bool, optional, default=True
+            Whether to unroll all loops when generating the integrator program. Otherwise, each
+            loop is implemented as a while block with a counter (global variable `respaCounter<i>`
+            for group `i`), so that the program size grows linearly with the number of force groups
+            rather than with `prod(loops)`. Both alternatives produce identical trajectories, except
+            for the random numbers drawn by other (stochastic) propagators in the same integrator,
+            since OpenMM generates random numbers differently for programs containing loops. Note
+            that the condition of a while block is evaluated on the host by the CUDA and OpenCL
+            platforms, at every iteration.
 
     """
-    def __init__(self, loops):
+    def __init__(self, loops, unrolled=True):
         super(RespaPropagator, self).__init__()
         self.declareVariables()
         self.loops = loops
+        self.unrolled = unrolled
+        if not unrolled:
+            for (group, n) in enumerate(loops):
+                if n > 1:
+                    self.globalVariables["respaCounter%d" % group] = 0
 
     def declareVariables(self):
         self.perDofVariables["x0"] = 0
@@ -221,17 +324,38 @@ class RespaPropagator(Propagator):
         delta_v = "v+Dt*f%d/m" % group
         half = "; Dt=%s*dt" % (0.5*fraction/n)
         full = "; Dt=%s*dt" % (fraction/n)
-        for i in range(n):
-            integrator.addComputePerDof("v", delta_v + (half if i == 0 else full))
-            if group == 0:
-                integrator.addComputePerDof("x0", "x")
-                integrator.addComputePerDof("x", "x+v*Dt" + full)
-                integrator.addConstrainPositions()
-                integrator.addComputePerDof("v", "(x-x0)/Dt" + full)
-            else:
-                self._addSubsteps(integrator, loops[0:group], fraction/n)
-            if i == n-1:
-                integrator.addComputePerDof("v", delta_v + half)
+        if self.unrolled:
+            for i in range(n):
+                integrator.addComputePerDof("v", delta_v + (half if i == 0 else full))
+                self._addSubstep(integrator, loops, fraction/n)
+                if i == n-1:
+                    integrator.addComputePerDof("v", delta_v + half)
+        elif n == 1:
+            integrator.addComputePerDof("v", delta_v + half)
+            self._addSubstep(integrator, loops, fraction)
+            integrator.addComputePerDof("v", delta_v + half)
+        else:
+            counter = "respaCounter%d" % group
+            integrator.addComputePerDof("v", delta_v + half)
+            integrator.addComputeGlobal(counter, "0")
+            integrator.beginWhileBlock("%s < %d" % (counter, n))
+            self._addSubstep(integrator, loops, fraction/n)
+            integrator.addComputeGlobal(counter, "%s+1" % counter)
+            # The last kick of the loop is a half kick:
+            Dt = "; Dt=select(step(%d-%s), %s, %s)*dt" % (n-1, counter, fraction/n, 0.5*fraction/n)
+            integrator.addComputePerDof("v", delta_v + Dt)
+            integrator.endBlock()
+
+    def _addSubstep(self, integrator, loops, fraction):
+        group = len(loops) - 1
+        Dt = "; Dt=%s*dt" % fraction
+        if group == 0:
+            integrator.addComputePerDof("x0", "x")
+            integrator.addComputePerDof("x", "x+v*Dt" + Dt)
+            integrator.addConstrainPositions()
+            integrator.addComputePerDof("v", "(x-x0)/Dt" + Dt)
+        else:
+            self._addSubsteps(integrator, loops[0:group], fraction)
 
 
 class VelocityRescalingPropagator(Propagator):
@@ -249,6 +373,10 @@ class VelocityRescalingPropagator(Propagator):
     The gamma-distributed random numbers required for the solution are generated by using the
     algorithm of Marsaglia and Tsang :cite:`Marsaglia_2000`.
 
+    If `trackHeat` is True, the kinetic energy change caused by each velocity rescaling is
+    accumulated in the global variable `heat` (in kJ/mol), so that the sum of kinetic and
+    potential energies minus `heat` is conserved up to the error of the other propagators.
+
     .. warning::
         An integrator that uses this propagator will fail if no initial velocities are provided to
         the system particles.
@@ -262,15 +390,38 @@ class VelocityRescalingPropagator(Propagator):
             :func:`~atomsmm.utils.countDegreesOfFreedom`.
         timeConstant : unit.Quantity
             The relaxation time of the thermostat.
+        replicas : int, optional, default=None
+            The number of non-interacting replicas in a system created via
+            :func:`~atomsmm.systems.batchReplicas`. If this is not None, each replica is
+            thermostatted independently and `degreesOfFreedom` refers to a single replica. Note
+            that this requires a summation over all particles for each replica, so the cost of
+            the thermostat grows with the product of the numbers of replicas and particles.
+        trackHeat : bool, optional, default=False
+            Whether to accumulate the energy exchanged with the heat bath in a global variable
+            named `heat`. This costs an extra summation over all particles. It cannot be used
+            together with `replicas`.
 
     """
-    def __init__(self, temperature, degreesOfFreedom, timeConstant):
+    def __init__(self, temperature, degreesOfFreedom, timeConstant, replicas=None, trackHeat=False):
         super(VelocityRescalingPropagator, self).__init__()
+        if trackHeat and replicas is not None:
+            raise InputError("heat tracking is not available for batched replicas")
         self.declareVariables()
+        self.trackHeat = trackHeat
+        if trackHeat:
+            self.globalVariables["heat"] = 0
         self.tau = timeConstant.value_in_unit(unit.picoseconds)
         self.dof = degreesOfFreedom
         kB = unit.BOLTZMANN_CONSTANT_kB*unit.AVOGADRO_CONSTANT_NA
         self.kT = (kB*temperature).value_in_unit(unit.kilojoules_per_mole)
+        self.replicas = replicas
+        if replicas is not None:
+            for name in ["TwoK", "SumRs"]:
+                del self.globalVariables[name]
+            for k in range(replicas):
+                for name in ["TwoK", "SumRs", "Factor"]:
+                    self.globalVariables["%s_%d" % (name, k)] = 0
+            self.perDofVariables["replica"] = 0
 
     def declareVariables(self):
         self.globalVariables["V"] = 0
@@ -281,10 +432,7 @@ class VelocityRescalingPropagator(Propagator):
         self.globalVariables["SumRs"] = 0
         self.persistent = None
 
-    def addSteps(self, integrator, fraction=1.0):
-        a = (self.dof - 2 + self.dof % 2)/2
-        d = a - 1/3
-        c = 1/math.sqrt(9*d)
+    def _addGammaSampling(self, integrator, c, d):
         integrator.addComputeGlobal("ready", "0")
         integrator.beginWhileBlock("ready < 0.5")
         integrator.addComputeGlobal("X", "gaussian")
@@ -300,7 +448,18 @@ class VelocityRescalingPropagator(Propagator):
         integrator.addComputeGlobal("ready", "step(0.5*X^2+%s*(1-V+log(V))-log(U))" % d)
         integrator.endBlock()
         integrator.endBlock()
+
+    def addSteps(self, integrator, fraction=1.0):
+        a = (self.dof - 2 + self.dof % 2)/2
+        d = a - 1/3
+        c = 1/math.sqrt(9*d)
+        if self.replicas is not None:
+            self._addReplicaSteps(integrator, fraction, c, d)
+            return
+        self._addGammaSampling(integrator, c, d)
         integrator.addComputeSum("TwoK", "m*v*v")
+        if self.trackHeat:
+            integrator.addComputeGlobal("heat", "heat-0.5*TwoK")
         odd = self.dof % 2 == 1
         if odd:
             integrator.addComputeGlobal("X", "gaussian")
@@ -313,6 +472,25 @@ class VelocityRescalingPropagator(Propagator):
         # Note: the factor 2 above (multiplying d) is absent in the original paper, but has been
         # added afterwards (see https://sites.google.com/site/giovannibussi/Research/algorithms).
         integrator.addComputePerDof("v", expression)
+        if self.trackHeat:
+            integrator.addComputeSum("TwoK", "m*v*v")
+            integrator.addComputeGlobal("heat", "heat+0.5*TwoK")
+
+    def _addReplicaSteps(self, integrator, fraction, c, d):
+        odd = self.dof % 2 == 1
+        for k in range(self.replicas):
+            self._addGammaSampling(integrator, c, d)
+            if odd:
+                integrator.addComputeGlobal("X", "gaussian")
+            integrator.addComputeGlobal("SumRs_%d" % k, "%s*V" % (2*d) + ("+X^2" if odd else ""))
+            integrator.addComputeSum("TwoK_%d" % k, "delta(replica-%d)*m*v*v" % k)
+            integrator.addComputeGlobal("X", "gaussian")
+            expression = "sqrt(A+C*B*(X^2+SumRs_%d)+2*sqrt(C*B*A)*X)" % k
+            expression += "; C = %s/TwoK_%d" % (self.kT, k)
+            expression += "; B = 1-A"
+            expression += "; A = exp(-dt*%s)" % (fraction/self.tau)
+            integrator.addComputeGlobal("Factor_%d" % k, expression)
+        integrator.addComputePerDof("v", "(%s)*v" % _perReplica("Factor", self.replicas))
 
 
 class NoseHooverLangevinPropagator(Propagator):
@@ -349,6 +527,11 @@ class NoseHooverLangevinPropagator(Propagator):
     normally distributed random number. The splitting solution is, then, given by
     :math:`e^{(\\delta t/2)\\mathcal{L}_S}e^{\\delta t\\mathcal{L}_O}e^{(\\delta t/2)\\mathcal{L}_S}`.
 
+    Since the thermostat momentum is subject to friction and noise, no extended energy is
+    conserved. If `trackHeat` is True, the change in the kinetic energy of the particles caused by
+    each application of this propagator is added to the global variable `heat` (in kJ/mol), and
+    then the total energy minus `heat` is conserved up to the error of the other propagators.
+
     Parameters
     ----------
         temperature : unit.Quantity
@@ -360,15 +543,39 @@ class NoseHooverLangevinPropagator(Propagator):
             The relaxation time of the Nose-Hoover thermostat.
         frictionCoefficient : unit.Quantity (1/time)
             The friction coefficient of the Langevin thermostat.
+        replicas : int, optional, default=None
+            The number of non-interacting replicas in a system created via
+            :func:`~atomsmm.systems.batchReplicas`. If this is not None, each replica `k` has its
+            own thermostat, whose momentum is stored in the global variable `p_NHL_k`, and
+            `degreesOfFreedom` refers to a single replica. Note that this requires a summation
+            over all particles for each replica, so the cost of the thermostat grows with the
+            product of the numbers of replicas and particles.
+        trackHeat : bool, optional, default=False
+            Whether to accumulate the energy exchanged with the heat bath in a global variable
+            named `heat`. It cannot be used together with `replicas`.
 
     """
-    def __init__(self, temperature, degreesOfFreedom, timeConstant, frictionCoefficient):
+    def __init__(self, temperature, degreesOfFreedom, timeConstant, frictionCoefficient, replicas=None,
+                 trackHeat=False):
         super(NoseHooverLangevinPropagator, self).__init__()
+        if trackHeat and replicas is not None:
+            raise InputError("heat tracking is not available for batched replicas")
         self.declareVariables()
+        self.trackHeat = trackHeat
+        if trackHeat:
+            self.globalVariables["heat"] = 0
         self.temperature = temperature
         self.degreesOfFreedom = degreesOfFreedom
         self.timeConstant = timeConstant
         self.frictionCoefficient = frictionCoefficient
+        self.replicas = replicas
+        if replicas is not None:
+            self.globalVariables.clear()
+            for k in range(replicas):
+                for name in ["TwoK", "factor", "p_NHL"]:
+                    self.globalVariables["%s_%d" % (name, k)] = 0
+            self.perDofVariables["replica"] = 0
+            self.persistent = ["p_NHL_%d" % k for k in range(replicas)]
 
     def declareVariables(self):
         self.globalVariables["TwoK"] = 0
@@ -376,17 +583,47 @@ class NoseHooverLangevinPropagator(Propagator):
         self.globalVariables["p_NHL"] = 0
         self.persistent = ["p_NHL"]
 
+    def inertia(self):
+        """
+        Returns the inertial parameter :math:`Q = N_f k_B T \\tau^2` of the Nose-Hoover thermostat,
+        so that its kinetic energy is given by :math:`p_\\eta^2/(2Q)`.
+
+        Returns
+        -------
+            float
+                The value of :math:`Q` in kJ/mol*ps^2.
+
+        """
+        R = unit.BOLTZMANN_CONSTANT_kB*unit.AVOGADRO_CONSTANT_NA
+        kT = (R*self.temperature).value_in_unit(unit.kilojoules_per_mole)
+        tau = self.timeConstant.value_in_unit(unit.picoseconds)
+        return self.degreesOfFreedom*kT*tau**2
+
     def addSteps(self, integrator, fraction=1.0):
         R = unit.BOLTZMANN_CONSTANT_kB*unit.AVOGADRO_CONSTANT_NA
         kT = (R*self.temperature).value_in_unit(unit.kilojoules_per_mole)
         N = self.degreesOfFreedom
         tau = self.timeConstant.value_in_unit(unit.picoseconds)
         gamma = self.frictionCoefficient.value_in_unit(unit.picoseconds**(-1))
-        Q = N*kT*tau**2
-        integrator.addComputeSum("TwoK", "m*v*v")
-        integrator.addComputeGlobal("factor", "exp({}*p_NHL*dt)".format(-0.5*fraction/Q))
-        expression = "p_NHL*x+G*(1-x)+{}*sqrt(1-x^2)*gaussian".format(tau*kT*math.sqrt(N))
-        expression += "; G = (factor^2*TwoK-{})/{}".format(N*kT, gamma)
-        expression += "; x = exp({}*dt)".format(-gamma*fraction)
-        integrator.addComputeGlobal("p_NHL", expression)
-        integrator.addComputePerDof("v", "factor*exp({}*p_NHL*dt)*v".format(-0.5*fraction/Q))
+        Q = self.inertia()
+        if self.replicas is None:
+            integrator.addComputeSum("TwoK", "m*v*v")
+            integrator.addComputeGlobal("factor", "exp({}*p_NHL*dt)".format(-0.5*fraction/Q))
+            expression = "p_NHL*x+G*(1-x)+{}*sqrt(1-x^2)*gaussian".format(tau*kT*math.sqrt(N))
+            expression += "; G = (factor^2*TwoK-{})/{}".format(N*kT, gamma)
+            expression += "; x = exp({}*dt)".format(-gamma*fraction)
+            integrator.addComputeGlobal("p_NHL", expression)
+            integrator.addComputePerDof("v", "factor*exp({}*p_NHL*dt)*v".format(-0.5*fraction/Q))
+            if self.trackHeat:
+                expression = "heat+0.5*TwoK*((factor*exp({}*p_NHL*dt))^2-1)".format(-0.5*fraction/Q)
+                integrator.addComputeGlobal("heat", expression)
+            return
+        for k in range(self.replicas):
+            integrator.addComputeSum("TwoK_%d" % k, "delta(replica-%d)*m*v*v" % k)
+            integrator.addComputeGlobal("factor_%d" % k, "exp({}*p_NHL_{}*dt)".format(-0.5*fraction/Q, k))
+            expression = "p_NHL_{}*x+G*(1-x)+{}*sqrt(1-x^2)*gaussian".format(k, tau*kT*math.sqrt(N))
+            expression += "; G = (factor_{}^2*TwoK_{}-{})/{}".format(k, k, N*kT, gamma)
+            expression += "; x = exp({}*dt)".format(-gamma*fraction)
+            integrator.addComputeGlobal("p_NHL_%d" % k, expression)
+            integrator.addComputeGlobal("factor_%d" % k, "factor_{}*exp({}*p_NHL_{}*dt)".format(k, -0.5*fraction/Q, k))
+        integrator.addComputePerDof("v", "(%s)*v" % _perReplica("factor", self.replicas))
@@ -1,5 +1,14 @@
-from simtk.openmm.app.statedatareporter import StateDataReporter
+from simtk.openmm.app import StateDataReporter
+from simtk import unit
+import mmap
+import numpy as np
+import queue
+import struct
+import threading
 import time
+import weakref
+import zlib
+from atomsmm.utils import countDegreesOfFreedom
 class shortName(StateDataReporter):
 	
 	def _constructHeaders(self):
@@ -58,3 +67,733 @@ class shortName(StateDataReporter):
 				self._out.flush()
 			except AttributeError:
 				pass
+
+
+def _writeLines(items, out, separator, flushInterval, flushSize, errors):
+	buffer = []
+	lastFlush = time.time()
+	finished = False
+	while not finished:
+		timeout = max(0.0, flushInterval - (time.time() - lastFlush))
+		try:
+			item = items.get(timeout=timeout)
+			if item is None:
+				finished = True
+			else:
+				buffer.append(separator.join(str(v) for v in item))
+		except queue.Empty:
+			pass
+		if buffer and (finished or len(buffer) >= flushSize or time.time() - lastFlush >= flushInterval):
+			try:
+				out.write('\n'.join(buffer) + '\n')
+				try:
+					out.flush()
+				except AttributeError:
+					pass
+			except Exception as error:
+				errors.append(error)
+				finished = True
+			buffer = []
+			lastFlush = time.time()
+		elif not buffer:
+			lastFlush = time.time()
+	while not items.empty():
+		# Unblock any producer waiting on a full queue after a write error:
+		items.get_nowait()
+
+
+def _stopWriter(items, writer):
+	items.put(None)
+	writer.join()
+
+
+class bufferedShortName(shortName):
+	"""
+	A version of :class:`shortName` in which formatting and writing are carried out by a background
+	thread, so that `Simulation.step` is not blocked by file I/O. Reported values are pushed into a
+	bounded queue and written in batches.
+
+	Pending lines are written when :func:`close` is called, when the reporter is used as a context
+	manager and its `with` block ends (even due to an exception), when the reporter is garbage
+	collected, or when the interpreter exits.
+
+	Parameters
+	----------
+		file : str or file
+			The file to write to, specified as a file name or file object.
+		reportInterval : int
+			The interval (in time steps) at which to write reports.
+		queueSize : int, optional, default=1000
+			The maximum number of reports waiting to be written. If the queue is full, reporting
+			blocks until the background thread catches up.
+		flushInterval : float, optional, default=5.0
+			The maximum time (in seconds) that a report can wait before being written.
+		flushSize : int, optional, default=100
+			The number of pending reports that triggers a write.
+		**kwargs
+			Keyword arguments accepted by OpenMM's StateDataReporter.
+
+	"""
+	def __init__(self, file, reportInterval, queueSize=1000, flushInterval=5.0, flushSize=100, **kwargs):
+		super(bufferedShortName, self).__init__(file, reportInterval, **kwargs)
+		self._items = queue.Queue(queueSize)
+		self._errors = []
+		args = (self._items, self._out, self._separator, flushInterval, flushSize, self._errors)
+		self._writer = threading.Thread(target=_writeLines, args=args)
+		self._writer.daemon = True
+		self._writer.start()
+		self._finalizer = weakref.finalize(self, _stopWriter, self._items, self._writer)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def __del__(self):
+		if hasattr(self, '_finalizer'):
+			self._finalizer()
+		super(bufferedShortName, self).__del__()
+
+	def _put(self, item):
+		if self._errors:
+			raise self._errors[0]
+		self._items.put(item)
+
+	def close(self):
+		"""
+		Writes all pending reports and stops the background thread. Further reports are not
+		allowed after this method is called.
+
+		"""
+		self._finalizer()
+		if self._errors:
+			raise self._errors[0]
+
+	def report(self, simulation, state):
+		if not self._finalizer.alive:
+			raise RuntimeError('report requested after reporter has been closed')
+		if not self._hasInitialized:
+			self._initializeConstants(simulation)
+			self._put(self._constructHeaders())
+			self._initialClockTime = time.time()
+			self._initialSimulationTime = state.getTime()
+			self._initialSteps = simulation.currentStep
+			self._hasInitialized = True
+
+		self._checkForErrors(simulation, state)
+		self._put(self._constructReportValues(simulation, state))
+
+
+_R = (unit.BOLTZMANN_CONSTANT_kB*unit.AVOGADRO_CONSTANT_NA).value_in_unit(unit.kilojoules_per_mole/unit.kelvin)
+_binaryMagic = b'ATOMSMM\x01'
+_binaryLayout = '<8sQII'
+
+
+class _mmapWriter(object):
+	def __init__(self, file, columns, capacity):
+		self._file = open(file, 'w+b')
+		self._columns = len(columns)
+		names = '\n'.join(columns).encode('utf-8')
+		size = struct.calcsize(_binaryLayout) + len(names)
+		self._offset = 64*((size + 63)//64)
+		self._file.write(struct.pack(_binaryLayout, _binaryMagic, 0, self._offset, len(names)) + names)
+		self._records = 0
+		self._capacity = 0
+		self._map = None
+		self._grow(capacity)
+
+	def _grow(self, capacity):
+		if self._map is not None:
+			self._data = None
+			self._map.close()
+		self._capacity = capacity
+		self._file.truncate(self._offset + 8*self._columns*capacity)
+		self._map = mmap.mmap(self._file.fileno(), 0)
+		self._data = np.ndarray((capacity, self._columns), np.float64, self._map, self._offset)
+
+	def append(self, values):
+		if self._records == self._capacity:
+			self._grow(2*self._capacity)
+		self._data[self._records, :] = values
+		self._records += 1
+		struct.pack_into('<Q', self._map, 8, self._records)
+
+	def close(self):
+		if self._map is not None:
+			self._data = None
+			self._map.flush()
+			self._map.close()
+			self._map = None
+			self._file.truncate(self._offset + 8*self._columns*self._records)
+			self._file.close()
+
+
+def loadBinaryReport(file):
+	"""
+	Loads a file written by :class:`binaryReporter` without copying its contents into memory.
+
+	Parameters
+	----------
+		file : str
+			The name of the file.
+
+	Returns
+	-------
+		dict(str, numpy.ndarray)
+			A dict whose keys are the column names and whose values are read-only, memory-mapped
+			views of the corresponding data columns.
+
+	"""
+	with open(file, 'rb') as f:
+		magic, records, offset, length = struct.unpack(_binaryLayout, f.read(struct.calcsize(_binaryLayout)))
+		if magic != _binaryMagic:
+			raise ValueError('file %s was not written by binaryReporter' % file)
+		columns = f.read(length).decode('utf-8').split('\n')
+	if records == 0:
+		return dict((name, np.empty(0)) for name in columns)
+	data = np.memmap(file, np.float64, 'r', offset, (records, len(columns)))
+	return dict((name, data[:, index]) for (index, name) in enumerate(columns))
+
+
+class binaryReporter(object):
+	"""
+	A reporter that appends fixed-width binary records to a memory-mapped file. Each record is a
+	row of float64 values, one for each reported quantity. A small header stores the number of
+	records and the column names, which are the same compact names used by :class:`shortName`
+	(followed by the names of integrator global variables, if any). Energies are in kJ/mol, time
+	in ps, and temperature in K. The temperature is computed with the number of degrees of freedom
+	given by :func:`~atomsmm.utils.countDegreesOfFreedom`.
+
+	The file can be read by function :func:`loadBinaryReport` while being written, since the number
+	of records in the header is updated after each report. The mapped region is doubled whenever it
+	gets full and the file is trimmed to its actual size when :func:`close` is called.
+
+	Parameters
+	----------
+		file : str
+			The name of the file to write to.
+		reportInterval : int
+			The interval (in time steps) at which to write reports.
+		step : bool, optional, default=True
+			Whether to write the current step index.
+		time : bool, optional, default=False
+			Whether to write the current time.
+		potentialEnergy : bool, optional, default=False
+			Whether to write the potential energy.
+		kineticEnergy : bool, optional, default=False
+			Whether to write the kinetic energy.
+		totalEnergy : bool, optional, default=False
+			Whether to write the total energy.
+		temperature : bool, optional, default=False
+			Whether to write the instantaneous temperature.
+		globalVariables : list(str), optional, default=[]
+			Names of global variables of a CustomIntegrator to be written.
+		capacity : int, optional, default=1024
+			The initial number of records for which space is reserved in the file.
+
+	"""
+	def __init__(
+			self, file, reportInterval, step=True, time=False, potentialEnergy=False, kineticEnergy=False,
+			totalEnergy=False, temperature=False, globalVariables=[], capacity=1024):
+		self._reportInterval = reportInterval
+		flags = [
+			('Step', step), ('t', time), ('PE', potentialEnergy), ('KE', kineticEnergy), ('TotE', totalEnergy),
+			('T', temperature)]
+		self._quantities = [name for (name, flag) in flags if flag]
+		self._globals = list(globalVariables)
+		self._needEnergy = potentialEnergy or kineticEnergy or totalEnergy or temperature
+		self._writer = _mmapWriter(file, self._quantities + self._globals, capacity)
+		self._dof = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def __del__(self):
+		if hasattr(self, '_writer'):
+			self._writer.close()
+
+	def close(self):
+		"""
+		Trims the file to its actual size and closes it.
+
+		"""
+		self._writer.close()
+
+	def describeNextReport(self, simulation):
+		steps = self._reportInterval - simulation.currentStep % self._reportInterval
+		return (steps, False, False, False, self._needEnergy)
+
+	def report(self, simulation, state):
+		if self._dof is None:
+			self._dof = countDegreesOfFreedom(simulation.system)
+		values = []
+		if self._needEnergy:
+			PE = state.getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole)
+			KE = state.getKineticEnergy().value_in_unit(unit.kilojoules_per_mole)
+		for name in self._quantities:
+			if name == 'Step':
+				values.append(simulation.currentStep)
+			elif name == 't':
+				values.append(state.getTime().value_in_unit(unit.picoseconds))
+			elif name == 'PE':
+				values.append(PE)
+			elif name == 'KE':
+				values.append(KE)
+			elif name == 'TotE':
+				values.append(PE + KE)
+			elif name == 'T':
+				values.append(2*KE/(self._dof*_R))
+		integrator = simulation.integrator
+		for name in self._globals:
+			values.append(integrator.getGlobalVariableByName(name))
+		self._writer.append(values)
+
+
+class multiplexedReporter(object):
+	"""
+	A hub that drives many reporters at once. At every report step, the union of the data required
+	by all due reporters is requested from the simulation, so that a single call to `getState` is
+	made, and the resulting state is passed to the `report` method of each of them.
+
+	.. note::
+		The reporters do not need to have the same report interval. As in OpenMM's Simulation
+		class, due reporters which require positions are grouped by whether they want them wrapped
+		into the periodic box. The larger group (together with the reporters that require no
+		positions) receives the state requested by the hub, and an extra state is requested for
+		the other group, if any.
+
+	Parameters
+	----------
+		reporters : list
+			The reporters to be driven by the hub.
+
+	"""
+	_includes = ['positions', 'velocities', 'forces', 'energy']
+	_stateArguments = dict(positions='getPositions', velocities='getVelocities', forces='getForces', energy='getEnergy')
+
+	def __init__(self, reporters):
+		self._reporters = list(reporters)
+		self._due = []
+		self._extra = []
+		self._extraInclude = set()
+		self._extraPeriodic = None
+
+	def _description(self, description):
+		if isinstance(description, dict):
+			return description
+		return dict(
+			steps=description[0], include=[name for (name, flag) in zip(self._includes, description[1:5]) if flag],
+			periodic=description[5] if len(description) > 5 else None)
+
+	def describeNextReport(self, simulation):
+		descriptions = [reporter.describeNextReport(simulation) for reporter in self._reporters]
+		newFormat = any(isinstance(description, dict) for description in descriptions)
+		descriptions = [self._description(description) for description in descriptions]
+		steps = min(description['steps'] for description in descriptions)
+		usesPBC = simulation.system.usesPeriodicBoundaryConditions()
+		groups = {True: [], False: []}
+		either = []
+		for (reporter, description) in zip(self._reporters, descriptions):
+			if description['steps'] == steps:
+				if 'positions' not in description['include']:
+					either.append((reporter, description))
+				else:
+					periodic = usesPBC if description.get('periodic') is None else description['periodic']
+					groups[periodic].append((reporter, description))
+		periodic = len(groups[True]) > len(groups[False])
+		self._due = [reporter for (reporter, description) in groups[periodic] + either]
+		self._extra = [reporter for (reporter, description) in groups[not periodic]]
+		self._extraPeriodic = not periodic
+		self._extraInclude.clear()
+		for (reporter, description) in groups[not periodic]:
+			self._extraInclude.update(description['include'])
+		include = set()
+		for (reporter, description) in groups[periodic] + either:
+			include.update(description['include'])
+		if newFormat:
+			return dict(steps=steps, include=sorted(include), periodic=periodic)
+		return (steps,) + tuple(name in include for name in self._includes) + (periodic,)
+
+	def report(self, simulation, state):
+		for reporter in self._due:
+			reporter.report(simulation, state)
+		if self._extra:
+			arguments = dict((self._stateArguments.get(name, name), True) for name in self._extraInclude)
+			extraState = simulation.context.getState(enforcePeriodicBox=self._extraPeriodic, **arguments)
+			for reporter in self._extra:
+				reporter.report(simulation, extraState)
+
+
+def _findInertia(propagator):
+	if hasattr(propagator, 'inertia'):
+		return propagator.inertia()
+	for value in vars(propagator).values():
+		for item in (value if isinstance(value, list) else [value]):
+			if hasattr(item, 'addSteps'):
+				inertia = _findInertia(item)
+				if inertia is not None:
+					return inertia
+	return None
+
+
+class thermostatReporter(object):
+	"""
+	A reporter for simulations driven by AtomsMM integrators which include a thermostat propagator,
+	such as :class:`~atomsmm.propagators.VelocityRescalingPropagator` or
+	:class:`~atomsmm.propagators.NoseHooverLangevinPropagator`. The thermostat variables are read
+	from the integrator's global variables. The kinetic energy is computed by OpenMM without any
+	force evaluation, while the potential energy, which requires a full force evaluation, is only
+	requested at a coarser interval.
+
+	The written columns use compact headers, as in :class:`shortName`:
+
+	* `Step`: the current step index;
+	* `T`: the instantaneous temperature (in K);
+	* `KE`: the kinetic energy (in kJ/mol);
+	* `p_NHL` and `TE`: the Nose-Hoover-Langevin thermostat momentum and its kinetic energy (in kJ/mol);
+	* `PE`: the potential energy (in kJ/mol), or `nan` when it is not computed;
+	* `heat`: the energy (in kJ/mol) received from the heat bath since the simulation started;
+	* `Hcons`: the conserved energy `KE + PE - heat`, or `nan` when the potential energy is not computed.
+
+	Columns `p_NHL` and `TE` are only written if a
+	:class:`~atomsmm.propagators.NoseHooverLangevinPropagator` is found in `thermostat`. Columns
+	`heat` and `Hcons` are only written if the integrator has a global variable `heat` (see
+	argument `trackHeat` of the thermostat propagators).
+
+	Parameters
+	----------
+		file : str or file
+			The file to write to, specified as a file name or file object.
+		reportInterval : int
+			The interval (in time steps) at which to write reports.
+		thermostat : :class:`~atomsmm.propagators.Propagator`, optional, default=None
+			The propagator used to build the integrator. It can be a thermostat propagator or a
+			composite one (e.g. a :class:`~atomsmm.propagators.TrotterSuzukiPropagator`)
+			containing it.
+		energyInterval : int, optional, default=None
+			The interval (in time steps) at which the potential energy is computed. It must be a
+			multiple of `reportInterval`. If this is None, the potential energy is never computed.
+		separator : str, optional, default='\\t'
+			The separator to use between columns.
+
+	"""
+	def __init__(self, file, reportInterval, thermostat=None, energyInterval=None, separator='\t'):
+		self._openedFile = isinstance(file, str)
+		self._out = open(file, 'w') if self._openedFile else file
+		self._reportInterval = reportInterval
+		self._energyInterval = energyInterval
+		self._separator = separator
+		self._Q = None if thermostat is None else _findInertia(thermostat)
+		self._variables = [] if self._Q is None else ['p_NHL']
+		self._indices = None
+		self._dof = None
+
+	def __del__(self):
+		if self._openedFile:
+			self._out.close()
+
+	def _needsEnergy(self, step):
+		return self._energyInterval is not None and step % self._energyInterval == 0
+
+	def describeNextReport(self, simulation):
+		steps = self._reportInterval - simulation.currentStep % self._reportInterval
+		return (steps, False, False, False, self._needsEnergy(simulation.currentStep + steps))
+
+	def _initialize(self, simulation):
+		integrator = simulation.integrator
+		names = [integrator.getGlobalVariableName(i) for i in range(integrator.getNumGlobalVariables())]
+		missing = [name for name in self._variables if name not in names]
+		if missing:
+			raise ValueError('integrator has no global variable(s) %s' % ', '.join(missing))
+		if 'heat' in names:
+			self._variables.append('heat')
+		self._indices = [names.index(name) for name in self._variables]
+		self._dof = countDegreesOfFreedom(simulation.system)
+		headers = ['Step', 'T', 'KE'] + (['p_NHL', 'TE'] if self._Q is not None else []) + ['PE']
+		if 'heat' in self._variables:
+			headers += ['heat', 'Hcons']
+		print(self._separator.join(headers), file=self._out)
+
+	def report(self, simulation, state):
+		if self._indices is None:
+			self._initialize(simulation)
+		integrator = simulation.integrator
+		values = [integrator.getGlobalVariable(index) for index in self._indices]
+		needsEnergy = self._needsEnergy(simulation.currentStep)
+		if not needsEnergy:
+			# A state with energies of no force groups only requires the kinetic energy:
+			state = simulation.context.getState(getEnergy=True, groups=0)
+		KE = state.getKineticEnergy().value_in_unit(unit.kilojoules_per_mole)
+		row = [simulation.currentStep, 2*KE/(self._dof*_R), KE]
+		if self._Q is not None:
+			row += [values[0], 0.5*values[0]**2/self._Q]
+		PE = state.getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole) if needsEnergy else float('nan')
+		row.append(PE)
+		if 'heat' in self._variables:
+			heat = values[-1]
+			row += [heat, KE + PE - heat]
+		print(self._separator.join(str(v) for v in row), file=self._out)
+		try:
+			self._out.flush()
+		except AttributeError:
+			pass
+
+
+class forceGroupReporter(object):
+	"""
+	A reporter that writes the potential energy contributions of selected force groups during a
+	simulation. Unlike :func:`~atomsmm.utils.splitPotentialEnergy`, no extra Context is created:
+	the energies are obtained from the simulation's own Context, by a call to `getState` per
+	requested group.
+
+	.. note::
+		Each report costs one energy evaluation per requested group, that is, roughly as much as
+		a full potential energy evaluation if the groups cover all forces in the system, plus a
+		fixed overhead per group. This reporter is meant to be used with an interval that is much
+		larger than that of the main reporters (see the `force_group_reporter.py` benchmark).
+
+	Parameters
+	----------
+		file : str or file
+			The file to write to, specified as a file name or file object.
+		reportInterval : int
+			The interval (in time steps) at which to write reports.
+		groups : list(int or set(int))
+			The force groups whose energies will be reported. Each item can be either a group index
+			or a set of indices, in which case the summed energy of these groups is reported.
+		names : list(str), optional, default=None
+			Column headers for the energy terms. If this is None, the headers will be `E` followed
+			by the group indices (e.g. `E0`, `E1`, `E2+3`).
+		separator : str, optional, default='\\t'
+			The separator to use between columns.
+
+	"""
+	def __init__(self, file, reportInterval, groups, names=None, separator='\t'):
+		self._openedFile = isinstance(file, str)
+		self._out = open(file, 'w') if self._openedFile else file
+		self._reportInterval = reportInterval
+		self._groups = [set(group) if isinstance(group, (set, list, tuple)) else set([group]) for group in groups]
+		if names is None:
+			names = ['E' + '+'.join(str(g) for g in sorted(group)) for group in self._groups]
+		elif len(names) != len(self._groups):
+			raise ValueError('number of names must match number of groups')
+		self._headers = ['Step'] + list(names)
+		self._separator = separator
+		self._hasInitialized = False
+
+	def __del__(self):
+		if self._openedFile:
+			self._out.close()
+
+	def describeNextReport(self, simulation):
+		steps = self._reportInterval - simulation.currentStep % self._reportInterval
+		return (steps, False, False, False, False)
+
+	def report(self, simulation, state):
+		if not self._hasInitialized:
+			print(self._separator.join(self._headers), file=self._out)
+			self._hasInitialized = True
+		values = [str(simulation.currentStep)]
+		for group in self._groups:
+			energy = simulation.context.getState(getEnergy=True, groups=group).getPotentialEnergy()
+			values.append('%.10g' % energy.value_in_unit(unit.kilojoules_per_mole))
+		print(self._separator.join(values), file=self._out)
+		try:
+			self._out.flush()
+		except AttributeError:
+			pass
+
+
+_trajectoryMagic = b'ATOMSMM\x02'
+_trajectoryLayout = '<8sdI'
+_frameLayout = '<qd9dBI'
+
+
+def _encodeFrame(positions, precision, level):
+	quantized = np.round(positions*precision).astype(np.int64)
+	deltas = np.diff(quantized, axis=0, prepend=np.zeros((1, 3), np.int64))
+	bound = np.abs(deltas).max() if deltas.size else 0
+	dtype = np.int8 if bound < 2**7 else np.int16 if bound < 2**15 else np.int32
+	# Byte planes are stored separately, since high-order bytes are mostly zero:
+	data = deltas.astype('<' + np.dtype(dtype).str[1:]).view(np.uint8).reshape(-1, np.dtype(dtype).itemsize)
+	return np.dtype(dtype).itemsize, zlib.compress(np.ascontiguousarray(data.T).tobytes(), level)
+
+
+def _decodeFrame(payload, itemsize, numAtoms, precision):
+	planes = np.frombuffer(zlib.decompress(payload), np.uint8).reshape(itemsize, -1)
+	deltas = np.ascontiguousarray(planes.T).view('<i%d' % itemsize).reshape(numAtoms, 3)
+	return np.cumsum(deltas.astype(np.int64), axis=0)/precision
+
+
+def _writeFrames(items, out, precision, level, errors):
+	while True:
+		item = items.get()
+		if item is None:
+			break
+		if errors:
+			continue
+		try:
+			if isinstance(item, bytes):
+				out.write(item)
+			else:
+				step, time, box, positions = item
+				itemsize, payload = _encodeFrame(positions, precision, level)
+				values = [step, time] + list(box.ravel()) + [itemsize, len(payload)]
+				out.write(struct.pack(_frameLayout, *values) + payload)
+		except Exception as error:
+			errors.append(error)
+	try:
+		out.close()
+	except Exception as error:
+		errors.append(error)
+
+
+def loadCompressedTrajectory(file):
+	"""
+	Loads a file written by :class:`compressedTrajectoryReporter`.
+
+	Parameters
+	----------
+		file : str
+			The name of the file.
+
+	Returns
+	-------
+		dict(str, numpy.ndarray)
+			A dict with keys `Step` (the step indices), `t` (the times in ps), `box` (the periodic box
+			vectors in nm, with shape `(frames, 3, 3)`), `atoms` (the indices of the stored atoms),
+			and `positions` (the positions in nm, with shape `(frames, atoms, 3)`).
+
+	"""
+	with open(file, 'rb') as f:
+		content = f.read()
+	offset = struct.calcsize(_trajectoryLayout)
+	magic, precision, numAtoms = struct.unpack_from(_trajectoryLayout, content)
+	if magic != _trajectoryMagic:
+		raise ValueError('file %s was not written by compressedTrajectoryReporter' % file)
+	atoms = np.frombuffer(content, '<i4', numAtoms, offset).astype(int)
+	offset += 4*numAtoms
+	steps, times, boxes, positions = [], [], [], []
+	frameSize = struct.calcsize(_frameLayout)
+	while offset + frameSize <= len(content):
+		values = struct.unpack_from(_frameLayout, content, offset)
+		itemsize, length = values[11:13]
+		offset += frameSize
+		steps.append(values[0])
+		times.append(values[1])
+		boxes.append(values[2:11])
+		positions.append(_decodeFrame(content[offset:offset+length], itemsize, numAtoms, precision))
+		offset += length
+	return dict(
+		Step=np.array(steps, dtype=int), t=np.array(times), box=np.array(boxes).reshape(-1, 3, 3),
+		atoms=atoms, positions=np.array(positions).reshape(-1, numAtoms, 3))
+
+
+class compressedTrajectoryReporter(object):
+	"""
+	A reporter of atomic coordinates which, similarly to the XTC_ format, stores positions with a
+	fixed precision and compresses them. Positions are taken from the State as a NumPy array and
+	passed to a background thread which does the quantization, compression, and writing. Reporting
+	blocks only if the queue of pending frames is full.
+
+	Each frame is quantized to integers, whose differences between consecutive atoms (which are
+	usually small, because atoms bonded together are close in the topology) are stored with the
+	narrowest integer type in which they fit and compressed with zlib. The step index, the time,
+	and the box vectors (in double precision) are stored along with each frame. The file can be
+	read with function :func:`loadCompressedTrajectory`.
+
+	.. _XTC: http://manual.gromacs.org/documentation/current/reference-manual/file-formats.html#xtc
+
+	Pending frames are written when :func:`close` is called, when the reporter is used as a context
+	manager and its `with` block ends, when the reporter is garbage collected, or when the
+	interpreter exits.
+
+	Parameters
+	----------
+		file : str
+			The name of the file to write to.
+		reportInterval : int
+			The interval (in time steps) at which to write frames.
+		atomSubset : list(int), optional, default=None
+			The indices of the atoms to be written. If this is None, all atoms are written.
+			Otherwise, duplicate indices are removed and the atoms are written in ascending order
+			of their indices, regardless of the order of this list.
+		precision : float, optional, default=1000
+			The number of quantization levels per nm (the default corresponds to 0.001 nm, as in
+			the XTC format).
+		enforcePeriodicBox : bool, optional, default=None
+			Whether to wrap molecules into the periodic box. If this is None, the default behavior
+			of the simulation is used.
+		level : int, optional, default=1
+			The zlib compression level, from 1 (fastest) to 9 (smallest).
+		queueSize : int, optional, default=100
+			The maximum number of frames waiting to be written. If the queue is full, reporting
+			blocks until the background thread catches up.
+
+	"""
+	def __init__(
+			self, file, reportInterval, atomSubset=None, precision=1000, enforcePeriodicBox=None, level=1,
+			queueSize=100):
+		self._reportInterval = reportInterval
+		self._subset = None if atomSubset is None else np.array(sorted(set(atomSubset)), dtype=int)
+		self._precision = precision
+		self._enforcePeriodicBox = enforcePeriodicBox
+		self._all = False
+		self._hasInitialized = False
+		self._items = queue.Queue(queueSize)
+		self._errors = []
+		args = (self._items, open(file, 'wb'), precision, level, self._errors)
+		self._writer = threading.Thread(target=_writeFrames, args=args)
+		self._writer.daemon = True
+		self._writer.start()
+		self._finalizer = weakref.finalize(self, _stopWriter, self._items, self._writer)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def __del__(self):
+		if hasattr(self, '_finalizer'):
+			self._finalizer()
+
+	def _put(self, item):
+		if self._errors:
+			raise self._errors[0]
+		self._items.put(item)
+
+	def close(self):
+		"""
+		Writes all pending frames, stops the background thread, and closes the file. Further
+		reports are not allowed after this method is called.
+
+		"""
+		self._finalizer()
+		if self._errors:
+			raise self._errors[0]
+
+	def describeNextReport(self, simulation):
+		steps = self._reportInterval - simulation.currentStep % self._reportInterval
+		return (steps, True, False, False, False, self._enforcePeriodicBox)
+
+	def report(self, simulation, state):
+		if not self._finalizer.alive:
+			raise RuntimeError('report requested after reporter has been closed')
+		if not self._hasInitialized:
+			if self._subset is None:
+				self._subset = np.arange(simulation.system.getNumParticles())
+				self._all = True
+			header = struct.pack(_trajectoryLayout, _trajectoryMagic, self._precision, len(self._subset))
+			self._put(header + self._subset.astype('<i4').tobytes())
+			self._hasInitialized = True
+		positions = state.getPositions(asNumpy=True).value_in_unit(unit.nanometers)
+		if not self._all:
+			positions = positions[self._subset]
+		box = state.getPeriodicBoxVectors(asNumpy=True).value_in_unit(unit.nanometers)
+		time = state.getTime().value_in_unit(unit.picoseconds)
+		self._put((simulation.currentStep, time, box, positions))
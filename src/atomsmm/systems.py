@@ -0,0 +1,447 @@
+"""
+.. module:: systems
+   :platform: Unix, Windows
+   :synopsis: a module for building and transforming OpenMM systems.
+
+.. moduleauthor:: Charlles R. A. Abreu <abreu@eq.ufrj.br>
+
+"""
+
+import errno
+import hashlib
+import os
+import tempfile
+from copy import deepcopy
+
+import numpy as np
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+from atomsmm.utils import InputError
+from atomsmm.utils import _replaceFile
+
+# For each supported Force class, a list of per-item terms, each one described by the names of the
+# methods that count, get, and add items, the number of leading particle indices returned by the
+# getter, and whether the remaining parameters are passed to the adder as a single list.
+_forceTerms = {
+    openmm.NonbondedForce: [('getNumParticles', 'getParticleParameters', 'addParticle', 0, False),
+                            ('getNumExceptions', 'getExceptionParameters', 'addException', 2, False)],
+    openmm.HarmonicBondForce: [('getNumBonds', 'getBondParameters', 'addBond', 2, False)],
+    openmm.HarmonicAngleForce: [('getNumAngles', 'getAngleParameters', 'addAngle', 3, False)],
+    openmm.PeriodicTorsionForce: [('getNumTorsions', 'getTorsionParameters', 'addTorsion', 4, False)],
+    openmm.RBTorsionForce: [('getNumTorsions', 'getTorsionParameters', 'addTorsion', 4, False)],
+    openmm.CustomBondForce: [('getNumBonds', 'getBondParameters', 'addBond', 2, False)],
+    openmm.CustomAngleForce: [('getNumAngles', 'getAngleParameters', 'addAngle', 3, False)],
+    openmm.CustomTorsionForce: [('getNumTorsions', 'getTorsionParameters', 'addTorsion', 4, False)],
+    openmm.CustomExternalForce: [('getNumParticles', 'getParticleParameters', 'addParticle', 1, False)],
+    openmm.CustomNonbondedForce: [('getNumParticles', 'getParticleParameters', 'addParticle', 0, True),
+                                  ('getNumExclusions', 'getExclusionParticles', 'addExclusion', 2, False)],
+    openmm.CMMotionRemover: [],
+    }  # noqa E123
+
+
+def _checkSupport(force):
+    forceType = next((cls for cls in _forceTerms if isinstance(force, cls)), None)
+    if forceType is None:
+        raise InputError("replication of %s objects is not supported" % force.__class__.__name__)
+    if isinstance(force, openmm.CustomNonbondedForce) and force.getNumInteractionGroups() > 0:
+        raise InputError("replication of CustomNonbondedForce with interaction groups is not supported")
+    if isinstance(force, openmm.NonbondedForce) and hasattr(force, 'getNumParticleParameterOffsets'):
+        if force.getNumParticleParameterOffsets() + force.getNumExceptionParameterOffsets() > 0:
+            raise InputError("replication of NonbondedForce with parameter offsets is not supported")
+    return forceType
+
+
+def _replicateForce(force, numParticles, numCopies):
+    replica = deepcopy(force)
+    for (count, get, add, numAtoms, packed) in _forceTerms[_checkSupport(force)]:
+        items = [getattr(force, get)(index) for index in range(getattr(force, count)())]
+        adder = getattr(replica, add)
+        for copy in range(1, numCopies):
+            offset = copy*numParticles
+            for item in items:
+                atoms = [atom + offset for atom in item[0:numAtoms]]
+                if packed:
+                    adder(*(atoms + [item[numAtoms:]]))
+                else:
+                    adder(*(atoms + list(item[numAtoms:])))
+    return replica
+
+
+def _replicateTopology(topology, numCopies):
+    replica = app.Topology()
+    for copy in range(numCopies):
+        atoms = dict()
+        for chain in topology.chains():
+            newChain = replica.addChain(chain.id)
+            for residue in chain.residues():
+                newResidue = replica.addResidue(residue.name, newChain, residue.id)
+                for atom in residue.atoms():
+                    atoms[atom] = replica.addAtom(atom.name, atom.element, newResidue, atom.id)
+        for bond in topology.bonds():
+            replica.addBond(atoms[bond[0]], atoms[bond[1]], bond.type, bond.order)
+    return replica
+
+
+def _replicateParticles(system, numCopies):
+    replica = openmm.System()
+    N = system.getNumParticles()
+    masses = [system.getParticleMass(i) for i in range(N)]
+    constraints = [system.getConstraintParameters(i) for i in range(system.getNumConstraints())]
+    for copy in range(numCopies):
+        offset = copy*N
+        for mass in masses:
+            replica.addParticle(mass)
+        for (i, j, distance) in constraints:
+            replica.addConstraint(i + offset, j + offset, distance)
+    return replica
+
+
+def replicateSystem(system, topology, positions, cells):
+    """
+    Creates a supercell by tiling copies of a periodic system along the directions of its box
+    vectors. All particles, constraints, and Force objects of the system are replicated, as well
+    as the atoms, residues, chains, and bonds of its topology. The cost grows linearly with the
+    number of atoms in the supercell.
+
+    .. warning::
+        Only the most common Force types are supported, namely NonbondedForce, HarmonicBondForce,
+        HarmonicAngleForce, PeriodicTorsionForce, RBTorsionForce, CustomBondForce,
+        CustomAngleForce, CustomTorsionForce, CustomExternalForce, CustomNonbondedForce (without
+        interaction groups), and CMMotionRemover. This includes all AtomsMM forces. Systems with
+        virtual sites are not supported either. Note that the positions passed to a
+        CustomExternalForce are not shifted.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system to be replicated. Its default periodic box vectors define the unit cell.
+        topology : openmm.app.Topology
+            The topology of the system.
+        positions : list(openmm.Vec3) or unit.Quantity
+            The positions of all atoms in the unit cell.
+        cells : tuple(int, int, int)
+            The number of unit cells along the directions of the first, second, and third box
+            vectors, respectively.
+
+    Returns
+    -------
+        openmm.System
+            The supercell system.
+        openmm.app.Topology
+            The supercell topology.
+        unit.Quantity
+            The positions of all atoms in the supercell, as a NumPy array in nanometers.
+
+    """
+    N = system.getNumParticles()
+    if any(system.isVirtualSite(i) for i in range(N)):
+        raise InputError("replication of systems with virtual sites is not supported")
+    for force in system.getForces():
+        _checkSupport(force)
+    n = tuple(cells)
+    numCopies = n[0]*n[1]*n[2]
+    box = np.array([v.value_in_unit(unit.nanometers) for v in system.getDefaultPeriodicBoxVectors()])
+    shifts = np.array([i*box[0] + j*box[1] + k*box[2]
+                       for i in range(n[0]) for j in range(n[1]) for k in range(n[2])])
+    if unit.is_quantity(positions):
+        positions = positions.value_in_unit(unit.nanometers)
+    x = np.array([[r[0], r[1], r[2]] for r in positions])
+    newPositions = (shifts[:, np.newaxis, :] + x[np.newaxis, :, :]).reshape(numCopies*N, 3)
+
+    replica = _replicateParticles(system, numCopies)
+    replica.setDefaultPeriodicBoxVectors(*[openmm.Vec3(*(n[i]*box[i])) for i in range(3)])
+    for force in system.getForces():
+        replica.addForce(_replicateForce(force, N, numCopies))
+
+    newTopology = _replicateTopology(topology, numCopies)
+    newTopology.setPeriodicBoxVectors(replica.getDefaultPeriodicBoxVectors())
+    return replica, newTopology, newPositions*unit.nanometers
+
+
+def batchReplicas(system, topology, positions, replicas):
+    """
+    Creates a system made of independent copies of a given system, which occupy the same periodic
+    box but do not interact with one another. This allows many small systems to be simulated in a
+    single Context, thus sharing the per-step overhead of the platform. Each CustomNonbondedForce is
+    restricted to pairs of particles of the same replica by means of interaction groups, while all
+    other supported Force types are replicated as in :func:`replicateSystem`.
+
+    For thermostatting each replica independently, the thermostat propagators must be created with
+    the same number of `replicas`, and the replica indices must be assigned to the integrator by
+    means of :func:`assignReplicas` after the Context has been created.
+
+    .. note::
+        Per-replica thermostatting requires one summation over all particles of the batched
+        system for each replica at every thermostat application, so its cost grows as `R*N`,
+        where `R` is the number of replicas and `N` is the number of particles of the batched
+        system. This is the main limit to the speed-up of batching many replicas.
+
+    .. warning::
+        A NonbondedForce cannot be restricted to pairs of the same replica. It must be replaced
+        beforehand by AtomsMM forces, such as a :class:`~atomsmm.forces.DampedSmoothedForce`
+        together with a :class:`~atomsmm.forces.NonbondedExceptionsForce`. A CMMotionRemover is
+        discarded, since it would couple the replicas. Consequently, each replica has 3 more
+        degrees of freedom than counted by :func:`~atomsmm.utils.countDegreesOfFreedom` for the
+        original system.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system to be replicated.
+        topology : openmm.app.Topology
+            The topology of the system.
+        positions : list(openmm.Vec3) or unit.Quantity
+            The positions of all atoms of the system.
+        replicas : int
+            The number of replicas.
+
+    Returns
+    -------
+        openmm.System
+            The system containing all replicas. The particles of replica `k` are those with
+            indices from `k*N` to `(k+1)*N-1`, where `N` is the number of particles in the original
+            system.
+        openmm.app.Topology
+            The topology containing all replicas.
+        unit.Quantity
+            The positions of all atoms, as a NumPy array in nanometers.
+
+    """
+    N = system.getNumParticles()
+    if any(system.isVirtualSite(i) for i in range(N)):
+        raise InputError("replication of systems with virtual sites is not supported")
+    for force in system.getForces():
+        if isinstance(force, openmm.NonbondedForce):
+            raise InputError("NonbondedForce cannot be restricted to replicas; use AtomsMM forces instead")
+        _checkSupport(force)
+    if unit.is_quantity(positions):
+        positions = positions.value_in_unit(unit.nanometers)
+    x = np.array([[r[0], r[1], r[2]] for r in positions])
+
+    batch = _replicateParticles(system, replicas)
+    batch.setDefaultPeriodicBoxVectors(*system.getDefaultPeriodicBoxVectors())
+    for force in system.getForces():
+        if not isinstance(force, openmm.CMMotionRemover):
+            replica = _replicateForce(force, N, replicas)
+            if isinstance(replica, openmm.CustomNonbondedForce):
+                for k in range(replicas):
+                    members = set(range(k*N, (k+1)*N))
+                    replica.addInteractionGroup(members, members)
+            batch.addForce(replica)
+
+    newTopology = _replicateTopology(topology, replicas)
+    newTopology.setPeriodicBoxVectors(batch.getDefaultPeriodicBoxVectors())
+    return batch, newTopology, np.tile(x, (replicas, 1))*unit.nanometers
+
+
+def assignReplicas(context, replicas):
+    """
+    Assigns the replica index of every degree of freedom to an integrator created from propagators
+    with multiple `replicas` (see :func:`batchReplicas`, including the note on the cost of
+    per-replica thermostatting).
+
+    Parameters
+    ----------
+        context : openmm.Context
+            A Context whose system was created by :func:`batchReplicas`.
+        replicas : int
+            The number of replicas.
+
+    """
+    integrator = context.getIntegrator()
+    names = [integrator.getPerDofVariableName(i) for i in range(integrator.getNumPerDofVariables())]
+    if "replica" not in names:
+        raise InputError("integrator has no per-replica propagators")
+    N = context.getSystem().getNumParticles()
+    if N % replicas != 0:
+        raise InputError("number of particles is not a multiple of the number of replicas")
+    integrator.setPerDofVariableByName("replica", [openmm.Vec3(k, k, k) for k in range(replicas) for i in range(N//replicas)])
+
+
+def _digest(item, hasher):
+    if isinstance(item, (list, tuple)):
+        hasher.update(b'[')
+        for element in item:
+            _digest(element, hasher)
+        hasher.update(b']')
+    elif isinstance(item, dict):
+        hasher.update(b'{')
+        for key in sorted(item.keys(), key=repr):
+            _digest(key, hasher)
+            _digest(item[key], hasher)
+        hasher.update(b'}')
+    elif isinstance(item, str) and os.path.isfile(item):
+        with open(item, 'rb') as f:
+            hasher.update(f.read())
+    elif isinstance(item, atomsmm.forces.Force):
+        hasher.update(item.__class__.__name__.encode())
+        _digest(item.forces, hasher)
+    elif isinstance(item, (openmm.System, openmm.Force)):
+        hasher.update(openmm.XmlSerializer.serialize(item).encode())
+    elif isinstance(item, app.Topology):
+        for atom in item.atoms():
+            hasher.update(("%s %s %s %s %s;" % (atom.name, atom.element, atom.residue.name,
+                                                atom.residue.id, atom.residue.chain.id)).encode())
+        for (atom1, atom2) in item.bonds():
+            hasher.update(("%d-%d;" % (atom1.index, atom2.index)).encode())
+        hasher.update(repr(item.getPeriodicBoxVectors()).encode())
+    else:
+        hasher.update(repr(item).encode())
+    hasher.update(b'|')
+
+
+class SystemCache:
+    """
+    An on-disk cache of assembled OpenMM systems, which avoids repeating the creation of a system
+    from a force field and its splitting into AtomsMM forces in every run. Systems are stored in
+    serialized form under a key obtained by hashing the contents of everything the system is built
+    from, together with the versions of AtomsMM and OpenMM. When the total size of the cache
+    exceeds a given limit, the least recently used systems are evicted.
+
+    Parameters
+    ----------
+        directory : str, optional, default=None
+            The directory in which the systems are stored. If this is None, then the directory
+            `atomsmm` inside the user's cache directory (`$XDG_CACHE_HOME` or `~/.cache`) is used.
+        maxSize : int, optional, default=2**30
+            The maximum total size of the cache, in bytes.
+
+    """
+    def __init__(self, directory=None, maxSize=2**30):
+        if directory is None:
+            root = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+            directory = os.path.join(root, 'atomsmm')
+        self.directory = directory
+        self.maxSize = maxSize
+        try:
+            os.makedirs(directory)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+
+    def key(self, *inputs):
+        """
+        Computes the cache key of a system built from the given inputs. Strings that are names of
+        existing files are hashed by content, OpenMM systems and forces (as well as AtomsMM forces)
+        by their serialized form, topologies by their atoms, bonds, and box vectors, containers
+        recursively, and anything else by its `repr`.
+
+        .. warning::
+            AtomsMM forces must be hashed in their original state, that is, before their parameters
+            are imported by means of :func:`~atomsmm.forces.Force.importFrom`.
+
+        Parameters
+        ----------
+            *inputs
+                The inputs from which the system is built.
+
+        Returns
+        -------
+            str
+                A SHA-256 hexadecimal digest.
+
+        """
+        hasher = hashlib.sha256()
+        _digest([atomsmm.__version__, openmm.Platform.getOpenMMVersion()], hasher)
+        _digest(inputs, hasher)
+        return hasher.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.directory, key + '.xml')
+
+    def get(self, key):
+        """
+        Retrieves a system from the cache.
+
+        Parameters
+        ----------
+            key : str
+                The cache key of the system.
+
+        Returns
+        -------
+            openmm.System or None
+                The cached system, or None if it is not in the cache or its file is corrupt.
+
+        """
+        file = self._file(key)
+        try:
+            with open(file) as f:
+                system = openmm.XmlSerializer.deserialize(f.read())
+        except (IOError, OSError, ValueError, openmm.OpenMMException):
+            return None
+        os.utime(file, None)
+        return system
+
+    def put(self, key, system):
+        """
+        Stores a system in the cache and evicts the least recently used systems if necessary.
+
+        Parameters
+        ----------
+            key : str
+                The cache key of the system.
+            system : openmm.System
+                The system to be stored.
+
+        """
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as f:
+            f.write(openmm.XmlSerializer.serialize(system))
+        _replaceFile(temporary, self._file(key))
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used systems until the total size of the cache does not exceed
+        its maximum size.
+
+        Parameters
+        ----------
+            keep : str, optional, default=None
+                The key of a system that must not be removed.
+
+        """
+        entries = list()
+        for name in os.listdir(self.directory):
+            if name.endswith('.xml'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name[:-4]))
+        total = sum(size for (time, size, key) in entries)
+        for (time, size, key) in sorted(entries):
+            if total <= self.maxSize:
+                break
+            if key != keep:
+                try:
+                    os.remove(self._file(key))
+                except OSError:
+                    pass
+                total -= size
+
+    def system(self, builder, *inputs):
+        """
+        Returns a system from the cache or, if it is not there, builds and stores it.
+
+        Parameters
+        ----------
+            builder : function
+                A function which builds the system when called with `inputs` as arguments.
+            *inputs
+                The inputs from which the system is built, which also determine its cache key
+                (see :func:`key`).
+
+        Returns
+        -------
+            openmm.System
+                The cached or newly built system.
+
+        """
+        key = self.key(*inputs)
+        system = self.get(key)
+        if system is None:
+            system = builder(*inputs)
+            self.put(key, system)
+        return system
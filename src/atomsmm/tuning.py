@@ -0,0 +1,682 @@
+"""
+.. module:: tuning
+   :platform: Unix, Windows
+   :synopsis: a module for measuring and tuning the performance of simulations.
+
+.. moduleauthor:: Charlles R. A. Abreu <abreu@eq.ufrj.br>
+
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+from copy import deepcopy
+
+import numpy as np
+from simtk import openmm
+from simtk import unit
+
+from atomsmm.systems import SystemCache
+from atomsmm.utils import InputError
+from atomsmm.utils import _lockFile
+from atomsmm.utils import _minimumImage
+from atomsmm.utils import _replaceFile
+
+
+def _groupLabels(system):
+    labels = dict()
+    for force in system.getForces():
+        labels.setdefault(force.getForceGroup(), []).append(force.__class__.__name__)
+        if isinstance(force, openmm.NonbondedForce):
+            group = force.getReciprocalSpaceForceGroup()
+            if group >= 0 and group != force.getForceGroup():
+                labels.setdefault(group, []).append("NonbondedForce(reciprocal)")
+    return dict((group, "+".join(names)) for (group, names) in labels.items())
+
+
+class ForceGroupProfile:
+    """
+    Measures the wall time spent in force evaluations of each force group of a system. All groups
+    are evaluated repeatedly in a warm Context, in an interleaved fashion, and the fixed overhead of
+    a `getState` call that evaluates no forces is subtracted.
+
+    The results can be used to choose force groups and loops for a
+    :class:`~atomsmm.propagators.RespaPropagator`, by means of method :func:`speed`.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system whose force groups will be profiled. Typically, it will already contain
+            AtomsMM forces, such as :class:`~atomsmm.forces.NearNonbondedForce` and
+            :class:`~atomsmm.forces.FarNonbondedForce`, assigned to distinct groups.
+        positions : list(tuple) or unit.Quantity
+            The positions of all atoms.
+        platform : str, optional, default='CPU'
+            The name of the platform to be used.
+        properties : dict(str, str), optional, default=None
+            A set of values for platform-specific properties.
+        repeats : int, optional, default=20
+            The number of timed evaluations of each force group.
+        warmup : int, optional, default=3
+            The number of untimed evaluations of each force group done before timing.
+
+    Attributes
+    ----------
+        labels : dict(int, str)
+            The names of the OpenMM forces in each group.
+        timings : dict(int, numpy.ndarray)
+            The measured wall times (in seconds) of all evaluations of each group.
+
+    """
+    def __init__(self, system, positions, platform='CPU', properties=None, repeats=20, warmup=3):
+        self.labels = _groupLabels(system)
+        groups = sorted(self.labels.keys())
+        integrator = openmm.VerletIntegrator(0.0)
+        platform = openmm.Platform.getPlatformByName(platform)
+        if properties is None:
+            context = openmm.Context(deepcopy(system), integrator, platform)
+        else:
+            context = openmm.Context(deepcopy(system), integrator, platform, properties)
+        context.setPositions(positions)
+        samples = dict((group, []) for group in groups + [None])
+        for i in range(warmup + repeats):
+            for group in groups + [None]:
+                start = time.time()
+                context.getState(getForces=True, groups=0 if group is None else set([group]))
+                if i >= warmup:
+                    samples[group].append(time.time() - start)
+        overhead = np.median(samples.pop(None))
+        self.timings = dict((group, np.maximum(np.array(times) - overhead, 0.0)) for (group, times) in samples.items())
+
+    def statistics(self, group):
+        """
+        Returns statistics of the wall time of force evaluations for a given group.
+
+        Parameters
+        ----------
+            group : int
+                The force group.
+
+        Returns
+        -------
+            dict(str, float)
+                The mean, median, 90th percentile (p90), and 99th percentile (p99) of the wall
+                time (in seconds).
+
+        """
+        times = self.timings[group]
+        return dict(mean=np.mean(times), median=np.median(times),
+                    p90=np.percentile(times, 90), p99=np.percentile(times, 99))
+
+    def evaluations(self, loops):
+        """
+        Returns the number of evaluations of each force group in a single time step of a
+        :class:`~atomsmm.propagators.RespaPropagator` with the given loops.
+
+        Parameters
+        ----------
+            loops : list(int)
+                The loops of a :class:`~atomsmm.propagators.RespaPropagator`.
+
+        Returns
+        -------
+            dict(int, int)
+                The number of evaluations of each group. Groups beyond `len(loops)-1` are not
+                included, since a RespaPropagator does not use them.
+
+        """
+        count = dict()
+        for group in range(len(loops)):
+            count[group] = int(np.prod(loops[group:]))
+        return count
+
+    def speed(self, loops, stepSize, statistic='mean'):
+        """
+        Projects the simulation speed obtained with a :class:`~atomsmm.propagators.RespaPropagator`
+        with the given loops, considering only the cost of force evaluations.
+
+        Parameters
+        ----------
+            loops : list(int)
+                The loops of a :class:`~atomsmm.propagators.RespaPropagator`.
+            stepSize : unit.Quantity
+                The outermost time step size.
+            statistic : str, optional, default='mean'
+                The statistic used as evaluation cost (see :func:`statistics`).
+
+        Returns
+        -------
+            float
+                The projected speed, in ns/day.
+
+        """
+        cost = 0.0
+        for (group, count) in self.evaluations(loops).items():
+            if group in self.timings:
+                cost += count*self.statistics(group)[statistic]
+        return stepSize.value_in_unit(unit.nanoseconds)*86400/cost
+
+    def __str__(self):
+        lines = ["%5s %12s %12s %12s %12s  %s" % ("group", "mean(ms)", "median(ms)", "p90(ms)", "p99(ms)", "forces")]
+        for group in sorted(self.timings.keys()):
+            stats = self.statistics(group)
+            values = tuple(1000*stats[key] for key in ["mean", "median", "p90", "p99"])
+            lines.append("%5d %12.4f %12.4f %12.4f %12.4f  %s" % ((group,) + values + (self.labels[group],)))
+        return "\n".join(lines)
+
+
+class RespaPlanner:
+    """
+    Plans the force groups and loops of a :class:`~atomsmm.propagators.RespaPropagator` for a
+    given system. For this, a short trajectory is generated and the characteristic frequency of
+    each unit of forces is estimated as
+
+    .. math::
+        \\omega = \\sqrt{\\frac{\\langle \\|\\dot{\\mathbf{F}}\\|^2 \\rangle}{\\langle \\|\\mathbf{F}\\|^2 \\rangle}},
+
+    where :math:`\\dot{\\mathbf{F}}` is computed by finite differences between consecutive time
+    steps. For a harmonic oscillator, :math:`\\omega` is exactly its angular frequency. Each unit
+    is then integrated with the largest time step not exceeding :math:`\\kappa/\\omega`, where
+    :math:`\\kappa` is a safety factor, among those obtained by dividing the outermost time step
+    by a power of 2. Units requiring the same number of substeps share a force group.
+
+    Forces which share a force group other than 0 in the passed system are treated as a single
+    unit. So are the OpenMM forces of each AtomsMM force passed in `forces`, even when they are in
+    group 0. This is necessary for AtomsMM forces made of more than one OpenMM force, such as
+    :class:`~atomsmm.forces.FarNonbondedForce`. All other forces in group 0 are treated
+    individually.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system whose forces will be assigned to force groups.
+        positions : list(tuple) or unit.Quantity
+            The positions of all atoms.
+        stepSize : unit.Quantity
+            The outermost time step size.
+        temperature : unit.Quantity, optional, default=300*unit.kelvin
+            The temperature at which initial velocities are assigned.
+        safety : float, optional, default=0.5
+            The safety factor :math:`\\kappa`.
+        samples : int, optional, default=20
+            The number of sampled pairs of consecutive time steps.
+        interval : int, optional, default=10
+            The number of time steps between consecutive samples.
+        samplingStep : unit.Quantity, optional, default=0.5*unit.femtoseconds
+            The time step size used for sampling.
+        platform : str, optional, default='CPU'
+            The name of the platform to be used.
+        seed : int, optional, default=None
+            A seed for the initial velocities.
+        forces : list(:class:`~atomsmm.forces.Force`), optional, default=None
+            AtomsMM forces which have been added to the system.
+
+    Attributes
+    ----------
+        units : list(list(int))
+            The indices of the forces in each unit.
+        labels : list(str)
+            The names of the OpenMM forces in each unit.
+        frequencies : numpy.ndarray
+            The characteristic frequency of each unit, in 1/ps.
+        substeps : list(int)
+            The number of substeps per outermost time step required by each unit.
+        groups : list(int)
+            The force group assigned to each unit.
+        loops : list(int)
+            The loops of a :class:`~atomsmm.propagators.RespaPropagator` that match the assigned
+            force groups.
+
+    """
+    def __init__(self, system, positions, stepSize, temperature=300*unit.kelvin, safety=0.5,
+                 samples=20, interval=10, samplingStep=0.5*unit.femtoseconds, platform='CPU', seed=None,
+                 forces=None):
+        self.stepSize = stepSize
+        # OpenMM returns a new proxy for each call to getForce, so the forces of an AtomsMM force
+        # are recognized by the addresses of their underlying C++ objects:
+        owners = dict()
+        for (position, atomsmmForce) in enumerate(forces or []):
+            for force in atomsmmForce.forces:
+                owners[int(force.this)] = position
+        self.units = list()
+        shared = dict()
+        for (index, force) in enumerate(system.getForces()):
+            group = force.getForceGroup()
+            key = ('group', group) if group != 0 else ('force', owners.get(int(force.this), -1 - index))
+            if key in shared:
+                shared[key].append(index)
+            else:
+                shared[key] = [index]
+                self.units.append(shared[key])
+        if len(self.units) > 32:
+            raise InputError("too many force units to be sampled separately")
+        self.labels = ["+".join(system.getForce(i).__class__.__name__ for i in members) for members in self.units]
+
+        model = deepcopy(system)
+        for (group, members) in enumerate(self.units):
+            for index in members:
+                force = model.getForce(index)
+                force.setForceGroup(group)
+                if isinstance(force, openmm.NonbondedForce):
+                    force.setReciprocalSpaceForceGroup(-1)
+        integrator = openmm.VerletIntegrator(samplingStep)
+        context = openmm.Context(model, integrator, openmm.Platform.getPlatformByName(platform))
+        context.setPositions(positions)
+        if seed is None:
+            context.setVelocitiesToTemperature(temperature)
+        else:
+            context.setVelocitiesToTemperature(temperature, seed)
+        delta = samplingStep.value_in_unit(unit.picoseconds)
+        squaredForce = np.zeros(len(self.units))
+        squaredRate = np.zeros(len(self.units))
+        for sample in range(samples):
+            integrator.step(interval)
+            before = [self._forces(context, group) for group in range(len(self.units))]
+            integrator.step(1)
+            after = [self._forces(context, group) for group in range(len(self.units))]
+            for group in range(len(self.units)):
+                squaredForce[group] += np.sum(before[group]**2 + after[group]**2)/2
+                squaredRate[group] += np.sum((after[group] - before[group])**2)/delta**2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.frequencies = np.where(squaredForce > 0, np.sqrt(squaredRate/squaredForce), 0.0)
+
+        outer = stepSize.value_in_unit(unit.picoseconds)
+        self.substeps = list()
+        for frequency in self.frequencies:
+            n = 1
+            while frequency*outer/n > safety:
+                n *= 2
+            self.substeps.append(n)
+        levels = sorted(set(self.substeps), reverse=True)
+        self.groups = [levels.index(n) for n in self.substeps]
+        self.loops = [levels[i]//levels[i+1] for i in range(len(levels) - 1)] + [levels[-1]]
+
+    def _forces(self, context, group):
+        state = context.getState(getForces=True, groups=set([group]))
+        return state.getForces(asNumpy=True).value_in_unit(unit.kilojoules_per_mole/unit.nanometers)
+
+    def apply(self, system):
+        """
+        Assigns the planned force groups to the forces of a system. The reciprocal-space part of a
+        NonbondedForce is assigned to the same group as its direct-space part.
+
+        Parameters
+        ----------
+            system : openmm.System
+                The system, which must have the same forces as the one passed to the constructor.
+
+        Returns
+        -------
+            list(int)
+                The loops of a :class:`~atomsmm.propagators.RespaPropagator`.
+
+        """
+        if system.getNumForces() != sum(len(members) for members in self.units):
+            raise InputError("number of forces does not match the planned system")
+        for (members, group) in zip(self.units, self.groups):
+            for index in members:
+                force = system.getForce(index)
+                force.setForceGroup(group)
+                if isinstance(force, openmm.NonbondedForce):
+                    force.setReciprocalSpaceForceGroup(-1)
+        return list(self.loops)
+
+    def __str__(self):
+        outer = self.stepSize.value_in_unit(unit.femtoseconds)
+        lines = ["%-8s %14s %12s %9s %6s  %s" % ("forces", "omega(1/ps)", "substep(fs)", "substeps", "group", "names")]
+        for (i, members) in enumerate(self.units):
+            values = (",".join(map(str, members)), self.frequencies[i], outer/self.substeps[i],
+                      self.substeps[i], self.groups[i], self.labels[i])
+            lines.append("%-8s %14.3f %12.4f %9d %6d  %s" % values)
+        lines.append("loops = %s" % self.loops)
+        return "\n".join(lines)
+
+
+def _platformTrials(name, threads):
+    if name == 'CPU':
+        return [{'Threads': str(n), 'DeterministicForces': deterministic}
+                for n in threads for deterministic in ['false', 'true']]
+    return [dict()]
+
+
+def _readEntries(file):
+    try:
+        with open(file) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return dict()
+
+
+def selectPlatform(system, positions, integrator, platforms=None, threads=None, steps=10,
+                   temperature=300*unit.kelvin, directory=None, refresh=False):
+    """
+    Selects the fastest platform and platform properties for simulating a system with a given
+    integrator. Short timed trials are executed for every available platform (except Reference,
+    unless it is explicitly requested) and, in the case of the CPU platform, for several thread
+    counts with and without deterministic forces. The best configuration is cached on disk, so
+    that subsequent calls on the same host for the same system return immediately.
+
+    .. note::
+        The cache key combines the host name with the key of the system in a
+        :class:`~atomsmm.systems.SystemCache`, which also accounts for the versions of AtomsMM and
+        OpenMM. The integrator is not part of the key. The cache file is updated under a lock, so
+        that concurrent calls from different processes keep each other's entries.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system to be simulated.
+        positions : list(tuple) or unit.Quantity
+            The positions of all atoms.
+        integrator : openmm.Integrator
+            The integrator to be used (e.g. one obtained from a
+            :class:`~atomsmm.propagators.Propagator`). Only copies of it are employed in the trials.
+        platforms : list(str), optional, default=None
+            The names of the platforms to be tried. If this is None, all available platforms except
+            Reference are tried.
+        threads : list(int), optional, default=None
+            The thread counts to be tried with the CPU platform. If this is None, all powers of 2
+            smaller than the number of cores, as well as the number of cores itself, are tried.
+        steps : int, optional, default=10
+            The number of timed steps in each trial.
+        temperature : unit.Quantity, optional, default=300*unit.kelvin
+            The temperature at which initial velocities are assigned.
+        directory : str, optional, default=None
+            The directory of the cache file `platforms.json`. If this is None, then the default
+            directory of a :class:`~atomsmm.systems.SystemCache` is used.
+        refresh : bool, optional, default=False
+            Whether to run the trials even if the system has a cached configuration.
+
+    Returns
+    -------
+        openmm.Platform
+            The selected platform.
+        dict(str, str)
+            The selected platform properties, which can be passed to `app.Simulation` along with
+            the platform.
+
+    """
+    cache = SystemCache(directory)
+    key = '%s/%s' % (socket.gethostname(), cache.key(system))
+    file = os.path.join(cache.directory, 'platforms.json')
+    entries = _readEntries(file)
+    if key in entries and not refresh:
+        entry = entries[key]
+        return openmm.Platform.getPlatformByName(entry['platform']), entry['properties']
+    if platforms is None:
+        platforms = [openmm.Platform.getPlatform(i).getName() for i in range(openmm.Platform.getNumPlatforms())]
+        platforms = [name for name in platforms if name != 'Reference']
+    if threads is None:
+        cores = multiprocessing.cpu_count()
+        threads = [2**i for i in range(cores.bit_length()) if 2**i < cores] + [cores]
+    best = None
+    for name in platforms:
+        for properties in _platformTrials(name, threads):
+            try:
+                context = openmm.Context(system, deepcopy(integrator), openmm.Platform.getPlatformByName(name), properties)
+                context.setPositions(positions)
+                context.setVelocitiesToTemperature(temperature, 1)
+                context.getIntegrator().step(1)
+                start = time.time()
+                context.getIntegrator().step(steps)
+                elapsed = (time.time() - start)/steps
+            except openmm.OpenMMException:
+                continue
+            finally:
+                context = None
+            if best is None or elapsed < best[0]:
+                best = (elapsed, name, properties)
+    if best is None:
+        raise InputError("no platform could be used for the given system and integrator")
+    # Other processes may have updated the file during the trials:
+    with _lockFile(file):
+        entries = _readEntries(file)
+        entries[key] = dict(platform=best[1], properties=best[2], time=best[0])
+        descriptor, temporary = tempfile.mkstemp(dir=cache.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        _replaceFile(temporary, file)
+    return openmm.Platform.getPlatformByName(best[1]), best[2]
+
+
+def _pairDistances(positions, box, first, second):
+    for (k, i) in enumerate(first):
+        partners = second[k+1:] if first is second else second
+        if len(partners) > 0:
+            delta = positions[partners] - positions[i]
+            if box is not None:
+                delta = _minimumImage(delta, box)
+            yield np.sqrt(np.sum(delta**2, axis=1))
+
+
+def _forceRange(force, cutoff, resolution):
+    scan = openmm.CustomNonbondedForce(force.getEnergyFunction())
+    for index in range(force.getNumPerParticleParameters()):
+        scan.addPerParticleParameter(force.getPerParticleParameterName(index))
+    for index in range(force.getNumGlobalParameters()):
+        scan.addGlobalParameter(force.getGlobalParameterName(index), force.getGlobalParameterDefaultValue(index))
+    for index in range(force.getNumTabulatedFunctions()):
+        scan.addTabulatedFunction(force.getTabulatedFunctionName(index), deepcopy(force.getTabulatedFunction(index)))
+    scan.setNonbondedMethod(openmm.CustomNonbondedForce.CutoffNonPeriodic)
+    scan.setCutoffDistance(cutoff)
+    if force.getUseSwitchingFunction():
+        scan.setUseSwitchingFunction(True)
+        scan.setSwitchingDistance(force.getSwitchingDistance())
+    distances = np.arange(1, int(round(cutoff/resolution)) + 1)*resolution
+    distances = distances[distances < cutoff]
+    types = sorted(set(tuple(force.getParticleParameters(i)) for i in range(force.getNumParticles())))
+    system = openmm.System()
+    for i in range(len(distances) + 1):
+        system.addParticle(1.0)
+        scan.addParticle(types[0])
+    scan.addInteractionGroup([0], range(1, len(distances) + 1))
+    system.addForce(scan)
+    context = openmm.Context(system, openmm.VerletIntegrator(0.0), openmm.Platform.getPlatformByName('Reference'))
+    context.setPositions([openmm.Vec3(0, 0, 0)] + [openmm.Vec3(r, 0, 0) for r in distances])
+    reach = 0.0
+    for (i, first) in enumerate(types):
+        for second in types[i:]:
+            scan.setParticleParameters(0, first)
+            for index in range(1, len(distances) + 1):
+                scan.setParticleParameters(index, second)
+            scan.updateParametersInContext(context)
+            forces = context.getState(getForces=True).getForces(asNumpy=True)._value[1:, 0]
+            nonzero = np.nonzero(forces)[0]
+            if len(nonzero) > 0:
+                reach = max(reach, distances[nonzero[-1]])
+    reach = min(round(reach + resolution, 12), cutoff)
+    # A pair force can vanish where the pair energy does not (e.g. a constant tail), in which case
+    # a smaller cutoff would change the energy. Only the grid points beyond the reach are kept:
+    far = 2*cutoff
+    context.setPositions([openmm.Vec3(0, 0, 0)] + [openmm.Vec3(r if r >= reach else far, 0, 0) for r in distances])
+    for (i, first) in enumerate(types):
+        for second in types[i:]:
+            scan.setParticleParameters(0, first)
+            for index in range(1, len(distances) + 1):
+                scan.setParticleParameters(index, second)
+            scan.updateParametersInContext(context)
+            energy = context.getState(getEnergy=True).getPotentialEnergy()._value
+            if abs(energy) > 1e-6:
+                return cutoff
+    return reach
+
+
+def _cutoffDistance(force):
+    # Returns the cutoff distance of a nonbonded force, or None if it has no cutoff:
+    if isinstance(force, openmm.NonbondedForce):
+        if force.getNonbondedMethod() != openmm.NonbondedForce.NoCutoff:
+            return force.getCutoffDistance()
+    elif isinstance(force, openmm.CustomNonbondedForce):
+        if force.getNonbondedMethod() != openmm.CustomNonbondedForce.NoCutoff:
+            return force.getCutoffDistance()
+    return None
+
+
+class PairWorkProfile:
+    """
+    Accounts for the pair work done by each CustomNonbondedForce_ of a system, such as those
+    contained in :class:`~atomsmm.forces.NearNonbondedForce`, :class:`~atomsmm.forces.FarNonbondedForce`,
+    and :class:`~atomsmm.forces.DampedSmoothedForce`. For a given configuration, the number of
+    non-excluded pairs within the cutoff distance of each force (that is, pairs visited in every
+    evaluation) is compared with the number of pairs that actually contribute to the forces.
+
+    The reach of each force, beyond which its pair force vanishes for every combination of
+    per-particle parameters, is determined by scanning the pair force along a grid of distances,
+    with global parameters at their default values. The reach, rounded up to the grid resolution,
+    is the minimal cutoff distance that leaves the computed forces unaltered. If the pair energy
+    does not vanish beyond that distance (e.g. if it has a constant tail), then the reach is taken
+    as the current cutoff distance, so that energies are not altered either.
+
+    .. warning::
+        GPU platforms require all forces in a force group to have the same cutoff distance, so
+        :func:`apply` never reduces a cutoff below that of another nonbonded force in the same
+        group. In particular, the discount part of a :class:`~atomsmm.forces.FarNonbondedForce`
+        shares the force group of its NonbondedForce and is left untrimmed unless it is moved to
+        a force group of its own, e.g. via `system.getForce(index).setForceGroup(group)`. Such
+        forces are listed in the attribute `untrimmed` after :func:`apply` is called.
+
+    .. _CustomNonbondedForce: http://docs.openmm.org/latest/api-python/generated/simtk.openmm.openmm.CustomNonbondedForce.html
+
+    .. note::
+        Pair counting takes a time proportional to the square of the number of atoms.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system to be analyzed.
+        positions : list(tuple) or unit.Quantity
+            The positions of all atoms.
+        resolution : unit.Quantity, optional, default=0.001*unit.nanometers
+            The spacing of the distance grid used to determine the reach of each force.
+
+    Attributes
+    ----------
+        forces : list(int)
+            The indices of the analyzed forces in the system.
+        cutoffs : dict(int, float)
+            The current cutoff distance (in nm) of each analyzed force.
+        reaches : dict(int, float)
+            The minimal cutoff distance (in nm) of each analyzed force.
+        visited : dict(int, int)
+            The number of pairs within the cutoff distance of each analyzed force.
+        contributing : dict(int, int)
+            The number of pairs within the minimal cutoff distance of each analyzed force.
+        untrimmed : dict(int, list(int))
+            The indices of the forces which could not be trimmed to their recommended cutoff
+            distances in the last call to :func:`apply`, each one mapped to the indices of the
+            nonbonded forces in its force group which prevented it.
+
+    """
+    def __init__(self, system, positions, resolution=0.001*unit.nanometers):
+        if unit.is_quantity(positions):
+            positions = positions.value_in_unit(unit.nanometers)
+        positions = np.array([[r[0], r[1], r[2]] for r in positions])
+        box = None
+        if system.usesPeriodicBoundaryConditions():
+            box = np.array([v.value_in_unit(unit.nanometers) for v in system.getDefaultPeriodicBoxVectors()])
+        resolution = resolution.value_in_unit(unit.nanometers)
+        self._resolution = resolution
+        self.forces = list()
+        self.cutoffs = dict()
+        self.reaches = dict()
+        self.visited = dict()
+        self.contributing = dict()
+        self.untrimmed = dict()
+        self._labels = dict()
+        for (index, force) in enumerate(system.getForces()):
+            if not isinstance(force, openmm.CustomNonbondedForce) or force.getNumParticles() == 0:
+                continue
+            if force.getNonbondedMethod() == openmm.CustomNonbondedForce.NoCutoff:
+                continue
+            cutoff = force.getCutoffDistance().value_in_unit(unit.nanometers)
+            reach = _forceRange(force, cutoff, resolution)
+            if force.getNumInteractionGroups() == 0:
+                atoms = np.arange(force.getNumParticles())
+                groups = [(atoms, atoms)]
+            else:
+                groups = [tuple(np.array(sorted(atoms)) for atoms in force.getInteractionGroupParameters(k))
+                          for k in range(force.getNumInteractionGroups())]
+            visited = contributing = 0
+            for (first, second) in groups:
+                if np.array_equal(first, second):
+                    second = first
+                for distances in _pairDistances(positions, box, first, second):
+                    visited += np.count_nonzero(distances < cutoff)
+                    contributing += np.count_nonzero(distances < reach)
+            excluded = np.array([force.getExclusionParticles(k) for k in range(force.getNumExclusions())], dtype=int)
+            if len(excluded) > 0:
+                delta = positions[excluded[:, 1]] - positions[excluded[:, 0]]
+                if box is not None:
+                    delta = _minimumImage(delta, box)
+                distances = np.sqrt(np.sum(delta**2, axis=1))
+                visited -= np.count_nonzero(distances < cutoff)
+                contributing -= np.count_nonzero(distances < reach)
+            self.forces.append(index)
+            self.cutoffs[index] = cutoff
+            self.reaches[index] = reach
+            self.visited[index] = visited
+            self.contributing[index] = contributing
+            self._labels[index] = force.getEnergyFunction().split(";")[0][:40]
+
+    def recommendations(self):
+        """
+        Returns the minimal cutoff distances of all analyzed forces whose current cutoff distance
+        is larger than necessary.
+
+        Returns
+        -------
+            dict(int, unit.Quantity)
+                The recommended cutoff distance of each wasteful force, indexed by its position in
+                the system.
+
+        """
+        return dict((index, self.reaches[index]*unit.nanometers) for index in self.forces
+                    if self.reaches[index] < self.cutoffs[index] - 0.5*self._resolution)
+
+    def apply(self, system):
+        """
+        Reduces the cutoff distances of all wasteful forces of a system to their recommended values.
+        Since GPU platforms require all forces in a force group to have the same cutoff distance,
+        a cutoff is never reduced below that of another nonbonded force in the same force group.
+        For instance, the discount part of a :class:`~atomsmm.forces.FarNonbondedForce` can only
+        be trimmed if it is moved to a force group of its own. The forces left untrimmed for this
+        reason are listed in the attribute `untrimmed`.
+
+        Parameters
+        ----------
+            system : openmm.System
+                The analyzed system or an identical one.
+
+        Returns
+        -------
+            dict(int, unit.Quantity)
+                The new cutoff distance of each modified force.
+
+        """
+        applied = dict()
+        self.untrimmed = dict()
+        for (index, cutoff) in self.recommendations().items():
+            force = system.getForce(index)
+            others = dict((k, _cutoffDistance(other)) for (k, other) in enumerate(system.getForces())
+                          if k != index and other.getForceGroup() == force.getForceGroup())
+            blocking = sorted(k for (k, other) in others.items() if other is not None and other > cutoff)
+            if blocking:
+                self.untrimmed[index] = blocking
+                cutoff = max(others[k] for k in blocking)
+            if cutoff < force.getCutoffDistance():
+                force.setCutoffDistance(cutoff)
+                applied[index] = cutoff
+        return applied
+
+    def __str__(self):
+        lines = ["%5s %10s %10s %14s %14s %8s  %s" % ("force", "cutoff(nm)", "reach(nm)", "visited", "contributing",
+                                                      "waste", "energy")]
+        for index in self.forces:
+            waste = 1 - self.contributing[index]/max(self.visited[index], 1)
+            values = (index, self.cutoffs[index], self.reaches[index], self.visited[index],
+                      self.contributing[index], 100*waste, self._labels[index])
+            lines.append("%5d %10.4f %10.4f %14d %14d %7.1f%%  %s" % values)
+        return "\n".join(lines)
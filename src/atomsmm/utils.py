@@ -7,8 +7,14 @@
 
 """
 
+import errno
+import os
+import time
+from contextlib import contextmanager
 from copy import deepcopy
+from itertools import chain
 
+import numpy as np
 from simtk import openmm
 from simtk import unit
 
@@ -18,6 +24,11 @@ class InputError(Exception):
         super(InputError, self).__init__("\033[1;31m" + msg + "\033[0m")
 
 
+class BlowUpError(Exception):
+    def __init__(self, msg):
+        super(BlowUpError, self).__init__("\033[1;31m" + msg + "\033[0m")
+
+
 def LennardJones(r):
     return "4*epsilon*((sigma/%s)^12 - (sigma/%s)^6)" % (r, r)
 
@@ -33,6 +44,50 @@ def LorentzBerthelot():
     return mixingRule
 
 
+def _minimumImage(delta, box):
+    # Applies the minimum image convention to displacements (in rows) for a box in OpenMM's
+    # reduced form, whose vectors are the rows of `box`:
+    for k in [2, 1, 0]:
+        delta -= np.outer(np.round(delta[:, k]/box[k][k]), box[k])
+    return delta
+
+
+def _replaceFile(source, destination):
+    # os.replace is missing in Python 2, whose os.rename overwrites atomically only on POSIX:
+    try:
+        getattr(os, 'replace', os.rename)(source, destination)
+    except OSError:
+        if not os.path.exists(destination):
+            raise
+        os.remove(destination)
+        os.rename(source, destination)
+
+
+@contextmanager
+def _lockFile(file, timeout=30.0):
+    # Holds an exclusive lock file next to `file`. Since the lock is only held for short
+    # read-modify-write operations, a lock older than `timeout` seconds is considered stale:
+    lock = file + '.lock'
+    while True:
+        try:
+            descriptor = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+            try:
+                if time.time() - os.path.getmtime(lock) > timeout:
+                    os.remove(lock)
+            except OSError:
+                pass
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(descriptor)
+        os.remove(lock)
+
+
 def countDegreesOfFreedom(system):
     """
     Counts the number of degrees of freedom in a system, given by:
@@ -83,8 +138,15 @@ def hijackForce(system, index):
         Side-effect: the passed system object will no longer have the hijacked Force_ object in
         its force list.
 
+    .. note::
+
+        The returned object is a full copy of the original force. For large systems, consider
+        using :func:`detachForce` instead, which avoids this copy.
+
     Parameters
     ----------
+        system : openmm.System
+            The system from which the Force_ object will be extracted.
         index : int
             The index of the Force_ object to be hijacked.
 
@@ -101,6 +163,143 @@ def hijackForce(system, index):
     return force
 
 
+@contextmanager
+def detachForce(system, index):
+    """
+    Provides temporary access to a Force_ object attached to an OpenMM system and then removes it
+    from the system. Unlike :func:`hijackForce`, no copy of the force is made. Instead, the yielded
+    object is the one owned by the system itself, so that its parameters can be read directly.
+
+    .. warning::
+
+        Side-effect: upon leaving the `with` block, the passed system object will no longer have
+        the detached Force_ object in its force list. The yielded object must not be used after
+        that, since it is destroyed along with its removal.
+
+    .. note::
+
+        Forces can be added to the system inside the `with` block, since they are appended to the
+        end of the force list. However, no force must be removed from the system inside the block.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system from which the Force_ object will be detached.
+        index : int
+            The index of the Force_ object to be detached.
+
+    Yields
+    ------
+        openmm.Force
+            The Force_ object that is about to be detached.
+
+    .. _Force: http://docs.openmm.org/latest/api-python/generated/simtk.openmm.openmm.Force.html
+
+    """
+    numForces = system.getNumForces()
+    try:
+        yield system.getForce(index)
+    except BaseException:
+        # The original exception takes precedence over a misuse of the force list:
+        if system.getNumForces() >= numForces:
+            system.removeForce(index)
+        raise
+    if system.getNumForces() < numForces:
+        raise InputError("forces must not be removed while another one is being detached")
+    system.removeForce(index)
+
+
+def _termNames(system):
+    terms = list()
+    counts = dict()
+    for index in range(system.getNumForces()):
+        forceType = system.getForce(index).__class__.__name__
+        if forceType not in counts:
+            counts[forceType] = 0
+            terms.append(forceType)
+        else:
+            counts[forceType] += 1
+            terms.append("%s(%d)" % (forceType, counts[forceType]))
+    return terms
+
+
+class EnergyDecomposer:
+    """
+    A persistent engine for computing the potential energy of a system split into contributions of
+    all Force_ objects attached to it. The system is copied and the required OpenMM Context objects
+    are created only once, at construction. Then, every energy computation only involves updating
+    positions and querying each force group.
+
+    .. _Force: http://docs.openmm.org/latest/api-python/generated/simtk.openmm.openmm.Force.html
+
+    .. note::
+        OpenMM allows at most 32 force groups per Context. If the system has more than 32 forces,
+        they are split into batches of 32, each one handled by a separate Context.
+
+    Parameters
+    ----------
+        system : openmm.System
+            The system whose energy is to be computed. It is not modified.
+        platform : str or openmm.Platform, optional, default='CPU'
+            The platform (or its name) on which the energies will be computed.
+        properties : dict(str, str), optional, default=None
+            A set of values for platform-specific properties.
+
+    """
+    maxGroups = 32
+
+    def __init__(self, system, platform='CPU', properties=None):
+        if not isinstance(platform, openmm.Platform):
+            platform = openmm.Platform.getPlatformByName(platform)
+        numForces = system.getNumForces()
+        self.terms = _termNames(system)
+        self._defaultBox = system.getDefaultPeriodicBoxVectors()
+        self._batches = list()
+        for first in range(0, max(numForces, 1), self.maxGroups):
+            last = min(first + self.maxGroups, numForces)
+            syscopy = deepcopy(system)
+            for index in reversed(range(numForces)):
+                if first <= index < last:
+                    syscopy.getForce(index).setForceGroup(index - first)
+                else:
+                    syscopy.removeForce(index)
+            integrator = openmm.VerletIntegrator(0.0)
+            if properties is None:
+                context = openmm.Context(syscopy, integrator, platform)
+            else:
+                context = openmm.Context(syscopy, integrator, platform, properties)
+            self._batches.append((context, integrator, syscopy, last - first))
+
+    def compute(self, positions, boxVectors=None):
+        """
+        Computes the potential energy terms for a given configuration.
+
+        Parameters
+        ----------
+            positions : list(tuple) or unit.Quantity
+                A list of 3D vectors containing the positions of all atoms.
+            boxVectors : tuple(openmm.Vec3), optional, default=None
+                The periodic box vectors. If this is None, the default box vectors of the system
+                are used.
+
+        Returns
+        -------
+            dict(str, unit.Quantity)
+                A dict containing all potential energy terms, as well as their sum (key "Total").
+
+        """
+        energies = list()
+        for (context, integrator, system, numGroups) in self._batches:
+            context.setPeriodicBoxVectors(*(self._defaultBox if boxVectors is None else boxVectors))
+            context.setPositions(positions)
+            for group in range(numGroups):
+                state = context.getState(getEnergy=True, groups=set([group]))
+                energies.append(state.getPotentialEnergy())
+        energy = dict(zip(self.terms, energies))
+        energy["Total"] = sum(energies, 0.0*unit.kilojoules_per_mole)
+        return energy
+
+
 def splitPotentialEnergy(system, topology, positions):
     """
     Computes the potential energy of a system, with possible splitting into contributions of all
@@ -108,12 +307,18 @@ def splitPotentialEnergy(system, topology, positions):
 
     .. _Force: http://docs.openmm.org/latest/api-python/generated/simtk.openmm.openmm.Force.html
 
+    .. note::
+        This function builds a new :class:`EnergyDecomposer` on the Reference platform at every
+        call. For repeated computations with the same system, create an :class:`EnergyDecomposer`
+        once and reuse it.
+
     Parameters
     ----------
         system : openmm.System
             The system whose energy is to be computed.
         topology : openmm.app.topology.Topology
-            The topological information about a system.
+            The topological information about a system. This argument is ignored and only kept
+            for backward compatibility. It can be None.
         positions : list(tuple)
             A list of 3D vectors containing the positions of all atoms.
 
@@ -123,24 +328,102 @@ def splitPotentialEnergy(system, topology, positions):
             The total potential energy or a dict containing all potential energy terms.
 
     """
-    syscopy = deepcopy(system)
-    forces = [syscopy.getForce(i) for i in range(syscopy.getNumForces())]
-    for (index, force) in enumerate(forces):
-        force.setForceGroup(index)
-    platform = openmm.Platform.getPlatformByName('Reference')
-    integrator = openmm.VerletIntegrator(0.0)
-    simulation = openmm.app.Simulation(topology, syscopy, integrator, platform)
-    simulation.context.setPositions(positions)
-    terms = dict()
-    energy = dict()
-    for (index, force) in enumerate(forces):
-        state = simulation.context.getState(getEnergy=True, groups=set([index]))
-        forceType = force.__class__.__name__
-        if forceType not in terms:
-            terms[forceType] = 0
-            energy[forceType] = state.getPotentialEnergy()
-        else:
-            terms[forceType] += 1
-            energy["%s(%d)" % (forceType, terms[forceType])] = state.getPotentialEnergy()
-    energy["Total"] = sum(energy.values(), 0.0*unit.kilojoules_per_mole)
-    return energy
+    return EnergyDecomposer(system, 'Reference').compute(positions)
+
+
+def _integratorVariables(integrator):
+    if not isinstance(integrator, openmm.CustomIntegrator):
+        return [], []
+    globalNames = [integrator.getGlobalVariableName(i) for i in range(integrator.getNumGlobalVariables())]
+    perDofNames = [integrator.getPerDofVariableName(i) for i in range(integrator.getNumPerDofVariables())]
+    return globalNames, perDofNames
+
+
+def _savez(file, **arrays):
+    # np.savez appends the extension .npz to file names lacking it, unlike to open files:
+    if isinstance(file, str):
+        with open(file, 'wb') as f:
+            np.savez(f, **arrays)
+    else:
+        np.savez(file, **arrays)
+
+
+def saveCheckpoint(context, file, variables=None):
+    """
+    Saves the dynamic state of a Context to a binary NumPy `.npz` file. Unlike OpenMM checkpoints,
+    the file can be restored into a Context on any platform and, unlike serialized States, it also
+    contains the variables of a CustomIntegrator, such as those listed in the `persistent`
+    attribute of a :class:`~atomsmm.propagators.Propagator`.
+
+    Parameters
+    ----------
+        context : openmm.Context
+            The Context whose state will be saved.
+        file : str or file
+            The name of the file or an open binary file.
+        variables : list(str), optional, default=None
+            The names of global and per-DOF integrator variables to be saved. If this is None, all
+            variables of a CustomIntegrator are saved. Passing the `persistent` attribute of the
+            propagator used to build the integrator skips auxiliary per-DOF variables, which are
+            slow to retrieve from OpenMM in large systems.
+
+    """
+    state = context.getState(getPositions=True, getVelocities=True, getParameters=True)
+    arrays = dict(positions=state.getPositions(asNumpy=True).value_in_unit(unit.nanometers),
+                  velocities=state.getVelocities(asNumpy=True).value_in_unit(unit.nanometers/unit.picoseconds),
+                  box=state.getPeriodicBoxVectors(asNumpy=True).value_in_unit(unit.nanometers),
+                  time=state.getTime().value_in_unit(unit.picoseconds),
+                  stepCount=context.getStepCount())
+    parameters = state.getParameters()
+    arrays["parameterNames"] = np.array(list(parameters.keys()), dtype=str)
+    arrays["parameterValues"] = np.array(list(parameters.values()), dtype=np.float64)
+    integrator = context.getIntegrator()
+    globalNames, perDofNames = _integratorVariables(integrator)
+    if variables is not None:
+        unknown = set(variables) - set(globalNames) - set(perDofNames)
+        if unknown:
+            raise InputError("integrator has no variables named %s" % ", ".join(sorted(unknown)))
+        globalNames = [name for name in globalNames if name in variables]
+        perDofNames = [name for name in perDofNames if name in variables]
+    arrays["globalNames"] = np.array(globalNames, dtype=str)
+    arrays["globalValues"] = np.array([integrator.getGlobalVariableByName(name) for name in globalNames], dtype=np.float64)
+    arrays["perDofNames"] = np.array(perDofNames, dtype=str)
+    for name in perDofNames:
+        # Flattening the list of Vec3 is much faster than letting NumPy convert it:
+        values = integrator.getPerDofVariableByName(name)
+        arrays["perDof:" + name] = np.fromiter(chain.from_iterable(values), np.float64, 3*len(values)).reshape(-1, 3)
+    _savez(file, **arrays)
+
+
+def loadCheckpoint(context, file):
+    """
+    Restores into a Context the state saved by :func:`saveCheckpoint`. The Context may have been
+    created on a platform other than the one of the saved Context.
+
+    Parameters
+    ----------
+        context : openmm.Context
+            The Context whose state will be restored.
+        file : str or file
+            The name of the file or an open binary file.
+
+    """
+    with np.load(file) as checkpoint:
+        if checkpoint["positions"].shape[0] != context.getSystem().getNumParticles():
+            raise InputError("number of particles in checkpoint does not match the system")
+        context.setPeriodicBoxVectors(*checkpoint["box"])
+        context.setPositions(checkpoint["positions"])
+        context.setVelocities(checkpoint["velocities"])
+        context.setTime(float(checkpoint["time"]))
+        context.setStepCount(int(checkpoint["stepCount"]))
+        for (name, value) in zip(checkpoint["parameterNames"], checkpoint["parameterValues"]):
+            context.setParameter(str(name), value)
+        integrator = context.getIntegrator()
+        globalNames, perDofNames = _integratorVariables(integrator)
+        missing = (set(checkpoint["globalNames"]) - set(globalNames)) | (set(checkpoint["perDofNames"]) - set(perDofNames))
+        if missing:
+            raise InputError("integrator has no variables named %s" % ", ".join(sorted(missing)))
+        for (name, value) in zip(checkpoint["globalNames"], checkpoint["globalValues"]):
+            integrator.setGlobalVariableByName(str(name), value)
+        for name in checkpoint["perDofNames"]:
+            integrator.setPerDofVariableByName(str(name), checkpoint["perDof:" + name])
@@ -0,0 +1,65 @@
+from __future__ import print_function
+
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+
+def readSystem(case):
+    pdb = app.PDBFile('tests/data/%s.pdb' % case)
+    forcefield = app.ForceField('tests/data/%s.xml' % case)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    return system, pdb.positions, pdb.topology
+
+
+def totalEnergy(system, positions):
+    integrator = openmm.VerletIntegrator(0.0*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('Reference')
+    context = openmm.Context(system, integrator, platform)
+    context.setPositions(positions)
+    return context.getState(getEnergy=True).getPotentialEnergy()
+
+
+def test_reuse():
+    system, positions, topology = readSystem('q-SPC-FW')
+    decomposer = atomsmm.EnergyDecomposer(system, 'Reference')
+    first = decomposer.compute(positions)
+    second = decomposer.compute(positions)
+    reference = atomsmm.splitPotentialEnergy(system, topology, positions)
+    assert set(first.keys()) == set(reference.keys())
+    for term in reference:
+        assert first[term]/first[term].unit == pytest.approx(reference[term]/reference[term].unit)
+        assert second[term]/second[term].unit == pytest.approx(reference[term]/reference[term].unit)
+
+
+def test_many_forces():
+    system, positions, topology = readSystem('q-SPC-FW')
+    for i in range(40):
+        force = openmm.CustomExternalForce("%s*x" % (0.01*(i+1)))
+        for j in range(system.getNumParticles()):
+            force.addParticle(j, [])
+        system.addForce(force)
+    energy = atomsmm.EnergyDecomposer(system, 'Reference').compute(positions)
+    assert len(energy) == system.getNumForces() + 1
+    total = energy["Total"]
+    reference = totalEnergy(system, positions)
+    assert total/total.unit == pytest.approx(reference/reference.unit)
+    first = energy["CustomExternalForce"]
+    last = energy["CustomExternalForce(39)"]
+    assert last/last.unit == pytest.approx(40*first/first.unit)
+
+
+def test_default_box():
+    system, positions, topology = readSystem('q-SPC-FW')
+    decomposer = atomsmm.EnergyDecomposer(system, 'Reference')
+    reference = decomposer.compute(positions)["Total"]
+    box = [1.02*v for v in system.getDefaultPeriodicBoxVectors()]
+    scaled = decomposer.compute(positions, box)["Total"]
+    assert scaled/scaled.unit != pytest.approx(reference/reference.unit)
+    energy = decomposer.compute(positions)["Total"]
+    assert energy/energy.unit == pytest.approx(reference/reference.unit)
+    energy = atomsmm.splitPotentialEnergy(system, None, positions)["Total"]
+    assert energy/energy.unit == pytest.approx(reference/reference.unit)
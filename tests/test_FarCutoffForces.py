@@ -0,0 +1,87 @@
+from __future__ import print_function
+
+import math
+
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+rswitch_inner = 6.5*unit.angstroms
+rcut_inner = 7.0*unit.angstroms
+rswitch = 9.5*unit.angstroms
+rcut = 10*unit.angstroms
+case = 'tests/data/emim_BCN4_Jiung2014'
+
+
+def potentialEnergy(system, positions):
+    integrator = openmm.VerletIntegrator(0.0*unit.femtoseconds)
+    context = openmm.Context(system, integrator, openmm.Platform.getPlatformByName('Reference'))
+    context.setPositions(positions)
+    return context.getState(getEnergy=True).getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole)
+
+
+def readSystem():
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    return pdb, forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic, nonbondedCutoff=rcut)
+
+
+def splitEnergy(far, shifted):
+    pdb, system = readSystem()
+    near = atomsmm.NearNonbondedForce(rcut_inner, rswitch_inner, shifted).setForceGroup(1)
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        for force in [atomsmm.NonbondedExceptionsForce(), near, far(near).setForceGroup(2)]:
+            force.importFrom(nbforce).addTo(system)
+    return potentialEnergy(system, pdb.positions)
+
+
+def referenceEnergy(coulomb, **parameters):
+    pdb, system = readSystem()
+    energy = "(1 + step(r - rs)*u^3*(15*u - 6*u^2 - 10))*%s + %s;" % (atomsmm.utils.LennardJones("r"), coulomb)
+    energy += "u = (r - rs)/(rc - rs);" + atomsmm.utils.LorentzBerthelot()
+    full = atomsmm.forces._CustomNonbondedForce(energy, rcut, None, rs=rswitch, rc=rcut,
+                                                Kc=138.935456*unit.kilojoules/unit.nanometer, **parameters)
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        for force in [atomsmm.NonbondedExceptionsForce().forces[0], full]:
+            force.importFrom(nbforce)
+            system.addForce(force)
+    return potentialEnergy(system, pdb.positions)
+
+
+@pytest.mark.parametrize('shifted', [False, True])
+def test_reaction_field(shifted):
+    potential = splitEnergy(lambda near: atomsmm.FarReactionFieldForce(near, rcut, rswitch), shifted)
+    rc = rcut.value_in_unit(unit.nanometers)
+    krf = 77.3/(157.6*rc**3)
+    refpot = referenceEnergy("Kc*chargeprod*(1/r + krf*r^2 - crf)", krf=krf, crf=1/rc + krf*rc**2)
+    assert potential == pytest.approx(refpot)
+
+
+def test_reaction_field_openmm():
+    pdb, system = readSystem()
+    nbforce = system.getForce(atomsmm.findNonbondedForce(system))
+    nbforce.setUseSwitchingFunction(True)
+    nbforce.setSwitchingDistance(rswitch)
+    nbforce.setUseDispersionCorrection(False)
+    potential = splitEnergy(lambda near: atomsmm.FarReactionFieldForce(near, rcut, rswitch), True)
+    assert potential == pytest.approx(potentialEnergy(system, pdb.positions))
+
+
+@pytest.mark.parametrize('shifted,approximate', [(False, False), (True, False), (True, True)])
+def test_damped_shifted_force(shifted, approximate):
+    alpha = 0.2/unit.angstroms
+    potential = splitEnergy(lambda near: atomsmm.FarDampedShiftedForce(near, alpha, rcut, rswitch, approximate), shifted)
+    a = alpha.value_in_unit(unit.nanometers**(-1))
+    rc = rcut.value_in_unit(unit.nanometers)
+    F = math.erfc(a*rc)/rc**2 + 2*a*math.exp(-(a*rc)**2)/(math.sqrt(math.pi)*rc)
+    refpot = referenceEnergy("Kc*chargeprod*(erfc(a*r)/r - erfc(a*rc)/rc + F*(r - rc))", a=a, F=F)
+    assert potential == pytest.approx(refpot, rel=1E-5 if approximate else 1E-6)
+
+
+def test_switch_distance():
+    near = atomsmm.NearNonbondedForce(rcut_inner, rswitch_inner)
+    with pytest.raises(atomsmm.utils.InputError):
+        atomsmm.FarReactionFieldForce(near, rcut, 6*unit.angstroms)
@@ -0,0 +1,90 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+rswitchIn = 6.0*unit.angstroms
+rcutIn = 7.0*unit.angstroms
+rswitch = 9.0*unit.angstroms
+rcut = 10*unit.angstroms
+alpha = 0.29/unit.angstroms
+
+
+def readSystem(case):
+    pdb = app.PDBFile('tests/data/%s.pdb' % case)
+    forcefield = app.ForceField('tests/data/%s.xml' % case)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=rcut)
+    nbforce = system.getForce(atomsmm.findNonbondedForce(system))
+    return system, nbforce, pdb.positions
+
+
+def reference(system, nbforce, force, positions):
+    model = openmm.System()
+    for index in range(system.getNumParticles()):
+        model.addParticle(system.getParticleMass(index))
+    model.setDefaultPeriodicBoxVectors(*system.getDefaultPeriodicBoxVectors())
+    force.importFrom(nbforce).addTo(model)
+    platform = openmm.Platform.getPlatformByName('Reference')
+    context = openmm.Context(model, openmm.VerletIntegrator(0.0), platform)
+    context.setPositions(positions)
+    state = context.getState(getEnergy=True, getForces=True)
+    return state.getPotentialEnergy(), state.getForces(asNumpy=True)
+
+
+def check(case, force, tolerance):
+    system, nbforce, positions = readSystem(case)
+    evaluator = atomsmm.ForceEvaluator(force, nbforce, system.getDefaultPeriodicBoxVectors())
+    energy, forces = evaluator.compute(positions)
+    refEnergy, refForces = reference(system, nbforce, force, positions)
+    assert energy/refEnergy == pytest.approx(1.0, abs=tolerance)
+    error = np.max(np.abs(forces - refForces)/np.max(np.abs(refForces)))
+    assert error == pytest.approx(0.0, abs=tolerance)
+
+
+def test_NearNonbondedForce():
+    for case in ['q-SPC-FW', 'emim_BCN4_Jiung2014']:
+        check(case, atomsmm.NearNonbondedForce(rcutIn, rswitchIn), 1e-10)
+        check(case, atomsmm.NearNonbondedForce(rcutIn, rswitchIn, shifted=False), 1e-10)
+
+
+def test_DampedSmoothedForce():
+    for degree in [1, 2]:
+        check('q-SPC-FW', atomsmm.DampedSmoothedForce(alpha, rcut, rswitch, degree=degree), 1e-10)
+
+
+def test_FarNonbondedForce():
+    near = atomsmm.NearNonbondedForce(rcutIn, rswitchIn)
+    far = atomsmm.FarNonbondedForce(near, rcut, rswitch, nonbondedMethod=openmm.NonbondedForce.Ewald)
+    check('q-SPC-FW', far, 1e-4)
+
+
+def test_unsupported():
+    system, nbforce, positions = readSystem('q-SPC-FW')
+    near = atomsmm.NearNonbondedForce(rcutIn, rswitchIn)
+    far = atomsmm.FarNonbondedForce(near, rcut, rswitch, nonbondedMethod=openmm.NonbondedForce.CutoffPeriodic)
+    with pytest.raises(atomsmm.utils.InputError):
+        atomsmm.ForceEvaluator(far, nbforce, system.getDefaultPeriodicBoxVectors())
+    with pytest.raises(atomsmm.utils.InputError):
+        atomsmm.ForceEvaluator(atomsmm.NonbondedExceptionsForce(), nbforce, system.getDefaultPeriodicBoxVectors())
+
+
+def test_cell_pairs():
+    random = np.random.RandomState(1)
+    for (box, cutoff) in [(np.diag([2.0, 4.0, 4.5]), 0.9), (np.diag([2.0, 2.0, 2.0]), 0.9),
+                          (np.array([[3.0, 0, 0], [1.0, 3.0, 0], [-1.0, 1.0, 3.0]]), 0.8)]:
+        positions = random.random_sample((300, 3)).dot(box)
+        delta = positions[None, :, :] - positions[:, None, :]
+        for k in [2, 1, 0]:
+            delta -= np.round(delta[:, :, k]/box[k][k])[:, :, None]*box[k]
+        i, j = np.nonzero(np.triu(np.sum(delta**2, axis=2) < cutoff**2, 1))
+        expected = set(zip(i, j))
+        for chunkSize in [2**20, 1000]:
+            chunks = list(atomsmm.analysis._cellPairs(positions, box, cutoff, chunkSize))
+            found = [(a, b) for (i, j, delta) in chunks for (a, b) in zip(i, j)]
+            assert len(found) == len(expected) and set(found) == expected
+        assert len(chunks) > 1
@@ -0,0 +1,75 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+
+def test_exchange(tmpdir):
+    pdb = app.PDBFile('tests/data/q-SPC-FW.pdb')
+    forcefield = app.ForceField('tests/data/q-SPC-FW.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                     nonbondedCutoff=0.9*unit.nanometers, constraints=app.HBonds)
+    dof = atomsmm.countDegreesOfFreedom(system)
+    temperatures = [300*unit.kelvin, 301*unit.kelvin, 302*unit.kelvin]
+    propagators = list()
+    for T in temperatures:
+        thermostat = atomsmm.NoseHooverLangevinPropagator(T, dof, 0.1*unit.picoseconds, 10/unit.picoseconds)
+        propagators.append(atomsmm.TrotterSuzukiPropagator(atomsmm.VelocityVerletPropagator(), thermostat))
+    assert propagators[0].persistent == ['p_NHL']
+    checkpoint = str(tmpdir.join('checkpoint.chk'))
+    with atomsmm.ReplicaExchange(system, pdb.positions, temperatures, propagators, 1*unit.femtoseconds,
+                                 processes=2, seed=1) as simulation:
+        simulation.run(2, 5)
+        assert simulation.cycle == 2
+        assert list(simulation.attempts) == [1, 1]
+        assert sorted(simulation.replicas) == [0, 1, 2]
+        assert all(np.isfinite(simulation.potentialEnergies()/unit.kilojoules_per_mole))
+        simulation.saveCheckpoint(checkpoint)
+        saved = [simulation.positions(state)/unit.nanometers for state in range(3)]
+        replicas = np.array(simulation.replicas)
+        simulation.run(1, 5)
+        simulation.loadCheckpoint(checkpoint)
+        assert simulation.cycle == 2
+        assert np.array_equal(simulation.replicas, replicas)
+        for state in range(3):
+            assert simulation.positions(state)/unit.nanometers == pytest.approx(saved[state])
+
+
+def test_platform_object():
+    pdb = app.PDBFile('tests/data/q-SPC-FW.pdb')
+    forcefield = app.ForceField('tests/data/q-SPC-FW.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                     nonbondedCutoff=0.9*unit.nanometers, constraints=app.HBonds)
+    temperatures = [300*unit.kelvin, 310*unit.kelvin]
+    propagators = [atomsmm.VelocityVerletPropagator() for T in temperatures]
+    platform = openmm.Platform.getPlatformByName('CPU')
+    with atomsmm.ReplicaExchange(system, pdb.positions, temperatures, propagators, 1*unit.femtoseconds,
+                                 platform=platform, processes=2, seed=1) as simulation:
+        simulation.run(1, 2)
+        assert all(np.isfinite(simulation.potentialEnergies()/unit.kilojoules_per_mole))
+
+
+def test_worker_failure():
+    pdb = app.PDBFile('tests/data/q-SPC-FW.pdb')
+    forcefield = app.ForceField('tests/data/q-SPC-FW.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                     nonbondedCutoff=0.9*unit.nanometers)
+    temperatures = [300*unit.kelvin, 310*unit.kelvin]
+    propagators = [atomsmm.VelocityVerletPropagator() for T in temperatures]
+    with pytest.raises(RuntimeError) as error:
+        atomsmm.ReplicaExchange(system, pdb.positions, temperatures, propagators, 1*unit.femtoseconds,
+                                properties={'Bogus': '1'}, processes=2, seed=1)
+    assert 'Illegal property name' in str(error.value)
+    simulation = atomsmm.ReplicaExchange(system, pdb.positions, temperatures, propagators, 100*unit.femtoseconds,
+                                         processes=2, seed=1)
+    with pytest.raises(RuntimeError) as error:
+        simulation.run(1, 100)
+    assert 'NaN' in str(error.value)
+    with pytest.raises(RuntimeError):
+        simulation.run(1, 1)
+    simulation.close()
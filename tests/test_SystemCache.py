@@ -0,0 +1,65 @@
+from __future__ import print_function
+
+import os
+
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+calls = list()
+
+
+def build(pdbfile, xmlfile, near):
+    calls.append(pdbfile)
+    pdb = app.PDBFile(pdbfile)
+    forcefield = app.ForceField(xmlfile)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, constraints=app.HBonds)
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        near.importFrom(nbforce).addTo(system)
+    return system
+
+
+def test_cache(tmpdir):
+    cache = atomsmm.SystemCache(str(tmpdir), maxSize=2**30)
+    inputs = ['tests/data/q-SPC-FW.pdb', 'tests/data/q-SPC-FW.xml']
+    near = atomsmm.NearNonbondedForce(7*unit.angstroms, 6*unit.angstroms)
+    other = atomsmm.NearNonbondedForce(8*unit.angstroms, 6*unit.angstroms)
+    keys = [cache.key(*(inputs + [force])) for force in [near, other]]
+    assert keys[0] != keys[1]
+    first = cache.system(build, *(inputs + [near]))
+    second = cache.system(build, *(inputs + [atomsmm.NearNonbondedForce(7*unit.angstroms, 6*unit.angstroms)]))
+    assert len(calls) == 1
+    assert openmm.XmlSerializer.serialize(first) == openmm.XmlSerializer.serialize(second)
+    third = cache.system(build, *(inputs + [other]))
+    assert len(calls) == 2
+    assert third.getNumForces() == first.getNumForces()
+
+    os.utime(os.path.join(str(tmpdir), keys[1] + '.xml'), (0, 0))
+    cache.maxSize = os.path.getsize(os.path.join(str(tmpdir), keys[0] + '.xml'))
+    cache.evict()
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+
+
+def test_corrupt_entry(tmpdir):
+    cache = atomsmm.SystemCache(str(tmpdir.join('cache')))
+    atomsmm.SystemCache(str(tmpdir.join('cache')))
+
+    def inputs():
+        return ['tests/data/q-SPC-FW.pdb', 'tests/data/q-SPC-FW.xml',
+                atomsmm.NearNonbondedForce(7*unit.angstroms, 6*unit.angstroms)]
+
+    key = cache.key(*inputs())
+    system = cache.system(build, *inputs())
+    file = os.path.join(cache.directory, key + '.xml')
+    for content in ['', openmm.XmlSerializer.serialize(system)[:1000]]:
+        with open(file, 'w') as f:
+            f.write(content)
+        assert cache.get(key) is None
+        count = len(calls)
+        rebuilt = cache.system(build, *inputs())
+        assert len(calls) == count + 1
+        assert rebuilt.getNumParticles() == system.getNumParticles()
+        assert cache.get(key) is not None
@@ -1,5 +1,14 @@
+import subprocess
+import sys
+
 import atomsmm
 
 
 def test_main():
     assert atomsmm
+
+
+def test_lazy_openmmtools():
+    code = "import sys, atomsmm; print('openmmtools' in sys.modules)"
+    assert subprocess.check_output([sys.executable, '-c', code]).decode().strip() == 'False'
+    assert all(hasattr(atomsmm, name) for name in atomsmm.__all__)
@@ -0,0 +1,86 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+
+def readSystem(case):
+    pdb = app.PDBFile('tests/data/%s.pdb' % case)
+    forcefield = app.ForceField('tests/data/%s.xml' % case)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                     nonbondedCutoff=1.0*unit.nanometers, constraints=app.HBonds)
+    forces = [atomsmm.DampedSmoothedForce(0.29/unit.angstroms, 9*unit.angstroms, 8*unit.angstroms),
+              atomsmm.NonbondedExceptionsForce()]
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        for force in forces:
+            force.importFrom(nbforce).addTo(system)
+    return system, pdb.topology, pdb.positions
+
+
+def createContext(system, integrator, positions):
+    platform = openmm.Platform.getPlatformByName('Reference')
+    context = openmm.Context(system, integrator, platform)
+    context.setPositions(positions)
+    return context
+
+
+def test_independent_replicas():
+    system, topology, positions = readSystem('q-SPC-FW')
+    batch, batchTopology, batchPositions = atomsmm.batchReplicas(system, topology, positions, 3)
+    N = system.getNumParticles()
+    assert batch.getNumParticles() == batchTopology.getNumAtoms() == len(batchPositions) == 3*N
+    assert not any(isinstance(force, openmm.CMMotionRemover) for force in batch.getForces())
+    for index in reversed(range(system.getNumForces())):
+        if isinstance(system.getForce(index), openmm.CMMotionRemover):
+            system.removeForce(index)
+    single = createContext(system, atomsmm.VelocityVerletPropagator().integrator(), positions)
+    single.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    velocities = single.getState(getVelocities=True).getVelocities(asNumpy=True)
+    replicas = createContext(batch, atomsmm.VelocityVerletPropagator().integrator(), batchPositions)
+    replicas.setVelocities(np.tile(velocities, (3, 1)))
+    E = [context.getState(getEnergy=True).getPotentialEnergy() for context in [single, replicas]]
+    assert E[1]/E[1].unit == pytest.approx(3*E[0]/E[0].unit)
+    single.getIntegrator().step(5)
+    replicas.getIntegrator().step(5)
+    x = single.getState(getPositions=True).getPositions(asNumpy=True)
+    y = replicas.getState(getPositions=True).getPositions(asNumpy=True)
+    for k in range(3):
+        assert y[k*N:(k+1)*N]/unit.nanometers == pytest.approx(x/unit.nanometers)
+
+
+def test_replica_thermostats():
+    system, topology, positions = readSystem('q-SPC-FW')
+    batch, batchTopology, batchPositions = atomsmm.batchReplicas(system, topology, positions, 2)
+    dof = atomsmm.countDegreesOfFreedom(system) + 3
+    NVE = atomsmm.VelocityVerletPropagator()
+    for thermostat in [atomsmm.VelocityRescalingPropagator(300*unit.kelvin, dof, 0.1*unit.picoseconds, 2),
+                       atomsmm.NoseHooverLangevinPropagator(300*unit.kelvin, dof, 0.1*unit.picoseconds,
+                                                            10/unit.picoseconds, 2)]:
+        integrator = atomsmm.TrotterSuzukiPropagator(NVE, thermostat).integrator(1*unit.femtoseconds)
+        integrator.setRandomNumberSeed(1)
+        context = createContext(batch, integrator, batchPositions)
+        context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+        atomsmm.assignReplicas(context, 2)
+        integrator.step(5)
+        TwoK = [integrator.getGlobalVariableByName('TwoK_%d' % k) for k in range(2)]
+        velocities = context.getState(getVelocities=True).getVelocities(asNumpy=True)
+        masses = np.array([batch.getParticleMass(i)/unit.dalton for i in range(batch.getNumParticles())])
+        v2 = (velocities*velocities).sum(axis=1)/(unit.nanometers/unit.picoseconds)**2
+        N = system.getNumParticles()
+        assert TwoK[0] != pytest.approx(TwoK[1])
+        for k in range(2):
+            assert np.isfinite(TwoK[k]) and TwoK[k] > 0
+            assert (masses*v2)[k*N:(k+1)*N].sum() == pytest.approx(TwoK[k], rel=0.1)
+
+
+def test_nonbonded_force():
+    pdb = app.PDBFile('tests/data/q-SPC-FW.pdb')
+    forcefield = app.ForceField('tests/data/q-SPC-FW.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME)
+    with pytest.raises(atomsmm.utils.InputError):
+        atomsmm.batchReplicas(system, pdb.topology, pdb.positions, 2)
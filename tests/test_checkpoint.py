@@ -0,0 +1,61 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+
+def createContext(system, propagator, positions, platform):
+    integrator = propagator.integrator(1*unit.femtoseconds)
+    integrator.setRandomNumberSeed(1)
+    context = openmm.Context(system, integrator, openmm.Platform.getPlatformByName(platform))
+    context.setPositions(positions)
+    context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    return context
+
+
+def test_checkpoint(tmpdir):
+    pdb = app.PDBFile('tests/data/q-SPC-FW.pdb')
+    forcefield = app.ForceField('tests/data/q-SPC-FW.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                     nonbondedCutoff=0.9*unit.nanometers, constraints=app.HBonds)
+    dof = atomsmm.countDegreesOfFreedom(system)
+    thermostat = atomsmm.NoseHooverLangevinPropagator(300*unit.kelvin, dof, 0.1*unit.picoseconds, 10/unit.picoseconds)
+    propagator = atomsmm.TrotterSuzukiPropagator(atomsmm.VelocityVerletPropagator(), thermostat)
+    file = str(tmpdir.join('checkpoint.npz'))
+    context = createContext(system, propagator, pdb.positions, 'Reference')
+    context.getIntegrator().step(5)
+    atomsmm.saveCheckpoint(context, file)
+    state = context.getState(getPositions=True, getVelocities=True)
+    integrator = context.getIntegrator()
+    p_NHL = integrator.getGlobalVariableByName('p_NHL')
+    x0 = np.array(integrator.getPerDofVariableByName('x0'))
+    assert p_NHL != 0.0
+
+    restored = createContext(system, propagator, pdb.positions, 'CPU')
+    atomsmm.loadCheckpoint(restored, file)
+    other = restored.getState(getPositions=True, getVelocities=True)
+    assert restored.getStepCount() == 5
+    assert other.getTime()/unit.picoseconds == pytest.approx(state.getTime()/unit.picoseconds)
+    for (a, b) in [(state.getPositions(asNumpy=True), other.getPositions(asNumpy=True)),
+                   (state.getVelocities(asNumpy=True), other.getVelocities(asNumpy=True))]:
+        assert b._value == pytest.approx(a._value)
+    assert restored.getIntegrator().getGlobalVariableByName('p_NHL') == p_NHL
+    assert np.array(restored.getIntegrator().getPerDofVariableByName('x0')) == pytest.approx(x0)
+
+    other = str(tmpdir.join('state.chk'))
+    atomsmm.saveCheckpoint(context, other)
+    assert tmpdir.join('state.chk').check() and not tmpdir.join('state.chk.npz').check()
+    atomsmm.loadCheckpoint(restored, other)
+    assert restored.getIntegrator().getGlobalVariableByName('p_NHL') == p_NHL
+
+    atomsmm.saveCheckpoint(context, file, propagator.persistent)
+    with pytest.raises(atomsmm.utils.InputError):
+        atomsmm.saveCheckpoint(context, file, ['nonexistent'])
+    verlet = openmm.Context(system, openmm.VerletIntegrator(1*unit.femtoseconds), openmm.Platform.getPlatformByName('CPU'))
+    with pytest.raises(atomsmm.utils.InputError):
+        atomsmm.loadCheckpoint(verlet, file)
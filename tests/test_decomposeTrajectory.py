@@ -0,0 +1,67 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+
+def readSystem(case):
+    pdb = app.PDBFile('tests/data/%s.pdb' % case)
+    forcefield = app.ForceField('tests/data/%s.xml' % case)
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    return system, pdb.positions, pdb.topology
+
+
+def frames(positions, count):
+    x0 = np.array(positions.value_in_unit(unit.nanometers))
+    random = np.random.RandomState(1)
+    return [x0 + 0.002*random.randn(*x0.shape) for i in range(count)]
+
+
+def check(system, table, trajectory):
+    decomposer = atomsmm.EnergyDecomposer(system, 'Reference')
+    for (index, positions) in enumerate(trajectory):
+        energy = decomposer.compute(positions)
+        for term in energy:
+            value = energy[term].value_in_unit(unit.kilojoules_per_mole)
+            assert table[term][index] == pytest.approx(value, rel=1e-5)
+
+
+def test_dcd(tmpdir):
+    system, positions, topology = readSystem('q-SPC-FW')
+    trajectory = frames(positions, 5)
+    file = str(tmpdir.join('trajectory.dcd'))
+    with open(file, 'wb') as f:
+        dcd = app.DCDFile(f, topology, 1*unit.femtoseconds)
+        for x in trajectory:
+            dcd.writeModel(x*unit.nanometers)
+    reader = atomsmm.DCDReader(file)
+    assert reader.numFrames == 5 and reader.numAtoms == system.getNumParticles()
+    trajectory = reader.positions(0, 5)
+    table = atomsmm.decomposeTrajectory(system, file, platform='Reference', processes=2, chunkSize=2)
+    assert len(table["Total"]) == 5
+    check(system, table, trajectory)
+
+
+def test_npy(tmpdir):
+    system, positions, topology = readSystem('q-SPC-FW')
+    trajectory = np.array(frames(positions, 3))
+    file = str(tmpdir.join('trajectory.npy'))
+    np.save(file, trajectory)
+    output = str(tmpdir.join('energies.npz'))
+    atomsmm.decomposeTrajectory(system, file, output, platform='Reference', processes=1)
+    check(system, np.load(output), trajectory)
+
+
+def test_platform_object(tmpdir):
+    system, positions, topology = readSystem('q-SPC-FW')
+    trajectory = np.array(frames(positions, 4))
+    file = str(tmpdir.join('trajectory.npy'))
+    np.save(file, trajectory)
+    platform = openmm.Platform.getPlatformByName('CPU')
+    table = atomsmm.decomposeTrajectory(system, file, platform=platform, processes=2, chunkSize=2)
+    check(system, table, trajectory)
@@ -0,0 +1,55 @@
+from __future__ import print_function
+
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+
+def potentialEnergy(detach):
+    rcut = 10*unit.angstroms
+    rswitch = 9.5*unit.angstroms
+    case = 'tests/data/emim_BCN4_Jiung2014'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    numForces = system.getNumForces()
+    forces = [atomsmm.NonbondedExceptionsForce(), atomsmm.NearNonbondedForce(rcut, rswitch)]
+    index = atomsmm.findNonbondedForce(system)
+    if detach:
+        with atomsmm.detachForce(system, index) as nbforce:
+            for force in forces:
+                force.importFrom(nbforce).addTo(system)
+    else:
+        nbforce = atomsmm.hijackForce(system, index)
+        for force in forces:
+            force.importFrom(nbforce).addTo(system)
+    assert system.getNumForces() == numForces + 1
+    integrator = openmm.VerletIntegrator(0.0*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('Reference')
+    simulation = app.Simulation(pdb.topology, system, integrator, platform)
+    simulation.context.setPositions(pdb.positions)
+    state = simulation.context.getState(getEnergy=True)
+    return state.getPotentialEnergy()
+
+
+def test_detach():
+    potential = potentialEnergy(True)
+    reference = potentialEnergy(False)
+    assert potential/potential.unit == pytest.approx(reference/reference.unit)
+
+
+def test_detach_errors():
+    system = openmm.System()
+    for force in [openmm.NonbondedForce(), openmm.HarmonicBondForce()]:
+        system.addForce(force)
+    with pytest.raises(ZeroDivisionError):
+        with atomsmm.detachForce(system, 0):
+            system.removeForce(1)
+            1/0
+    assert system.getNumForces() == 1
+    with pytest.raises(atomsmm.utils.InputError):
+        with atomsmm.detachForce(system, 0):
+            system.removeForce(0)
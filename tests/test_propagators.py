@@ -96,3 +96,78 @@ def test_TrotterSuzuki():
     integrator = combined.integrator(1*unit.femtoseconds)
     integrator.setRandomNumberSeed(1)
     execute(integrator, -13064.351037463852)
+
+
+def test_persistent_variables():
+    NVE = atomsmm.VelocityVerletPropagator()
+    thermostat = atomsmm.NoseHooverLangevinPropagator(300*unit.kelvin, 100, 0.1*unit.picoseconds, 10/unit.picoseconds)
+    assert atomsmm.ChainedPropagator(NVE, thermostat).persistent == ['p_NHL']
+    combined = atomsmm.TrotterSuzukiPropagator(NVE, thermostat)
+    assert combined.persistent == ['p_NHL']
+    assert atomsmm.ChainedPropagator(combined, atomsmm.ChainedPropagator(NVE, thermostat)).persistent == ['p_NHL']
+    assert atomsmm.TrotterSuzukiPropagator(NVE, NVE).persistent == []
+
+
+def test_GuardedPropagator():
+    pdb = app.PDBFile('tests/data/q-SPC-FW.pdb')
+    forcefield = app.ForceField('tests/data/q-SPC-FW.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    dof = atomsmm.countDegreesOfFreedom(system)
+    temperatures = (100*unit.kelvin, 500*unit.kelvin)
+    guarded = atomsmm.GuardedPropagator(atomsmm.VelocityVerletPropagator(), temperatureRange=temperatures,
+                                        degreesOfFreedom=dof)
+    integrator = guarded.integrator(0.5*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('Reference')
+    context = openmm.Context(system, integrator, platform)
+    context.setPositions(pdb.positions)
+    context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    integrator.step(2)
+    assert integrator.getGlobalVariableByName('guardedSteps') == 2
+    with pytest.raises(atomsmm.BlowUpError):
+        integrator.step(50)
+    guardedSteps = integrator.getGlobalVariableByName('guardedSteps')
+    assert 2 < guardedSteps < 52
+    positions = context.getState(getPositions=True).getPositions(asNumpy=True)
+    with pytest.raises(atomsmm.BlowUpError):
+        integrator.step(5)
+    assert integrator.getGlobalVariableByName('guardedSteps') == guardedSteps
+    assert (context.getState(getPositions=True).getPositions(asNumpy=True) == positions).all()
+    integrator.setGlobalVariableByName('blowup', 0)
+    context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    integrator.step(1)
+    assert integrator.getGlobalVariableByName('guardedSteps') == guardedSteps + 1
+    with pytest.raises(atomsmm.utils.InputError):
+        atomsmm.GuardedPropagator(atomsmm.VelocityVerletPropagator(), temperatureRange=temperatures)
+
+
+def test_GuardedPropagator_huge_velocity():
+    system = openmm.System()
+    for i in range(3):
+        system.addParticle(1.0)
+    integrator = atomsmm.GuardedPropagator(atomsmm.VelocityVerletPropagator()).integrator(0.5*unit.femtoseconds)
+    assert integrator._guarded and not atomsmm.VelocityVerletPropagator().integrator()._guarded
+    context = openmm.Context(system, integrator, openmm.Platform.getPlatformByName('Reference'))
+    context.setPositions([openmm.Vec3(i, 0, 0) for i in range(3)])
+    context.setVelocities([openmm.Vec3(1e16, 0, 0), openmm.Vec3(0, 0, 0), openmm.Vec3(0, 0, 0)])
+    with pytest.raises(atomsmm.BlowUpError):
+        integrator.step(1)
+    assert integrator.getGlobalVariableByName('guardedSteps') == 0
+
+
+def test_RespaLoops():
+    pdb = app.PDBFile('tests/data/q-SPC-FW.pdb')
+    forcefield = app.ForceField('tests/data/q-SPC-FW.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    for (group, force) in enumerate(system.getForces()):
+        force.setForceGroup(min(group, 2))
+    positions = dict()
+    for unrolled in [True, False]:
+        integrator = atomsmm.RespaPropagator([3, 2, 2], unrolled=unrolled).integrator(2*unit.femtoseconds)
+        context = openmm.Context(system, integrator, openmm.Platform.getPlatformByName('Reference'))
+        context.setPositions(pdb.positions)
+        context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+        integrator.step(3)
+        positions[unrolled] = context.getState(getPositions=True).getPositions(asNumpy=True)
+        if not unrolled:
+            assert integrator.getNumComputations() < 30
+    assert (positions[True] == positions[False]).all()
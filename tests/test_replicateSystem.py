@@ -0,0 +1,58 @@
+from __future__ import print_function
+
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+
+def potentialEnergy(system, positions):
+    integrator = openmm.VerletIntegrator(0.0*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('Reference')
+    context = openmm.Context(system, integrator, platform)
+    context.setPositions(positions)
+    energy = context.getState(getEnergy=True).getPotentialEnergy()
+    return energy.value_in_unit(unit.kilojoules_per_mole)
+
+
+def test_supercell():
+    case = 'tests/data/emim_BCN4_Jiung2014'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                     nonbondedCutoff=1.0*unit.nanometers, constraints=app.HBonds)
+    near = atomsmm.NearNonbondedForce(0.7*unit.nanometers, 0.6*unit.nanometers).setForceGroup(1)
+    exceptions = atomsmm.NonbondedExceptionsForce()
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        for force in [near, exceptions]:
+            force.importFrom(nbforce).addTo(system)
+    supercell, topology, positions = atomsmm.replicateSystem(system, pdb.topology, pdb.positions, (2, 1, 1))
+    N = system.getNumParticles()
+    assert supercell.getNumParticles() == topology.getNumAtoms() == len(positions) == 2*N
+    assert supercell.getNumConstraints() == 2*system.getNumConstraints()
+    assert topology.getNumBonds() == 2*pdb.topology.getNumBonds()
+    E = potentialEnergy(supercell, positions)
+    assert E == pytest.approx(2*potentialEnergy(system, pdb.positions))
+
+
+def test_supercell_3d():
+    case = 'tests/data/q-SPC-FW'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                     nonbondedCutoff=0.9*unit.nanometers)
+    # The dispersion correction counts same-class pairs as n(n+1)/2, which does not scale linearly
+    system.getForce(atomsmm.findNonbondedForce(system)).setUseDispersionCorrection(False)
+    bonds = list(pdb.topology.bonds())
+    pdb.topology._bonds = [app.topology.Bond(bond[0], bond[1], app.Single, 1) for bond in bonds]
+    supercell, topology, positions = atomsmm.replicateSystem(system, pdb.topology, pdb.positions, (2, 2, 2))
+    N = system.getNumParticles()
+    assert supercell.getNumParticles() == topology.getNumAtoms() == len(positions) == 8*N
+    assert [(bond.type, bond.order) for bond in topology.bonds()] == 8*len(bonds)*[(app.Single, 1)]
+    box = [vector.value_in_unit(unit.nanometers) for vector in supercell.getDefaultPeriodicBoxVectors()]
+    original = [vector.value_in_unit(unit.nanometers) for vector in system.getDefaultPeriodicBoxVectors()]
+    assert [box[i][i] for i in range(3)] == pytest.approx([2*original[i][i] for i in range(3)])
+    E = potentialEnergy(supercell, positions)
+    assert E == pytest.approx(8*potentialEnergy(system, pdb.positions))
@@ -0,0 +1,223 @@
+from __future__ import print_function
+
+import io
+
+import numpy as np
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+import atomsmm.reporters
+
+
+def simulate(reporter, nsteps=20):
+    case = 'tests/data/q-SPC-FW'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    integrator = openmm.VerletIntegrator(1.0*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('Reference')
+    simulation = app.Simulation(pdb.topology, system, integrator, platform)
+    simulation.context.setPositions(pdb.positions)
+    simulation.context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    simulation.reporters.append(reporter)
+    simulation.step(nsteps)
+    return simulation
+
+
+def test_bufferedShortName():
+    kwargs = dict(step=True, potentialEnergy=True, temperature=True, separator=',')
+    plain = io.StringIO()
+    simulate(atomsmm.reporters.shortName(plain, 5, **kwargs))
+    buffered = io.StringIO()
+    with atomsmm.reporters.bufferedShortName(buffered, 5, flushSize=3, **kwargs) as reporter:
+        simulate(reporter)
+    lines = buffered.getvalue().splitlines()
+    assert lines[0] == 'Step,PE,T'
+    assert lines == plain.getvalue().splitlines()
+
+
+def test_binaryReporter(tmpdir):
+    file = str(tmpdir.join('report.bin'))
+    text = io.StringIO()
+    kwargs = dict(step=True, potentialEnergy=True, temperature=True)
+    reporter = atomsmm.reporters.binaryReporter(file, 2, capacity=3, **kwargs)
+    simulate(atomsmm.reporters.shortName(text, 2, separator=',', **kwargs))
+    simulate(reporter)
+    reporter.close()
+    data = atomsmm.reporters.loadBinaryReport(file)
+    lines = text.getvalue().splitlines()
+    assert set(data.keys()) == set(lines[0].split(','))
+    assert len(data['Step']) == len(lines) - 1 == 10
+    for (index, line) in enumerate(lines[1:]):
+        step, PE, T = map(float, line.split(','))
+        assert data['Step'][index] == step
+        assert data['PE'][index] == pytest.approx(PE)
+        assert data['T'][index] == pytest.approx(T)
+
+
+def test_multiplexedReporter():
+    kwargs = dict(step=True, potentialEnergy=True, kineticEnergy=True, temperature=True)
+    outputs = [io.StringIO() for i in range(4)]
+    simulate(app.StateDataReporter(outputs[0], 5, **kwargs))
+    simulate(atomsmm.reporters.shortName(outputs[1], 2, separator=',', **kwargs))
+    children = [app.StateDataReporter(outputs[2], 5, **kwargs),
+                atomsmm.reporters.shortName(outputs[3], 2, separator=',', **kwargs)]
+    simulate(atomsmm.reporters.multiplexedReporter(children))
+    assert outputs[2].getvalue() == outputs[0].getvalue()
+    assert outputs[3].getvalue() == outputs[1].getvalue()
+
+
+class wrappingRecorder(object):
+    def __init__(self, reportInterval, periodic):
+        self._reportInterval = reportInterval
+        self._periodic = periodic
+        self.frames = []
+
+    def describeNextReport(self, simulation):
+        steps = self._reportInterval - simulation.currentStep % self._reportInterval
+        return (steps, True, False, False, False, self._periodic)
+
+    def report(self, simulation, state):
+        self.frames.append(state.getPositions(asNumpy=True).value_in_unit(unit.nanometers))
+
+
+def test_multiplexedReporter_periodic():
+    case = 'tests/data/q-SPC-FW'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    integrator = openmm.VerletIntegrator(1.0*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('Reference')
+    simulation = app.Simulation(pdb.topology, system, integrator, platform)
+    offset = openmm.Vec3(1.3, 0, 0)*unit.nanometers
+    simulation.context.setPositions([position + offset for position in pdb.positions])
+    children = [wrappingRecorder(2, True), wrappingRecorder(2, False), wrappingRecorder(2, False)]
+    simulation.reporters.append(atomsmm.reporters.multiplexedReporter(children))
+    simulation.step(2)
+    for periodic in [True, False]:
+        state = simulation.context.getState(getPositions=True, enforcePeriodicBox=periodic)
+        positions = state.getPositions(asNumpy=True).value_in_unit(unit.nanometers)
+        for child in children:
+            if child._periodic == periodic:
+                assert len(child.frames) == 1
+                assert np.array_equal(child.frames[0], positions)
+    assert not np.array_equal(children[0].frames[0], children[1].frames[0])
+
+
+def readWater():
+    case = 'tests/data/q-SPC-FW'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    return pdb, forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+
+
+def thermostatSimulation(integrator):
+    pdb, system = readWater()
+    integrator.setRandomNumberSeed(1)
+    platform = openmm.Platform.getPlatformByName('Reference')
+    simulation = app.Simulation(pdb.topology, system, integrator, platform)
+    simulation.context.setPositions(pdb.positions)
+    simulation.context.setVelocitiesToTemperature(300*unit.kelvin, 1)
+    return simulation
+
+
+def test_thermostatReporter():
+    dof = atomsmm.countDegreesOfFreedom(readWater()[1])
+    NVE = atomsmm.VelocityVerletPropagator()
+    thermostat = atomsmm.NoseHooverLangevinPropagator(300*unit.kelvin, dof, 10*unit.femtoseconds,
+                                                      0.1/unit.femtoseconds)
+    integrator = atomsmm.GlobalThermostatIntegrator(1*unit.femtoseconds, NVE, thermostat, 1)
+    simulation = thermostatSimulation(integrator)
+    output = io.StringIO()
+    simulation.reporters.append(atomsmm.reporters.thermostatReporter(output, 2, thermostat, 4))
+    simulation.step(8)
+    lines = output.getvalue().splitlines()
+    assert lines[0].split('\t') == ['Step', 'T', 'KE', 'p_NHL', 'TE', 'PE']
+    rows = [list(map(float, line.split('\t'))) for line in lines[1:]]
+    assert [row[0] for row in rows] == [2, 4, 6, 8]
+    assert all(row[5] != row[5] for row in rows[0::2])
+    state = simulation.context.getState(getEnergy=True)
+    PE = state.getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole)
+    KE = state.getKineticEnergy().value_in_unit(unit.kilojoules_per_mole)
+    assert rows[-1][5] == pytest.approx(PE)
+    assert rows[-1][2] == pytest.approx(KE)
+    assert rows[-1][4] == pytest.approx(0.5*rows[-1][3]**2/thermostat.inertia())
+
+
+def test_thermostatReporter_heat():
+    dof = atomsmm.countDegreesOfFreedom(readWater()[1])
+    thermostats = [atomsmm.NoseHooverLangevinPropagator(300*unit.kelvin, dof, 10*unit.femtoseconds,
+                                                        0.1/unit.femtoseconds, trackHeat=True),
+                   atomsmm.VelocityRescalingPropagator(300*unit.kelvin, dof, 10*unit.femtoseconds, trackHeat=True)]
+    for thermostat in thermostats:
+        propagator = atomsmm.TrotterSuzukiPropagator(atomsmm.VelocityVerletPropagator(), thermostat)
+        simulation = thermostatSimulation(propagator.integrator(0.5*unit.femtoseconds))
+        output = io.StringIO()
+        simulation.reporters.append(atomsmm.reporters.thermostatReporter(output, 5, propagator, 5))
+        simulation.step(100)
+        lines = output.getvalue().splitlines()
+        headers = lines[0].split('\t')
+        assert headers[-2:] == ['heat', 'Hcons']
+        assert ('p_NHL' in headers) == hasattr(thermostat, 'inertia')
+        columns = dict(zip(headers, np.array([list(map(float, line.split('\t'))) for line in lines[1:]]).T))
+        assert np.std(columns['Hcons']) < 0.05*np.std(columns['heat'])
+
+
+def test_forceGroupReporter():
+    case = 'tests/data/q-SPC-FW'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    for (index, force) in enumerate(system.getForces()):
+        force.setForceGroup(index)
+    integrator = openmm.VerletIntegrator(1.0*unit.femtoseconds)
+    platform = openmm.Platform.getPlatformByName('Reference')
+    simulation = app.Simulation(pdb.topology, system, integrator, platform)
+    simulation.context.setPositions(pdb.positions)
+    output = io.StringIO()
+    groups = [0, set(range(1, system.getNumForces()))]
+    simulation.reporters.append(atomsmm.reporters.forceGroupReporter(output, 3, groups, ['A', 'B']))
+    simulation.step(3)
+    lines = output.getvalue().splitlines()
+    assert lines[0] == 'Step\tA\tB'
+    step, A, B = map(float, lines[1].split('\t'))
+    state = simulation.context.getState(getEnergy=True)
+    PE = state.getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole)
+    assert step == 3
+    assert A + B == pytest.approx(PE)
+
+
+class positionRecorder(object):
+    def __init__(self, reportInterval):
+        self._reportInterval = reportInterval
+        self.frames = []
+
+    def describeNextReport(self, simulation):
+        steps = self._reportInterval - simulation.currentStep % self._reportInterval
+        return (steps, True, False, False, False, None)
+
+    def report(self, simulation, state):
+        self.frames.append(state.getPositions(asNumpy=True).value_in_unit(unit.nanometers))
+
+
+def test_compressedTrajectoryReporter(tmpdir):
+    recorder = positionRecorder(4)
+    simulate(atomsmm.reporters.multiplexedReporter([recorder]))
+    for subset in [None, [9, 0, 3, 3]]:
+        file = str(tmpdir.join('trajectory.bin'))
+        with atomsmm.reporters.compressedTrajectoryReporter(file, 4, atomSubset=subset, precision=500) as reporter:
+            simulate(reporter)
+        data = atomsmm.reporters.loadCompressedTrajectory(file)
+        atoms = np.arange(len(recorder.frames[0])) if subset is None else np.array([0, 3, 9])
+        assert np.array_equal(data['atoms'], atoms)
+        assert list(data['Step']) == [4, 8, 12, 16, 20]
+        assert data['t'] == pytest.approx(0.001*data['Step'])
+        assert data['box'][0] == pytest.approx(2.5*np.eye(3))
+        assert data['positions'].shape == (5, len(atoms), 3)
+        for (frame, positions) in zip(data['positions'], recorder.frames):
+            assert np.max(np.abs(frame - positions[atoms])) <= 0.5/500 + 1e-9
+    with pytest.raises(RuntimeError):
+        reporter.report(None, None)
@@ -0,0 +1,169 @@
+from __future__ import print_function
+
+import json
+import os
+
+import numpy as np
+import pytest
+from simtk import openmm
+from simtk import unit
+from simtk.openmm import app
+
+import atomsmm
+
+
+def test_ForceGroupProfile():
+    case = 'tests/data/q-SPC-FW'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    near = atomsmm.NearNonbondedForce(0.7*unit.nanometers, 0.6*unit.nanometers).setForceGroup(1)
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        near.importFrom(nbforce).addTo(system)
+    profile = atomsmm.ForceGroupProfile(system, pdb.positions, 'Reference', repeats=3, warmup=1)
+    assert sorted(profile.timings.keys()) == [0, 1]
+    assert 'CustomNonbondedForce' in profile.labels[1]
+    assert profile.evaluations([4, 2]) == {0: 8, 1: 2}
+    cost = 8*profile.statistics(0)['mean'] + 2*profile.statistics(1)['mean']
+    speed = profile.speed([4, 2], 2*unit.femtoseconds)
+    assert speed == pytest.approx(2e-6*86400/cost)
+    assert len(str(profile).splitlines()) == 3
+
+
+def test_RespaPlanner():
+    case = 'tests/data/emim_BCN4_Jiung2014'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                     nonbondedCutoff=1.0*unit.nanometers)
+    near = atomsmm.NearNonbondedForce(0.7*unit.nanometers, 0.6*unit.nanometers).setForceGroup(1)
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        for force in [atomsmm.NonbondedExceptionsForce(), near]:
+            force.importFrom(nbforce).addTo(system)
+    planner = atomsmm.RespaPlanner(system, pdb.positions, 4*unit.femtoseconds, samples=3, interval=2, seed=1)
+    labels = planner.labels
+    bonds = labels.index('HarmonicBondForce')
+    assert planner.substeps[bonds] == max(planner.substeps)
+    assert planner.groups[bonds] == 0
+    assert planner.substeps[labels.index('CMMotionRemover')] == 1
+    assert planner.substeps[labels.index('CustomNonbondedForce')] <= planner.substeps[bonds]
+    loops = planner.apply(system)
+    assert loops == planner.loops
+    assert int(np.prod(loops)) == max(planner.substeps)
+    for (members, group) in zip(planner.units, planner.groups):
+        assert all(system.getForce(index).getForceGroup() == group for index in members)
+    assert len(str(planner).splitlines()) == len(planner.units) + 2
+    integrator = atomsmm.RespaPropagator(loops).integrator(4*unit.femtoseconds)
+    context = openmm.Context(system, integrator, openmm.Platform.getPlatformByName('Reference'))
+    context.setPositions(pdb.positions)
+    integrator.step(1)
+
+
+def test_selectPlatform(tmpdir):
+    case = 'tests/data/q-SPC-FW'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    integrator = atomsmm.VelocityVerletPropagator().integrator(1*unit.femtoseconds)
+    directory = str(tmpdir)
+    platform, properties = atomsmm.selectPlatform(system, pdb.positions, integrator, platforms=['Reference', 'CPU'],
+                                                  threads=[1], steps=2, directory=directory)
+    assert platform.getName() in ['Reference', 'CPU']
+    file = os.path.join(directory, 'platforms.json')
+    with open(file) as f:
+        entries = json.load(f)
+    assert len(entries) == 1
+    key = list(entries.keys())[0]
+    entries[key].update(platform='Reference', properties={})
+    with open(file, 'w') as f:
+        json.dump(entries, f)
+    platform, properties = atomsmm.selectPlatform(system, pdb.positions, integrator, directory=directory)
+    assert platform.getName() == 'Reference' and properties == {}
+    simulation = app.Simulation(pdb.topology, system, integrator, platform, properties)
+    simulation.context.setPositions(pdb.positions)
+    simulation.step(1)
+
+
+def test_selectPlatform_stale_lock(tmpdir):
+    case = 'tests/data/q-SPC-FW'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic)
+    integrator = atomsmm.VelocityVerletPropagator().integrator(1*unit.femtoseconds)
+    file = os.path.join(str(tmpdir), 'platforms.json')
+    with open(file + '.lock', 'w'):
+        pass
+    os.utime(file + '.lock', (0, 0))
+    atomsmm.selectPlatform(system, pdb.positions, integrator, platforms=['Reference'], steps=1,
+                           directory=str(tmpdir))
+    assert not os.path.exists(file + '.lock')
+    with open(file) as f:
+        assert list(json.load(f).values())[0]['platform'] == 'Reference'
+
+
+def test_PairWorkProfile():
+    case = 'tests/data/q-SPC-FW'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.PME, nonbondedCutoff=1.0*unit.nanometers)
+    near = atomsmm.NearNonbondedForce(0.7*unit.nanometers, 0.6*unit.nanometers).setForceGroup(1)
+    far = atomsmm.FarNonbondedForce(near, 1.0*unit.nanometers, 0.9*unit.nanometers).setForceGroup(2)
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        for force in [atomsmm.NonbondedExceptionsForce(), near, far]:
+            force.importFrom(nbforce).addTo(system)
+    index = system.getNumForces() - 1
+    assert system.getForce(index).getCutoffDistance() == 1.0*unit.nanometers
+    profile = atomsmm.PairWorkProfile(system, pdb.positions, resolution=0.01*unit.nanometers)
+    assert len(profile.forces) == 2
+    assert profile.visited[index] > profile.contributing[index]
+    assert profile.reaches[index] == pytest.approx(0.7)
+    assert len(str(profile).splitlines()) == 3
+    assert list(profile.recommendations().keys()) == [index]
+    assert profile.apply(system) == {}
+    assert profile.untrimmed == {index: [index - 1]}
+    assert system.getForce(index).getCutoffDistance() == 1.0*unit.nanometers
+    system.getForce(index).setForceGroup(3)
+    energy = atomsmm.splitPotentialEnergy(system, pdb.topology, pdb.positions)["Total"]
+    applied = profile.apply(system)
+    assert list(applied.keys()) == [index]
+    assert profile.untrimmed == {}
+    assert system.getForce(index).getCutoffDistance()/unit.nanometers == pytest.approx(0.7)
+    modified = atomsmm.splitPotentialEnergy(system, pdb.topology, pdb.positions)["Total"]
+    assert modified/modified.unit == pytest.approx(energy/energy.unit)
+
+
+def test_PairWorkProfile_energy_tail():
+    system = openmm.System()
+    system.setDefaultPeriodicBoxVectors(*[openmm.Vec3(*(3.0 if i == j else 0.0 for j in range(3))) for i in range(3)])
+    force = openmm.CustomNonbondedForce('1+step(0.5-r)*(0.5-r)^2')
+    force.setNonbondedMethod(openmm.CustomNonbondedForce.CutoffPeriodic)
+    force.setCutoffDistance(1.0)
+    positions = 3*np.random.RandomState(1).random_sample((50, 3))
+    for i in range(len(positions)):
+        system.addParticle(1.0)
+        force.addParticle([])
+    system.addForce(force)
+    profile = atomsmm.PairWorkProfile(system, positions, resolution=0.01*unit.nanometers)
+    assert profile.reaches[0] == pytest.approx(1.0)
+    assert profile.recommendations() == {}
+    force.setEnergyFunction('step(0.5-r)*(0.5-r)^2')
+    profile = atomsmm.PairWorkProfile(system, positions, resolution=0.01*unit.nanometers)
+    assert profile.reaches[0] == pytest.approx(0.5)
+
+
+def test_RespaPlanner_forces():
+    case = 'tests/data/emim_BCN4_Jiung2014'
+    pdb = app.PDBFile(case + '.pdb')
+    forcefield = app.ForceField(case + '.xml')
+    system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.CutoffPeriodic,
+                                     nonbondedCutoff=1.0*unit.nanometers)
+    near = atomsmm.NearNonbondedForce(0.7*unit.nanometers, 0.6*unit.nanometers).setForceGroup(1)
+    far = atomsmm.FarNonbondedForce(near, 1.0*unit.nanometers, 0.9*unit.nanometers)
+    with atomsmm.detachForce(system, atomsmm.findNonbondedForce(system)) as nbforce:
+        for force in [atomsmm.NonbondedExceptionsForce(), near, far]:
+            force.importFrom(nbforce).addTo(system)
+    planner = atomsmm.RespaPlanner(system, pdb.positions, 4*unit.femtoseconds, samples=2, interval=2,
+                                   seed=1, forces=[far])
+    assert len(planner.units) == system.getNumForces() - 1
+    assert planner.units[-1] == [system.getNumForces() - 2, system.getNumForces() - 1]
+    assert planner.labels[-1] == 'NonbondedForce+CustomNonbondedForce'